@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
-from db import run_query
-from data import productos, dataframe_to_pdf
+from db import cargar_consultas, pool_stats, cache_stats, cronometro
+from data import productos, dataframe_to_pdf, pdf_cacheado
 
 
 st.set_page_config(
@@ -19,40 +19,41 @@ Selecciona una sección desde el menú lateral.
 
 st.subheader("Estado de la base de datos")
 
-row = run_query("select now() as ahora;", fetch="one")
+query_inventario = """
+SELECT sku, entradas, salidas, stock_actual
+FROM inventario
+ORDER BY sku;
+"""
+
+datos = cargar_consultas({
+    "ahora": ("select now() as ahora;", None, "one"),
+    "inventario": query_inventario,
+})
+
+row = datos["ahora"]
 st.write("Conexión exitosa ✅", row["ahora"])
 
-clientes = run_query("SELECT * FROM clientes")
-proveedores = run_query("SELECT * FROM proveedores")
-encabezados = run_query("SELECT * FROM encabezados")
-detalle = run_query("SELECT * FROM detalles")
+stats = pool_stats()
+c1, c2, c3 = st.columns(3)
+c1.metric("Conexiones en uso", f"{stats['en_uso']} / {stats['max']}")
+c2.metric("Espera promedio del pool", f"{stats['espera_promedio_ms']:.1f} ms")
+c3.metric("Reconexiones", stats["reconexiones"])
 
-query_inventario = """
-SELECT
-    d.sku,
-    SUM(CASE WHEN e.transaccion = 2 THEN d.cantidad ELSE 0 END) AS entradas,
-    SUM(CASE WHEN e.transaccion = 1 THEN d.cantidad ELSE 0 END) AS salidas,
-    SUM(
-        CASE
-            WHEN e.transaccion = 2 THEN d.cantidad
-            WHEN e.transaccion = 1 THEN -d.cantidad
-            ELSE 0
-        END
-    ) AS stock_actual
-FROM detalles d
-JOIN encabezados e ON d.id_transaccion = e.id_transaccion
-WHERE e.estado != 'Anulada'
-GROUP BY d.sku
-ORDER BY d.sku;
-"""
+stats = cache_stats()
+consultas = stats["aciertos"] + stats["fallos"]
+st.caption(
+    f"Cache de consultas: {stats['entradas']} entradas, {stats['bytes'] / 1024:,.0f} KB, "
+    f"{(stats['aciertos'] / consultas if consultas else 0):.0%} de aciertos"
+)
 
-inventario = run_query(query_inventario, fetch="all")
+inventario = datos["inventario"]
 
 st.subheader("Inventario Actual")
 
-inventario = pd.DataFrame(inventario)
-inventario["productos"] = inventario["sku"].map(productos)
-inventario = inventario[["sku", "productos", "entradas", "salidas", "stock_actual"]]
+with cronometro("dataframe_inventario"):
+    inventario = pd.DataFrame(inventario)
+    inventario["productos"] = inventario["sku"].map(productos)
+    inventario = inventario[["sku", "productos", "entradas", "salidas", "stock_actual"]]
 
 st.dataframe(inventario, width="stretch", column_config={
     "sku": "SKU",
@@ -62,12 +63,14 @@ st.dataframe(inventario, width="stretch", column_config={
     "stock_actual": "Stock Actual"
 })
 
-pdf = dataframe_to_pdf(inventario)
+def pdf_inventario():
+    with cronometro("pdf_inventario"):
+        return pdf_cacheado(dataframe_to_pdf, inventario)
 
+# El PDF solo se arma al hacer clic en descargar, y se reutiliza si el inventario no cambió
 st.download_button(
     label="📄 Descargar Inventario en PDF",
-    data=pdf,
+    data=pdf_inventario,
     file_name="inventario_actual.pdf",
     mime="application/pdf"
 )
-
@@ -0,0 +1,268 @@
+"""Tiempos de las consultas de cada página y de los PDFs con distintos volúmenes.
+
+Para cada escala (número de líneas de detalle) se siembra la base con
+`datos_sinteticos.sembrar`, se ejecuta cada consulta varias veces con el
+cache vacío y se guarda el resultado en JSON, para comparar entre versiones
+y encontrar qué consulta deja de escalar. Uso:
+
+    python cli.py benchmark --dsn postgresql://localhost/coimpex_bench --escalas 10000 100000 1000000
+
+La base indicada se borra: nunca se debe apuntar a la de producción.
+"""
+import json
+import platform
+import statistics
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import psycopg2
+
+
+def _estadisticas(tiempos):
+    tiempos = sorted(tiempos)
+    p95 = tiempos[min(len(tiempos) - 1, round(0.95 * (len(tiempos) - 1)))]
+    return {
+        "min_ms": round(1000 * tiempos[0], 3),
+        "mediana_ms": round(1000 * statistics.median(tiempos), 3),
+        "p95_ms": round(1000 * p95, 3),
+        "max_ms": round(1000 * tiempos[-1], 3),
+    }
+
+
+def _tamano(resultado):
+    if resultado is None:
+        return None
+    if isinstance(resultado, (bytes, bytearray)):
+        return len(resultado)
+    if isinstance(resultado, tuple):
+        resultado = resultado[0]
+    return len(resultado) if hasattr(resultado, "__len__") else 1
+
+
+def medir(funcion, repeticiones):
+    """Ejecuta `funcion` `repeticiones` veces con el cache de consultas vacío."""
+    import db
+
+    tiempos = []
+    for _ in range(repeticiones):
+        db.get_cache().limpiar()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+
+    medicion = _estadisticas(tiempos)
+    medicion["filas"] = _tamano(resultado)
+    return medicion
+
+
+def _contexto():
+    # Parámetros realistas para las consultas: el cliente con más ventas, un envío, etc.
+    from consultas import clave_kardex, consultar_kardex
+    from db import run_query
+
+    contexto = run_query(
+        """
+        SELECT
+            (SELECT id_cliente FROM encabezados WHERE transaccion = 1
+             GROUP BY id_cliente ORDER BY COUNT(*) DESC LIMIT 1) AS id_cliente,
+            (SELECT id_transaccion FROM encabezados WHERE transaccion = 1
+             ORDER BY id_transaccion DESC LIMIT 1) AS id_transaccion,
+            (SELECT fecha FROM encabezados WHERE transaccion = 1
+             ORDER BY id_transaccion DESC LIMIT 1) AS fecha_transaccion,
+            (SELECT no_envio FROM encabezados WHERE transaccion = 1
+             ORDER BY fecha DESC, id_transaccion DESC LIMIT 1) AS no_envio,
+            (SELECT sku FROM detalles GROUP BY sku ORDER BY COUNT(*) DESC LIMIT 1) AS sku,
+            (SELECT MAX(fecha) FROM encabezados) AS fecha_corte;
+        """,
+        fetch="one",
+    )
+
+    # Clave de la página 10 del Kardex, para medir la navegación profunda
+    despues = None
+    for _ in range(9):
+        filas, hay_mas = consultar_kardex({}, despues=despues, limite=100)
+        if not hay_mas:
+            break
+        despues = clave_kardex(filas.iloc[-1])
+    contexto["kardex_pagina_10"] = despues
+
+    return contexto
+
+
+def casos(contexto):
+    """Lista de (página, nombre, función) con las consultas que hace cada página."""
+    import consultas
+    import db
+    from data import familias
+
+    id_cliente = contexto["id_cliente"]
+    id_transaccion = contexto["id_transaccion"]
+    fecha_transaccion = contexto["fecha_transaccion"]
+    sku = contexto["sku"]
+    hace_90_dias = contexto["fecha_corte"] - timedelta(days=90)
+
+    return [
+        ("app", "inventario", lambda: db.run_query(
+            "SELECT sku, entradas, salidas, stock_actual FROM inventario ORDER BY sku;")),
+
+        ("registro", "clientes", lambda: db.run_query("SELECT * FROM clientes")),
+        ("registro", "proveedores", lambda: db.run_query("SELECT * FROM proveedores")),
+        ("registro", "ids_ventas", lambda: db.run_query(
+            "SELECT id_transaccion, fecha FROM encabezados WHERE transaccion = 1")),
+        ("registro", "encabezado", lambda: db.run_query(
+            "SELECT * FROM encabezados WHERE id_transaccion = %s AND fecha = %s AND estado != 'Anulada'",
+            (id_transaccion, fecha_transaccion), fetch="one")),
+        ("registro", "detalles", lambda: db.run_query(
+            "SELECT id_detalle,sku, cantidad, precio FROM detalles WHERE id_transaccion = %s AND fecha = %s",
+            (id_transaccion, fecha_transaccion))),
+
+        ("estados_de_cuenta", "facturas", lambda: consultas.estado_cuenta_facturas(id_cliente)),
+        ("estados_de_cuenta", "detalles", lambda: consultas.estado_cuenta_detalles(id_cliente)),
+        ("estados_de_cuenta", "resumen", lambda: consultas.resumen_cuenta(id_cliente)),
+        ("estados_de_cuenta", "pagos", lambda: db.run_query(
+            "SELECT * FROM pagos WHERE id_cliente = %s", (id_cliente,))),
+        ("estados_de_cuenta", "lote", lambda: consultas.estados_cuenta_lote()),
+        ("estados_de_cuenta", "detalles_90_dias", lambda: consultas.estado_cuenta_detalles(
+            id_cliente, fecha_inicio=hace_90_dias, fecha_fin=contexto["fecha_corte"])),
+        ("estados_de_cuenta", "lote_90_dias", lambda: consultas.estados_cuenta_lote(
+            fecha_inicio=hace_90_dias, fecha_fin=contexto["fecha_corte"])),
+
+        ("inventario", "bodegas", lambda: db.run_query(
+            "SELECT sku, bodega, stock_actual FROM inventario_bodegas")),
+        ("inventario", "kardex", lambda: consultas.consultar_kardex({})),
+        ("inventario", "kardex_sku", lambda: consultas.consultar_kardex({"sku": sku})),
+        ("inventario", "kardex_sku_bodega", lambda: consultas.consultar_kardex(
+            {"sku": sku, "bodega": "COIMPEX"})),
+        ("inventario", "kardex_cliente", lambda: consultas.consultar_kardex({"id_cliente": id_cliente})),
+        ("inventario", "kardex_pagina_10", lambda: consultas.consultar_kardex(
+            {}, despues=contexto["kardex_pagina_10"])),
+        ("inventario", "kardex_90_dias", lambda: consultas.consultar_kardex({"fecha_inicio": hace_90_dias})),
+        ("inventario", "kardex_sku_90_dias", lambda: consultas.consultar_kardex(
+            {"sku": sku, "fecha_inicio": hace_90_dias})),
+
+        ("envios", "buscar", lambda: consultas.buscar_envios("")),
+        ("envios", "buscar_prefijo", lambda: consultas.buscar_envios(contexto["no_envio"][:-2])),
+        ("envios", "detalle", lambda: consultas.detalle_envio(contexto["no_envio"])),
+
+        ("antiguedad", "saldos", lambda: consultas.antiguedad_saldos(contexto["fecha_corte"])),
+        ("cierres", "mensuales", lambda: consultas.cierres_mensuales()),
+
+        ("ventas", "por_semana_90_dias", lambda: consultas.ventas_por_periodo(
+            hace_90_dias, contexto["fecha_corte"], "week")),
+        ("ventas", "por_mes_uva", lambda: consultas.ventas_por_periodo(
+            date(2000, 1, 1), contexto["fecha_corte"], "month", skus=familias["Uva"])),
+        ("ventas", "clientes_90_dias", lambda: consultas.ventas_por_cliente(
+            hace_90_dias, contexto["fecha_corte"])),
+    ]
+
+
+def casos_pdf(contexto):
+    """PDFs que generan las páginas; los datos se leen una vez y solo se mide el render."""
+    import consultas
+    from data import dataframe_to_pdf, generar_estado_cuenta_pdf, preparar_estado_cuenta, productos
+    from db import run_query
+
+    id_cliente = contexto["id_cliente"]
+    detalles = preparar_estado_cuenta(consultas.estado_cuenta_detalles(id_cliente))
+    totales = consultas.estado_cuenta_totales(id_cliente)
+
+    inventario = pd.DataFrame(run_query("SELECT sku, entradas, salidas, stock_actual FROM inventario ORDER BY sku;"))
+    inventario["productos"] = inventario["sku"].map(productos)
+    inventario = inventario[["sku", "productos", "entradas", "salidas", "stock_actual"]]
+
+    return [
+        ("pdf", "estado_cuenta", lambda: generar_estado_cuenta_pdf(
+            detalles, f"Cliente {id_cliente}",
+            float(totales["total_comprado"]), float(totales["total_pagado"]), float(totales["total_pendiente"]),
+        ).getvalue()),
+        ("pdf", "inventario", lambda: dataframe_to_pdf(inventario).getvalue()),
+    ]
+
+
+def casos_escritura(contexto):
+    """Guardar una venta y aplicar un pago: lo que cuestan los triggers y el reparto FIFO."""
+    import db
+    from data import bodegas, productos
+
+    skus = list(productos)[:5]
+    encabezado = {
+        "fecha": contexto["fecha_corte"], "no_envio": "BENCH", "transaccion": 1,
+        "tipo_venta": "Venta al crédito", "metodo_pago": "Pendiente de pago",
+        "bodega_origen": bodegas[0], "id_cliente": contexto["id_cliente"],
+        "total": 500.0, "estado": "Pendiente de pago", "factura": False,
+    }
+    detalles = [{"sku": sku, "cantidad": 1, "precio": 100.0, "subtotal": 100.0} for sku in skus]
+
+    return [
+        ("escritura", "guardar_movimiento", lambda: db.guardar_movimiento(encabezado, detalles)),
+        ("escritura", "aplicar_pago", lambda: db.aplicar_pago(
+            contexto["id_cliente"], contexto["fecha_corte"], 100.0)),
+    ]
+
+
+def ejecutar(dsn, escalas, repeticiones=5, salida=print):
+    """Siembra y mide cada escala en la base `dsn`. Devuelve el reporte como dict."""
+    import db
+    import migrar
+    from datos_sinteticos import sembrar
+
+    # El listener no hace falta para medir
+    db.configurar(DATABASE_URL=dsn, DB_CACHE_LISTEN=False)
+
+    salida("Aplicando migraciones")
+    migrar.aplicar_migraciones(dsn, salida=salida)
+
+    reporte = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "repeticiones": repeticiones,
+        "escalas": [],
+    }
+
+    for lineas in escalas:
+        salida(f"Escala: {lineas:,} líneas")
+        conn = psycopg2.connect(dsn)
+        try:
+            inicio = time.perf_counter()
+            conteos = sembrar(conn, lineas, salida=salida)
+            siembra = time.perf_counter() - inicio
+            cur = conn.cursor()
+            cur.execute("SELECT pg_database_size(current_database())")
+            tamano = cur.fetchone()[0]
+        finally:
+            conn.close()
+
+        db.get_cache().limpiar()
+        contexto = _contexto()
+
+        resultados = []
+        for grupo in (casos, casos_pdf, casos_escritura):
+            for pagina, nombre, funcion in grupo(contexto):
+                medicion = medir(funcion, repeticiones)
+                salida(f"  {pagina}.{nombre}: {medicion['mediana_ms']:.1f} ms")
+                resultados.append({"pagina": pagina, "nombre": nombre, **medicion})
+
+        reporte["escalas"].append({
+            "lineas": lineas,
+            "conteos": conteos,
+            "bytes_base": tamano,
+            "siembra_s": round(siembra, 3),
+            "resultados": resultados,
+        })
+
+    return reporte
+
+
+def guardar(reporte, destino):
+    def _serializar(valor):
+        if isinstance(valor, (date, datetime)):
+            return valor.isoformat()
+        return str(valor)
+
+    texto = json.dumps(reporte, indent=2, ensure_ascii=False, default=_serializar)
+    if destino in (None, "-"):
+        print(texto)
+    else:
+        with open(destino, "w", encoding="utf-8") as archivo:
+            archivo.write(texto + "\n")
@@ -0,0 +1,189 @@
+"""Tareas de mantenimiento fuera de la interfaz de Streamlit.
+
+Uso:
+    python cli.py migrar
+    python cli.py reconstruir-inventario
+    python cli.py cerrar-periodo 2026-09
+    python cli.py reabrir-periodo 2026-09
+    python cli.py particiones --meses 3
+    python cli.py archivar 2022
+    python cli.py estados-de-cuenta estados.zip --estado "Pendiente de pago"
+    python cli.py exportar movimientos movimientos_2026.csv --desde 2026-01-01 --hasta 2026-12-31
+    python cli.py benchmark --dsn postgresql://localhost/coimpex_bench --salida bench.json
+"""
+import argparse
+from datetime import datetime
+
+import db
+
+
+def _dsn(args):
+    return args.dsn or db.config("DATABASE_URL")
+
+
+def migrar_esquema(args):
+    import migrar
+
+    if args.estado:
+        for version, nombre, aplicada in migrar.estado(_dsn(args)):
+            print(f"{'✓' if aplicada else ' '} {version:04d} {nombre}")
+        return
+
+    aplicadas = migrar.aplicar_migraciones(_dsn(args), hasta=args.hasta)
+    print(f"Se aplicaron {len(aplicadas)} migraciones." if aplicadas else "El esquema está al día.")
+
+
+def reconstruir_inventario(args):
+    corregidos = db.reconstruir_inventario()
+    if not corregidos:
+        print("El inventario cuadra con el historial.")
+    else:
+        print(f"Se corrigieron {len(corregidos)} SKUs:")
+        for fila in corregidos:
+            print(f"  {fila['sku']}: {fila['stock_anterior']} -> {fila['stock_historial']}")
+
+    distintas = db.reconstruir_movimientos_diarios()
+    if not distintas:
+        print("El resumen diario de movimientos cuadra con el historial.")
+    else:
+        print(f"Se corrigieron {distintas} filas del resumen diario de movimientos.")
+
+
+def _mes(texto):
+    return datetime.strptime(texto, "%Y-%m").date()
+
+
+def cerrar_periodo(args):
+    calculados = db.cerrar_periodo(args.periodo)
+    print(f"Mes {args.periodo:%Y-%m} cerrado ({calculados} períodos calculados).")
+
+
+def reabrir_periodo(args):
+    reabiertos = db.reabrir_periodo(args.periodo)
+    print(f"Se reabrieron {reabiertos} meses desde {args.periodo:%Y-%m}.")
+
+
+def crear_particiones(args):
+    creadas = db.crear_particiones(args.meses)
+    print(f"Se crearon {creadas} particiones." if creadas else "Las particiones ya existían.")
+
+
+def archivar(args):
+    meses = db.archivar_anio(args.anio)
+    print(f"Año {args.anio} archivado ({meses} meses movidos al esquema archivo).")
+
+
+def _fecha(texto):
+    return datetime.strptime(texto, "%Y-%m-%d").date()
+
+
+def estados_de_cuenta(args):
+    from estados_lote import generar_estados_lote
+
+    def progreso(hechos, total):
+        print(f"\r{hechos}/{total} estados de cuenta", end="", flush=True)
+
+    generados = generar_estados_lote(
+        args.destino,
+        estados=args.estado,
+        fecha_inicio=args.desde,
+        fecha_fin=args.hasta,
+        progreso=progreso,
+        procesos=args.procesos,
+    )
+    print(f"\nSe generaron {generados} estados de cuenta en {args.destino}.")
+
+
+def exportar(args):
+    from exportar import FORMATOS, exportar as exportar_a
+
+    formato = args.formato or args.destino.rsplit(".", 1)[-1].lower()
+    if formato not in FORMATOS:
+        raise SystemExit(f"Formato desconocido: {formato} (use {', '.join(FORMATOS)})")
+
+    filtros = {"sku": args.sku, "bodega": args.bodega, "fecha_inicio": args.desde, "fecha_fin": args.hasta}
+    exportar_a(args.destino, args.datos, formato, filtros)
+    print(f"Exportado en {args.destino}")
+
+
+def benchmark(args):
+    import benchmark
+
+    try:
+        produccion = db.config("DATABASE_URL")
+    except KeyError:
+        produccion = None
+    if args.dsn == produccion:
+        raise SystemExit("El benchmark borra la base: use una distinta a la de DATABASE_URL.")
+
+    reporte = benchmark.ejecutar(args.dsn, args.escalas, repeticiones=args.repeticiones)
+    benchmark.guardar(reporte, args.salida)
+    if args.salida != "-":
+        print(f"Resultados en {args.salida}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de Coimpex Frutas")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("migrar", help="Aplicar las migraciones pendientes del esquema")
+    p.add_argument("--dsn", help="URL de la base; por defecto DATABASE_URL de secrets.toml")
+    p.add_argument("--hasta", type=int, help="Aplicar solo hasta esta versión")
+    p.add_argument("--estado", action="store_true", help="Mostrar qué migraciones están aplicadas")
+    p.set_defaults(func=migrar_esquema)
+
+    p = sub.add_parser("reconstruir-inventario", help="Reconciliar el inventario y el resumen diario contra todo el historial")
+    p.set_defaults(func=reconstruir_inventario)
+
+    p = sub.add_parser("cerrar-periodo", help="Guardar los saldos de clientes de un mes (AAAA-MM)")
+    p.add_argument("periodo", type=_mes)
+    p.set_defaults(func=cerrar_periodo)
+
+    p = sub.add_parser("reabrir-periodo", help="Reabrir un mes cerrado y los siguientes")
+    p.add_argument("periodo", type=_mes)
+    p.set_defaults(func=reabrir_periodo)
+
+    p = sub.add_parser("particiones", help="Crear por adelantado las particiones mensuales de movimientos")
+    p.add_argument("--meses", type=int, default=3, help="Meses hacia adelante desde hoy")
+    p.set_defaults(func=crear_particiones)
+
+    p = sub.add_parser("archivar", help="Separar los movimientos de un año cerrado (DETACH de sus particiones)")
+    p.add_argument("anio", type=int, metavar="AÑO")
+    p.set_defaults(func=archivar)
+
+    p = sub.add_parser("estados-de-cuenta", help="Generar un ZIP con el estado de cuenta (PDF) de cada cliente")
+    p.add_argument("destino", help="Ruta del archivo ZIP")
+    p.add_argument("--estado", action="append", help="Estado a incluir (se puede repetir); por defecto todos")
+    p.add_argument("--desde", type=_fecha, help="Fecha inicial (AAAA-MM-DD)")
+    p.add_argument("--hasta", type=_fecha, help="Fecha final (AAAA-MM-DD)")
+    p.add_argument("--procesos", type=int, help="Procesos en paralelo; por defecto uno por núcleo")
+    p.set_defaults(func=estados_de_cuenta)
+
+    p = sub.add_parser("exportar", help="Exportar el kardex o los movimientos a CSV, XLSX o Parquet")
+    p.add_argument("datos", choices=["kardex", "movimientos"])
+    p.add_argument("destino", help="Ruta del archivo; el formato sale de la extensión")
+    p.add_argument("--formato", choices=["csv", "xlsx", "parquet"], help="Formato si la extensión no lo indica")
+    p.add_argument("--desde", type=_fecha, help="Fecha inicial (AAAA-MM-DD)")
+    p.add_argument("--hasta", type=_fecha, help="Fecha final (AAAA-MM-DD)")
+    p.add_argument("--sku", help="Solo este SKU")
+    p.add_argument("--bodega", help="Solo movimientos de esta bodega (y saldo del kardex en ella)")
+    p.set_defaults(func=exportar)
+
+    p = sub.add_parser("benchmark", help="Medir consultas y PDFs con datos sintéticos (BORRA la base indicada)")
+    p.add_argument("--dsn", required=True, help="URL de una base de pruebas; sus datos se reemplazan")
+    p.add_argument("--escalas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                   help="Líneas de detalle a generar en cada corrida")
+    p.add_argument("--repeticiones", type=int, default=5, help="Veces que se ejecuta cada consulta")
+    p.add_argument("--salida", default="-", help="Archivo JSON de resultados; por defecto la salida estándar")
+    p.set_defaults(func=benchmark)
+
+    args = parser.parse_args()
+
+    # Un comando termina enseguida: no escucha los cambios de otras réplicas,
+    # así no abre una segunda conexión ni deja un hilo de LISTEN corriendo
+    db.configurar(DB_CACHE_LISTEN=False)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
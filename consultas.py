@@ -0,0 +1,652 @@
+"""Consultas de negocio que usan las páginas.
+
+Los filtros se resuelven en SQL para que cada rerun solo traiga las filas
+que se van a mostrar.
+"""
+import pandas as pd
+
+from db import run_query, run_query_df
+
+
+def _condiciones(filtros: dict, campos):
+    condiciones = []
+    params = {}
+
+    for campo, columna in campos:
+        if filtros.get(campo) is not None:
+            condiciones.append(f"{columna} = %({campo})s")
+            params[campo] = filtros[campo]
+
+    return condiciones, params
+
+
+def _query_kardex(filtros: dict, despues=None, limite=None, seleccion="c.nombre AS cliente, p.nombre AS proveedor, k.*"):
+    # Consulta del kardex; la usan la página (con límite) y la exportación (sin él)
+
+    # Filtros que definen el saldo: se aplican antes de la función de ventana
+    condiciones, params = _condiciones(filtros, [("sku", "d.sku")])
+    resumen, _ = _condiciones(filtros, [("sku", "r.sku")])
+    entrantes, _ = _condiciones(filtros, [("sku", "d.sku")])
+
+    if filtros.get("bodega") is not None:
+        condiciones.append("(e.bodega_origen = %(bodega)s OR e.bodega_destino = %(bodega)s)")
+        params["bodega"] = filtros["bodega"]
+        entrada = "CASE WHEN e.transaccion IN (2, 3) AND e.bodega_destino = %(bodega)s THEN d.cantidad ELSE 0 END"
+        salida = "CASE WHEN e.transaccion IN (1, 3) AND e.bodega_origen = %(bodega)s THEN d.cantidad ELSE 0 END"
+        apertura = "LEFT JOIN inventario_bodegas i ON i.sku = m.sku AND i.bodega = %(bodega)s"
+        # movimientos_diarios guarda la bodega de origen de las transferencias;
+        # las que entran a la bodega se leen de las líneas
+        resumen.append("r.bodega = %(bodega)s")
+        neto = "CASE WHEN r.transaccion = 2 THEN r.cantidad WHEN r.transaccion IN (1, 3) THEN -r.cantidad ELSE 0 END"
+        entrantes += [
+            "e.transaccion = 3 AND e.bodega_destino = %(bodega)s",
+            "e.estado IS DISTINCT FROM 'Anulada'",
+            "e.fecha > (SELECT fecha FROM corte) AND d.fecha > (SELECT fecha FROM corte)",
+        ]
+        transferencias = f"""
+                UNION ALL
+                SELECT d.sku, d.cantidad
+                FROM encabezados e
+                JOIN detalles d ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+                WHERE {" AND ".join(entrantes)}"""
+    else:
+        entrada = "CASE WHEN e.transaccion = 2 THEN d.cantidad ELSE 0 END"
+        salida = "CASE WHEN e.transaccion = 1 THEN d.cantidad ELSE 0 END"
+        apertura = "LEFT JOIN inventario i ON i.sku = m.sku"
+        neto = "CASE r.transaccion WHEN 2 THEN r.cantidad WHEN 1 THEN -r.cantidad ELSE 0 END"
+        transferencias = ""
+
+    # Las fechas se repiten en `d` para que el planificador descarte las
+    # particiones de `detalles` fuera del rango, no solo las de `encabezados`
+    if despues is not None:
+        condiciones.append(
+            "(e.fecha, COALESCE(e.no_envio, ''), e.id_transaccion, d.id_detalle)"
+            " > (%(k_fecha)s, %(k_envio)s, %(k_id)s, %(k_detalle)s)"
+        )
+        condiciones.append("e.fecha >= %(k_fecha)s AND d.fecha >= %(k_fecha)s")
+        params.update(zip(["k_fecha", "k_envio", "k_id", "k_detalle"], despues))
+    elif filtros.get("fecha_inicio") is not None:
+        condiciones.append("e.fecha >= %(fecha_inicio)s AND d.fecha >= %(fecha_inicio)s")
+        params["fecha_inicio"] = filtros["fecha_inicio"]
+
+    # Filtros que solo ocultan filas: se aplican después de calcular el saldo
+    campos_visibles = [
+        ("id_cliente", "id_cliente"),
+        ("id_proveedor", "id_proveedor"),
+        ("transaccion", "transaccion"),
+        ("bodega_origen", "bodega_origen"),
+        ("bodega_destino", "bodega_destino"),
+    ]
+    visibles, params_visibles = _condiciones(filtros, campos_visibles)
+    visibles_e, _ = _condiciones(filtros, [(campo, "e." + columna) for campo, columna in campos_visibles])
+    params.update(params_visibles)
+
+    params["fecha_fin"] = filtros.get("fecha_fin")
+    if filtros.get("fecha_fin") is not None:
+        visibles.append("fecha <= %(fecha_fin)s")
+        visibles_e.append("e.fecha <= %(fecha_fin)s")
+
+    # Último día que hace falta leer línea por línea: el de la última fila
+    # visible de la página, o `fecha_fin`. Lo que viene después solo
+    # importa para el saldo inicial y se toma de movimientos_diarios.
+    # Aquí el join va solo por id: con `d.fecha = e.fecha` el planificador
+    # subestima las filas y une todo el historial en vez de recorrerlo en orden
+    cortes = ["%(fecha_fin)s::date", "'infinity'::date"]
+    if limite is not None:
+        where_corte = ("WHERE " + " AND ".join(condiciones + visibles_e)) if condiciones + visibles_e else ""
+        cortes.insert(0, f"""(
+                SELECT e.fecha
+                FROM encabezados e
+                JOIN detalles d ON d.id_transaccion = e.id_transaccion
+                {where_corte}
+                ORDER BY e.fecha
+                OFFSET %(limite)s - 1 LIMIT 1
+            )""")
+
+    condiciones.append("e.fecha <= (SELECT fecha FROM corte) AND d.fecha <= (SELECT fecha FROM corte)")
+    resumen.append("r.fecha > (SELECT fecha FROM corte)")
+
+    where = "WHERE " + " AND ".join(condiciones)
+    where_resumen = "WHERE " + " AND ".join(resumen)
+    where_visibles = ("WHERE " + " AND ".join(visibles)) if visibles else ""
+
+    query = f"""
+        WITH corte AS (
+            SELECT COALESCE({", ".join(cortes)}) AS fecha
+        ),
+        mov AS (
+            SELECT
+                e.id_transaccion,
+                d.id_detalle,
+                e.fecha,
+                COALESCE(e.no_envio, '') AS orden_envio,
+                d.sku,
+                d.cantidad,
+                e.no_envio,
+                e.bodega_origen,
+                e.bodega_destino,
+                e.transaccion,
+                e.estado,
+                e.id_cliente,
+                e.id_proveedor,
+                CASE WHEN e.estado = 'Anulada' THEN 0 ELSE {entrada} END AS entrada,
+                CASE WHEN e.estado = 'Anulada' THEN 0 ELSE {salida} END AS salida
+            FROM encabezados e
+            JOIN detalles d ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+            {where}
+        ),
+        posteriores AS (
+            SELECT x.sku, SUM(x.neto) AS neto
+            FROM (
+                SELECT r.sku, {neto} AS neto
+                FROM movimientos_diarios r
+                {where_resumen}{transferencias}
+            ) x
+            GROUP BY x.sku
+        ),
+        apertura AS (
+            SELECT m.sku, COALESCE(i.stock_actual, 0) - COALESCE(MAX(po.neto), 0) - SUM(m.entrada - m.salida) AS saldo_inicial
+            FROM mov m
+            {apertura}
+            LEFT JOIN posteriores po ON po.sku = m.sku
+            GROUP BY m.sku, i.stock_actual
+        ),
+        kardex AS (
+            SELECT
+                m.*,
+                a.saldo_inicial + SUM(m.entrada - m.salida) OVER (
+                    PARTITION BY m.sku
+                    ORDER BY m.fecha, m.orden_envio, m.id_transaccion, m.id_detalle
+                    ROWS UNBOUNDED PRECEDING
+                ) AS saldo
+            FROM mov m
+            JOIN apertura a ON a.sku = m.sku
+        )
+        SELECT {seleccion}
+        FROM (SELECT * FROM kardex {where_visibles}) k
+        LEFT JOIN clientes c ON k.id_cliente = c.id_cliente
+        LEFT JOIN proveedores p ON k.id_proveedor = p.id_proveedor
+        ORDER BY k.fecha, k.orden_envio, k.id_transaccion, k.id_detalle
+    """
+
+    if limite is not None:
+        query += " LIMIT %(limite)s"
+        params["limite"] = limite
+
+    return query, params
+
+
+def consultar_kardex(filtros: dict, despues=None, limite: int = 100):
+    """Devuelve una página del kardex (DataFrame) con entradas, salidas y saldo por SKU.
+
+    La página va ordenada por (fecha, no_envio, id_transaccion). `despues`
+    es la clave de la última fila de la página anterior, tal como la
+    devuelve `clave_kardex`; la página siguiente arranca justo después sin
+    recorrer las anteriores (paginación por llave). Se pide una fila de más
+    para saber si hay otra página.
+
+    El saldo es por SKU, o por SKU en la bodega de `filtros["bodega"]` si se
+    indica. El saldo inicial de la página sale del inventario actual (que
+    mantienen los triggers de migraciones/0003_inventario.sql) menos los
+    movimientos desde el inicio de la página: las líneas solo se leen hasta
+    el día de la última fila de la página y lo posterior se suma desde
+    movimientos_diarios, así que no se relee el historial línea por línea
+    ni antes ni después de la página. Los demás filtros solo ocultan filas;
+    el saldo siempre cuenta todos los movimientos del SKU.
+    """
+    query, params = _query_kardex(filtros, despues, limite + 1)
+    filas = run_query_df(query, params=params)
+
+    return filas.iloc[:limite], len(filas) > limite
+
+
+def clave_kardex(fila):
+    # Tipos de Python (no de numpy/pandas) para poder pasarla como parámetro
+    return (
+        pd.Timestamp(fila["fecha"]).date(),
+        fila["no_envio"] or "",
+        int(fila["id_transaccion"]),
+        int(fila["id_detalle"]),
+    )
+
+
+_TIPO_TRANSACCION = "CASE {} WHEN 1 THEN 'Venta' WHEN 2 THEN 'Compra' ELSE 'Transferencia' END"
+
+
+def exportacion_kardex(filtros: dict):
+    """Consulta y parámetros del kardex completo para los filtros, sin paginar."""
+    return _query_kardex(filtros, seleccion=f"""
+        k.fecha,
+        k.id_transaccion,
+        {_TIPO_TRANSACCION.format("k.transaccion")} AS transaccion,
+        k.no_envio,
+        COALESCE(c.nombre, p.nombre) AS tercero,
+        k.bodega_origen,
+        k.bodega_destino,
+        k.sku,
+        k.estado,
+        k.entrada,
+        k.salida,
+        k.saldo
+    """)
+
+
+def exportacion_movimientos(filtros: dict):
+    """Consulta y parámetros de las líneas de movimientos (encabezado + detalle) para los filtros."""
+    condiciones, params = _condiciones(filtros, [
+        ("sku", "d.sku"),
+        ("id_cliente", "e.id_cliente"),
+        ("id_proveedor", "e.id_proveedor"),
+        ("transaccion", "e.transaccion"),
+        ("bodega_origen", "e.bodega_origen"),
+        ("bodega_destino", "e.bodega_destino"),
+    ])
+
+    if filtros.get("bodega") is not None:
+        condiciones.append("(e.bodega_origen = %(bodega)s OR e.bodega_destino = %(bodega)s)")
+        params["bodega"] = filtros["bodega"]
+    if filtros.get("fecha_inicio") is not None:
+        condiciones.append("e.fecha >= %(fecha_inicio)s AND d.fecha >= %(fecha_inicio)s")
+        params["fecha_inicio"] = filtros["fecha_inicio"]
+    if filtros.get("fecha_fin") is not None:
+        condiciones.append("e.fecha <= %(fecha_fin)s AND d.fecha <= %(fecha_fin)s")
+        params["fecha_fin"] = filtros["fecha_fin"]
+
+    where = ("WHERE " + " AND ".join(condiciones)) if condiciones else ""
+
+    query = f"""
+        SELECT
+            e.fecha,
+            e.id_transaccion,
+            {_TIPO_TRANSACCION.format("e.transaccion")} AS transaccion,
+            e.no_envio,
+            e.tipo_venta,
+            e.metodo_pago,
+            e.bodega_origen,
+            e.bodega_destino,
+            c.nombre AS cliente,
+            p.nombre AS proveedor,
+            e.estado,
+            e.factura,
+            d.sku,
+            d.cantidad,
+            d.precio,
+            d.subtotal
+        FROM encabezados e
+        JOIN detalles d ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+        LEFT JOIN clientes c ON c.id_cliente = e.id_cliente
+        LEFT JOIN proveedores p ON p.id_proveedor = e.id_proveedor
+        {where}
+        ORDER BY e.fecha, e.id_transaccion, d.id_detalle
+    """
+    return query, params
+
+
+def _condiciones_estado_cuenta(id_cliente, estados=None, fecha_inicio=None, fecha_fin=None, todos=False, detalles=False):
+    # Con `detalles` las fechas también filtran `d`, para leer solo sus particiones del rango
+    if todos:
+        condiciones = ["e.id_cliente IS NOT NULL"]
+        params = {}
+    else:
+        condiciones = ["e.id_cliente = %(id_cliente)s"]
+        params = {"id_cliente": id_cliente}
+
+    if estados:
+        condiciones.append("e.estado = ANY(%(estados)s)")
+        params["estados"] = list(estados)
+    if fecha_inicio is not None:
+        condiciones.append("e.fecha >= %(fecha_inicio)s")
+        if detalles:
+            condiciones.append("d.fecha >= %(fecha_inicio)s")
+        params["fecha_inicio"] = fecha_inicio
+    if fecha_fin is not None:
+        condiciones.append("e.fecha <= %(fecha_fin)s")
+        if detalles:
+            condiciones.append("d.fecha <= %(fecha_fin)s")
+        params["fecha_fin"] = fecha_fin
+
+    return " AND ".join(condiciones), params
+
+
+def estado_cuenta_facturas(id_cliente, estados=None, fecha_inicio=None, fecha_fin=None):
+    """DataFrame con una fila por factura (encabezado) del cliente."""
+    where, params = _condiciones_estado_cuenta(id_cliente, estados, fecha_inicio, fecha_fin)
+
+    return run_query_df(
+        f"""
+        SELECT
+            e.id_transaccion,
+            e.fecha,
+            e.factura,
+            e.no_envio,
+            e.total,
+            e.pagado,
+            e.estado
+        FROM encabezados e
+        WHERE {where}
+        ORDER BY e.fecha, e.id_transaccion;
+        """,
+        params=params,
+    )
+
+
+def estado_cuenta_detalles(id_cliente, estados=None, fecha_inicio=None, fecha_fin=None):
+    """DataFrame con una fila por línea de producto de las facturas del cliente."""
+    where, params = _condiciones_estado_cuenta(id_cliente, estados, fecha_inicio, fecha_fin, detalles=True)
+
+    return run_query_df(
+        f"""
+        SELECT
+            e.id_transaccion,
+            e.fecha,
+            e.no_envio,
+            d.sku,
+            d.cantidad,
+            d.precio,
+            d.subtotal,
+            e.estado
+        FROM encabezados e
+        JOIN detalles d ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+        WHERE {where}
+        ORDER BY e.fecha, e.id_transaccion, d.id_detalle;
+        """,
+        params=params,
+    )
+
+
+def estado_cuenta_totales(id_cliente, estados=None, fecha_inicio=None, fecha_fin=None):
+    """Total comprado (sin anuladas), pagado y pendiente en una sola agregación."""
+    where, params = _condiciones_estado_cuenta(id_cliente, estados, fecha_inicio, fecha_fin)
+
+    return run_query(
+        f"""
+        SELECT
+            COALESCE(SUM(e.total) FILTER (WHERE e.estado IS DISTINCT FROM 'Anulada'), 0) AS total_comprado,
+            COALESCE(SUM(e.pagado), 0) AS total_pagado,
+            COALESCE(SUM(e.total) FILTER (WHERE e.estado IS DISTINCT FROM 'Anulada'), 0)
+                - COALESCE(SUM(e.pagado), 0) AS total_pendiente
+        FROM encabezados e
+        WHERE {where};
+        """,
+        params=params,
+        fetch="one"
+    )
+
+
+def estados_cuenta_lote(estados=None, fecha_inicio=None, fecha_fin=None):
+    """Líneas y totales de los estados de cuenta de todos los clientes.
+
+    Son dos consultas en total (no una por cliente): las líneas (DataFrame),
+    ordenadas por cliente, y los totales agrupados por cliente.
+    """
+    where, params = _condiciones_estado_cuenta(None, estados, fecha_inicio, fecha_fin, todos=True, detalles=True)
+    where_totales, _ = _condiciones_estado_cuenta(None, estados, fecha_inicio, fecha_fin, todos=True)
+
+    lineas = run_query_df(
+        f"""
+        SELECT
+            e.id_cliente,
+            e.id_transaccion,
+            e.fecha,
+            e.no_envio,
+            d.sku,
+            d.cantidad,
+            d.precio,
+            d.subtotal,
+            e.estado
+        FROM encabezados e
+        JOIN detalles d ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+        WHERE {where}
+        ORDER BY e.id_cliente, e.fecha, e.id_transaccion, d.id_detalle;
+        """,
+        params=params,
+    )
+
+    totales = run_query(
+        f"""
+        SELECT
+            c.id_cliente,
+            c.nombre,
+            COALESCE(SUM(e.total) FILTER (WHERE e.estado IS DISTINCT FROM 'Anulada'), 0) AS total_comprado,
+            COALESCE(SUM(e.pagado), 0) AS total_pagado,
+            COALESCE(SUM(e.total) FILTER (WHERE e.estado IS DISTINCT FROM 'Anulada'), 0)
+                - COALESCE(SUM(e.pagado), 0) AS total_pendiente
+        FROM encabezados e
+        JOIN clientes c ON c.id_cliente = e.id_cliente
+        WHERE {where_totales}
+        GROUP BY c.id_cliente, c.nombre
+        ORDER BY c.nombre;
+        """,
+        params=params,
+        fetch="all"
+    )
+
+    return lineas, totales
+
+
+def antiguedad_saldos(fecha_corte):
+    """Saldo pendiente de todos los clientes por antigüedad, en una sola agregación.
+
+    Los días se cuentan desde la fecha de la factura hasta `fecha_corte`.
+    """
+    return run_query(
+        """
+        WITH pendientes AS (
+            SELECT
+                e.id_cliente,
+                %(fecha_corte)s::date - e.fecha::date AS dias,
+                e.total - COALESCE(e.pagado, 0) AS pendiente
+            FROM encabezados e
+            WHERE e.id_cliente IS NOT NULL
+              AND COALESCE(e.estado, '') NOT IN ('Pagada', 'Anulada')
+              AND e.total > COALESCE(e.pagado, 0)
+              AND e.fecha <= %(fecha_corte)s
+        )
+        SELECT
+            c.id_cliente,
+            c.nombre AS cliente,
+            COALESCE(SUM(p.pendiente) FILTER (WHERE p.dias <= 30), 0) AS d0_30,
+            COALESCE(SUM(p.pendiente) FILTER (WHERE p.dias BETWEEN 31 AND 60), 0) AS d31_60,
+            COALESCE(SUM(p.pendiente) FILTER (WHERE p.dias BETWEEN 61 AND 90), 0) AS d61_90,
+            COALESCE(SUM(p.pendiente) FILTER (WHERE p.dias > 90), 0) AS d90_mas,
+            SUM(p.pendiente) AS total
+        FROM pendientes p
+        JOIN clientes c ON c.id_cliente = p.id_cliente
+        GROUP BY c.id_cliente, c.nombre
+        ORDER BY total DESC;
+        """,
+        params={"fecha_corte": fecha_corte},
+        fetch="all"
+    )
+
+
+def resumen_cuenta(id_cliente):
+    """Saldo del cliente desde el último cierre mensual más los movimientos posteriores.
+
+    Solo se leen las ventas y pagos posteriores al cierre; sin cierres se
+    parte de cero y se suma todo el historial.
+    """
+    return run_query(
+        """
+        WITH cierre AS (
+            SELECT
+                c.periodo AS ultimo_cierre,
+                COALESCE(c.periodo + interval '1 month', '-infinity') AS desde,
+                COALESCE(s.saldo_final, 0) AS saldo_inicial
+            FROM (SELECT max(periodo) AS periodo FROM cierres) c
+            LEFT JOIN saldos_mensuales s ON s.periodo = c.periodo AND s.id_cliente = %(id_cliente)s
+        )
+        SELECT
+            c.ultimo_cierre,
+            c.saldo_inicial,
+            (
+                SELECT COALESCE(SUM(e.total), 0)
+                FROM encabezados e
+                WHERE e.id_cliente = %(id_cliente)s
+                  AND e.estado IS DISTINCT FROM 'Anulada'
+                  AND e.fecha >= c.desde
+            ) AS cargos,
+            (
+                SELECT COALESCE(SUM(p.monto_pagado), 0)
+                FROM pagos p
+                WHERE p.id_cliente = %(id_cliente)s
+                  AND p.fecha >= c.desde
+            ) AS abonos
+        FROM cierre c;
+        """,
+        params={"id_cliente": id_cliente},
+        fetch="one"
+    )
+
+
+def cierres_mensuales():
+    return run_query(
+        """
+        SELECT
+            c.periodo,
+            c.cerrado_en,
+            COUNT(s.id_cliente) AS clientes,
+            COALESCE(SUM(s.cargos), 0) AS cargos,
+            COALESCE(SUM(s.abonos), 0) AS abonos,
+            COALESCE(SUM(s.saldo_final), 0) AS saldo_final
+        FROM cierres c
+        LEFT JOIN saldos_mensuales s ON s.periodo = c.periodo
+        GROUP BY c.periodo, c.cerrado_en
+        ORDER BY c.periodo DESC;
+        """,
+        fetch="all"
+    )
+
+
+def buscar_envios(prefijo: str = "", limite: int = 50):
+    """Números de envío que empiezan con `prefijo`, del más reciente al más antiguo.
+
+    Solo se leen los encabezados más recientes que coinciden (por los
+    índices de migraciones/0006_indices_envios.sql), así que el costo no
+    depende del tamaño de la tabla.
+    """
+    prefijo = prefijo.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    return run_query(
+        """
+        WITH recientes AS (
+            SELECT no_envio, fecha
+            FROM encabezados
+            WHERE no_envio LIKE %(patron)s
+              AND no_envio <> ''
+            ORDER BY fecha DESC, id_transaccion DESC
+            LIMIT %(ventana)s
+        )
+        SELECT no_envio, MAX(fecha) AS fecha
+        FROM recientes
+        GROUP BY no_envio
+        ORDER BY MAX(fecha) DESC, no_envio
+        LIMIT %(limite)s;
+        """,
+        params={"patron": prefijo + "%", "ventana": limite * 10, "limite": limite},
+        fetch="all"
+    )
+
+
+def detalle_envio(no_envio: str):
+    """Ventas de un envío con sus líneas, en una sola consulta por el índice de `no_envio`.
+
+    Las líneas se buscan solo entre la primera y la última fecha del envío para
+    que PostgreSQL descarte las particiones de `detalles` de otros meses.
+    """
+    return run_query(
+        """
+        WITH envio AS (
+            SELECT * FROM encabezados WHERE no_envio = %(no_envio)s
+        )
+        SELECT
+            c.nombre AS cliente,
+            e.id_transaccion,
+            e.fecha,
+            e.factura,
+            e.no_envio,
+            d.sku,
+            d.cantidad,
+            d.precio,
+            d.subtotal,
+            e.total,
+            e.estado,
+            e.pagado
+        FROM envio e
+        JOIN clientes c ON e.id_cliente = c.id_cliente
+        JOIN detalles d ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+        WHERE d.fecha BETWEEN (SELECT min(fecha) FROM envio) AND (SELECT max(fecha) FROM envio)
+        ORDER BY e.fecha, e.id_transaccion, d.id_detalle;
+        """,
+        params={"no_envio": no_envio},
+        fetch="all"
+    )
+
+
+# Agrupaciones de fecha de los reportes de ventas (valores de date_trunc)
+PERIODOS = {"Día": "day", "Semana": "week", "Mes": "month"}
+
+
+def _condiciones_ventas(fecha_inicio, fecha_fin, skus=None, bodegas=None):
+    # Ventas vigentes del resumen diario; las anuladas nunca llegan a él
+    condiciones = ["m.transaccion = 1", "m.fecha BETWEEN %(fecha_inicio)s AND %(fecha_fin)s"]
+    params = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
+
+    if skus:
+        condiciones.append("m.sku = ANY(%(skus)s)")
+        params["skus"] = list(skus)
+    if bodegas:
+        condiciones.append("m.bodega = ANY(%(bodegas)s)")
+        params["bodegas"] = list(bodegas)
+
+    return " AND ".join(condiciones), params
+
+
+def ventas_por_periodo(fecha_inicio, fecha_fin, periodo="week", skus=None, bodegas=None):
+    """DataFrame con cantidad y monto vendidos por período, SKU y bodega.
+
+    Lee solo `movimientos_diarios` (migraciones/0008_movimientos_diarios.sql):
+    el costo depende de los días, SKUs y bodegas del rango, no de `detalles`.
+    Las semanas empiezan el lunes.
+    """
+    where, params = _condiciones_ventas(fecha_inicio, fecha_fin, skus, bodegas)
+    params["periodo"] = periodo
+
+    return run_query_df(
+        f"""
+        SELECT
+            date_trunc(%(periodo)s, m.fecha)::date AS periodo,
+            m.sku,
+            m.bodega,
+            SUM(m.cantidad) AS cantidad,
+            SUM(m.monto) AS monto,
+            SUM(m.lineas) AS lineas
+        FROM movimientos_diarios m
+        WHERE {where}
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2, 3;
+        """,
+        params=params,
+    )
+
+
+def ventas_por_cliente(fecha_inicio, fecha_fin, skus=None, bodegas=None, limite=15):
+    """Los `limite` clientes con más monto vendido en el rango, desde el resumen diario."""
+    where, params = _condiciones_ventas(fecha_inicio, fecha_fin, skus, bodegas)
+    params["limite"] = limite
+
+    return run_query_df(
+        f"""
+        SELECT
+            c.nombre AS cliente,
+            SUM(m.cantidad) AS cantidad,
+            SUM(m.monto) AS monto
+        FROM movimientos_diarios m
+        JOIN clientes c ON c.id_cliente = m.id_cliente
+        WHERE {where}
+        GROUP BY c.id_cliente, c.nombre
+        ORDER BY monto DESC
+        LIMIT %(limite)s;
+        """,
+        params=params,
+    )
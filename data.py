@@ -31,111 +31,290 @@ productos = {
 
 bodegas = ["COIMPEX", "Predio Z11", "Villa Nueva", "El Tejar (Berry Fresh)", "Parramos", "CENMA"]
 
+# SKUs de cada familia ("Uva", "Manzana"), según la primera palabra del producto
+familias = {}
+for _sku, _nombre in productos.items():
+    familias.setdefault(_nombre.split()[0], []).append(_sku)
+
 #####################################################
 # Funciones para generar PDF
 #####################################################
 
 from io import BytesIO
-from reportlab.lib.pagesizes import LETTER
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+import pandas as pd
+from reportlab.lib.pagesizes import LETTER, A4
+from reportlab.platypus import Table, TableStyle, Paragraph, Spacer
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from xml.sax.saxutils import escape
 
-def generar_estado_cuenta_pdf(df, cliente_nombre, total_comprado, total_pagado, total_pendiente):
-    buffer = BytesIO()
+MARGEN = 30
+ALTO_FILA = 16
+TAMANO_LETRA = 8
+RELLENO = 12
 
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=LETTER,
-        rightMargin=30,
-        leftMargin=30,
-        topMargin=30,
-        bottomMargin=30,
-    )
+# Celdas de texto que no caben en el ancho de su columna
+ESTILO_CELDA = ParagraphStyle("celda", fontName="Helvetica", fontSize=TAMANO_LETRA, leading=TAMANO_LETRA * 1.2)
 
-    styles = getSampleStyleSheet()
-    elementos = []
+def _anchos_columnas(encabezados, columnas, disponible):
+    # Ancho del texto más largo de cada columna, sin recorrer fila por fila
+    anchos = []
+    for titulo, col in zip(encabezados, columnas):
+        mas_largo = col.iloc[col.str.len().to_numpy().argmax()] if len(col) else ""
+        ancho = max(
+            stringWidth(str(titulo), "Helvetica-Bold", TAMANO_LETRA),
+            stringWidth(mas_largo, "Helvetica", TAMANO_LETRA),
+        ) + RELLENO
+        anchos.append(ancho)
+
+    # Si no caben, las columnas angostas conservan su ancho y el espacio que
+    # queda se reparte por igual entre las anchas, que parten su texto
+    anchas = list(range(len(anchos)))
+    restante = disponible
+    while sum(anchos[i] for i in anchas) > restante:
+        parte = restante / len(anchas)
+        angostas = [i for i in anchas if anchos[i] <= parte]
+        if not angostas:
+            for i in anchas:
+                anchos[i] = parte
+            break
+        restante -= sum(anchos[i] for i in angostas)
+        anchas = [i for i in anchas if anchos[i] > parte]
+    return anchos
+
+def _partir_celdas(col, ancho):
+    # Solo se miden los textos que podrían no caber (uno por valor distinto) y
+    # solo esos se vuelven Paragraph, que se parte en varias líneas. Devuelve
+    # la columna y qué filas tienen texto partido
+    disponible = ancho - RELLENO
+    seguro = int(disponible // stringWidth("@", "Helvetica", TAMANO_LETRA))  # el carácter más ancho
+    largos = col[col.str.len() > seguro].unique()
+    partir = {v: Paragraph(escape(v), ESTILO_CELDA) for v in largos
+              if stringWidth(v, "Helvetica", TAMANO_LETRA) > disponible + 0.01}
+    partidas = col.isin(list(partir))
+    if not partir:
+        return col, partidas
+    return col.astype(object).where(~partidas, col.map(partir)), partidas
+
+def _dibujar(c, flowable, y, ancho, alto_pagina):
+    _, alto = flowable.wrap(ancho, y - MARGEN)
+    if y - alto < MARGEN:
+        c.showPage()
+        y = alto_pagina - MARGEN
+    flowable.drawOn(c, MARGEN, y - alto)
+    return y - alto
+
+def escribir_tabla_pdf(destino, df, estilo, pagesize=LETTER, antes=(), despues=()):
+    """Dibuja `df` (ya formateado como texto) en un PDF, una página a la vez.
+
+    La tabla se parte en bloques del tamaño de una página, cada uno con su
+    encabezado, y se dibujan directo en el canvas; así ReportLab nunca tiene
+    que partir una tabla gigante. Los textos más anchos que su columna se
+    parten en varias líneas, y cada bloque se mide antes de dibujarlo para
+    que las filas altas no se salgan de la página. `antes` y `despues` son
+    flowables (títulos, totales) que van arriba de la tabla y al final.
+    `destino` puede ser una ruta o un archivo/buffer; el canvas guarda las
+    páginas en memoria y escribe el PDF completo al final, en `save()`.
+    """
+    ancho_pagina, alto_pagina = pagesize
+    disponible = ancho_pagina - 2 * MARGEN
+
+    c = canvas.Canvas(destino, pagesize=pagesize)
+    y = alto_pagina - MARGEN
+
+    for flowable in antes:
+        y = _dibujar(c, flowable, y, disponible, alto_pagina)
+
+    encabezados = [str(col) for col in df.columns]
+    # Con pandas 3 astype(str) deja los NaN como NaN; se rellenan después
+    # de convertir para no chocar con las columnas categóricas
+    columnas = [df[col].astype(str).fillna("") for col in df.columns]
+    anchos = _anchos_columnas(encabezados, columnas, disponible)
+    columnas, partidas = zip(*(_partir_celdas(col, ancho) for col, ancho in zip(columnas, anchos)))
+    filas = list(zip(*columnas))
+    # Las filas sin texto partido miden ALTO_FILA; ReportLab calcula las demás
+    altos = [None if alta else ALTO_FILA for alta in pd.concat(partidas, axis=1).any(axis=1)]
+
+    estilo = TableStyle([
+        *estilo,
+        ("FONTSIZE", (0, 0), (-1, -1), TAMANO_LETRA),
+        ("FONT", (0, 1), (-1, -1), "Helvetica"),
+    ])
 
-    # Título
-    elementos.append(Paragraph("<b>Estado de Cuenta</b>", styles["Title"]))
-    elementos.append(Paragraph(f"<b>Cliente:</b> {cliente_nombre}", styles["Normal"]))
+    inicio = 0
+    while inicio < len(filas) or inicio == 0:
+        # Con filas más altas que ALTO_FILA se quitan filas del bloque hasta
+        # que quepa
+        espacio = y - MARGEN
+        por_pagina = int(espacio // ALTO_FILA) - 1
+        while por_pagina >= 1:
+            tabla = Table(
+                [encabezados, *filas[inicio:inicio + por_pagina]],
+                colWidths=anchos,
+                rowHeights=[ALTO_FILA, *altos[inicio:inicio + por_pagina]],
+            )
+            tabla.setStyle(estilo)
+            _, alto = tabla.wrap(disponible, espacio)
+            if alto <= espacio or por_pagina == 1:
+                break
+            por_pagina = max(1, min(por_pagina - 1, int(por_pagina * espacio / alto)))
 
-    # Fecha
-    elementos.append(Paragraph(f"<b>Fecha Inicial:</b> {df['fecha'].min()}", styles["Normal"]))
-    elementos.append(Paragraph(f"<b>Fecha Final:</b> {df['fecha'].max()}", styles["Normal"]))
-    
-    elementos.append(Paragraph("", styles["Normal"]))
+        # Ni una fila cabe en lo que queda de la página; en una página nueva
+        # se dibuja aunque no quepa entera
+        if por_pagina < 1 or (alto > espacio and y < alto_pagina - MARGEN):
+            c.showPage()
+            y = alto_pagina - MARGEN
+            continue
+
+        tabla.drawOn(c, MARGEN, y - alto)
+        y -= alto
+
+        inicio += por_pagina
+        if inicio < len(filas):
+            c.showPage()
+            y = alto_pagina - MARGEN
+
+    for flowable in despues:
+        y = _dibujar(c, flowable, y, disponible, alto_pagina)
+
+    c.save()
+
+def _moneda(serie):
+    # "Q 1,234.50" con operaciones por columna: los centavos como texto y los
+    # miles separados por tramos de tres dígitos contados desde la derecha
+    valores = serie.astype(float)
+    centavos = (valores.abs() * 100).round().fillna(0).astype("int64[pyarrow]").astype(str).str.pad(3, fillchar="0")
+    enteros = centavos.str[:-2]
+    texto = enteros.str[-3:] + "." + centavos.str[-2:]
+    digitos = int(enteros.str.len().max()) if len(enteros) else 0
+    for fin in range(-3, -digitos, -3):
+        texto = enteros.str[fin - 3:fin] + "," + texto
+    prefijo = valores.lt(0).map({True: "Q -", False: "Q "})
+    return (prefijo + texto.str.lstrip(",")).where(valores.notna(), "")
+
+def generar_estado_cuenta_pdf(df, cliente_nombre, total_comprado, total_pagado, total_pendiente, destino=None):
+    buffer = BytesIO() if destino is None else destino
+
+    styles = getSampleStyleSheet()
+
+    # Título y fechas
+    antes = [
+        Paragraph("<b>Estado de Cuenta</b>", styles["Title"]),
+        Paragraph(f"<b>Cliente:</b> {cliente_nombre}", styles["Normal"]),
+        Paragraph(f"<b>Fecha Inicial:</b> {df['fecha'].min()}", styles["Normal"]),
+        Paragraph(f"<b>Fecha Final:</b> {df['fecha'].max()}", styles["Normal"]),
+        Spacer(1, 12),
+    ]
 
-    elementos.append(Spacer(1, 12))
+    # Tabla, formateada por columna
+    tabla = pd.DataFrame({
+        "Fecha": df["fecha"],
+        "ID": df["id_transaccion"],
+        "Producto": df["producto"],
+        "Cantidad": df["cantidad"],
+        "Precio": _moneda(df["precio"]),
+        "Subtotal": _moneda(df["subtotal"]),
+        "Estado": df["estado"],
+    })
 
-    # Tabla
-    tabla_data = [
-        ["Fecha", "ID", "Producto", "Cantidad", "Precio", "Subtotal", "Estado"]
+    # Totales
+    despues = [
+        Spacer(1, 24),
+        Paragraph(f"<b>Total Comprado:</b> Q {total_comprado:,.2f}", styles["Normal"]),
+        Paragraph(f"<b>Total Pagado:</b> Q {total_pagado:,.2f}", styles["Normal"]),
+        Paragraph(f"<b>Total Pendiente:</b> Q {total_pendiente:,.2f}", styles["Normal"]),
     ]
 
-    for _, row in df.iterrows():
-        tabla_data.append([
-            row["fecha"],
-            row["id_transaccion"],
-            row["producto"],
-            row["cantidad"],
-            f"Q {row['precio']:,.2f}",
-            f"Q {row['subtotal']:,.2f}",
-            row["estado"],
-        ])
-
-    tabla = Table(tabla_data, repeatRows=1)
-    tabla.setStyle(TableStyle([
+    escribir_tabla_pdf(buffer, tabla, [
         ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
         ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
         ("ALIGN", (3, 1), (-2, -1), "RIGHT"),
         ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
         ("FONT", (0, 0), (-1, 0), "Helvetica-Bold"),
-    ]))
-
-    elementos.append(tabla)
-    elementos.append(Paragraph("<br/>", styles["Normal"]))
-
-    # Totales
-    elementos.append(Spacer(1, 12))
-    elementos.append(Paragraph(f"<b>Total Comprado:</b> Q {total_comprado:,.2f}", styles["Normal"]))
-    elementos.append(Paragraph(f"<b>Total Pagado:</b> Q {total_pagado:,.2f}", styles["Normal"]))
-    elementos.append(Paragraph(f"<b>Total Pendiente:</b> Q {total_pendiente:,.2f}", styles["Normal"]))
-
-    doc.build(elementos)
-    buffer.seek(0)
+    ], pagesize=LETTER, antes=antes, despues=despues)
 
+    if destino is None:
+        buffer.seek(0)
     return buffer
 
-import io
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
+def preparar_estado_cuenta(df):
+    # Nombre del producto y tipos de datos de las líneas de un estado de cuenta
+    df = df.copy()
+    # Con `sku` categórico el map recorre solo los SKUs distintos
+    df["producto"] = df["sku"].map(lambda sku: productos.get(sku, sku))
+    df["fecha"] = pd.to_datetime(df["fecha"]).dt.strftime("%d/%m/%Y")
+    df["cantidad"] = df["cantidad"].astype(int)
+    for col in ["precio", "subtotal"]:
+        df[col] = df[col].astype(float)
+    return df
 
-def dataframe_to_pdf(df):
-    buffer = io.BytesIO()
+def renderizar_estado_cuenta(trabajo):
+    # Se ejecuta en otro proceso: recibe y devuelve solo datos serializables
+    nombre_archivo, df, cliente_nombre, total_comprado, total_pagado, total_pendiente = trabajo
+    pdf = generar_estado_cuenta_pdf(df, cliente_nombre, total_comprado, total_pagado, total_pendiente)
+    return nombre_archivo, pdf.getvalue()
 
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=30,
-        leftMargin=30,
-        topMargin=30,
-        bottomMargin=30
-    )
+def dataframe_to_pdf(df, destino=None):
+    buffer = BytesIO() if destino is None else destino
 
-    data = [df.columns.tolist()] + df.values.tolist()
-
-    table = Table(data, repeatRows=1)
-    table.setStyle(TableStyle([
+    escribir_tabla_pdf(buffer, df, [
         ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
         ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
         ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
         ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
         ("FONT", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-    ]))
+    ], pagesize=A4)
 
-    doc.build([table])
-    buffer.seek(0)
+    if destino is None:
+        buffer.seek(0)
     return buffer
+
+#####################################################
+# Cache de PDFs
+#####################################################
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+PDF_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_pdf_cache = OrderedDict()
+_pdf_cache_bytes = 0
+_pdf_cache_lock = threading.Lock()
+
+def huella_pdf(funcion, df, *args):
+    # Hash del contenido del DataFrame, sus columnas y el resto de argumentos
+    h = hashlib.sha256(funcion.__name__.encode())
+    h.update(repr(list(df.columns)).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    h.update(repr(args).encode())
+    return h.hexdigest()
+
+def pdf_cacheado(funcion, df, *args):
+    """Genera el PDF con `funcion(df, *args)` o lo devuelve del cache si ya existe.
+
+    El cache es LRU y se limita a PDF_CACHE_MAX_BYTES. Devuelve bytes.
+    """
+    global _pdf_cache_bytes
+    clave = huella_pdf(funcion, df, *args)
+
+    with _pdf_cache_lock:
+        if clave in _pdf_cache:
+            _pdf_cache.move_to_end(clave)
+            return _pdf_cache[clave]
+
+    pdf = funcion(df, *args).getvalue()
+
+    with _pdf_cache_lock:
+        if clave not in _pdf_cache and len(pdf) <= PDF_CACHE_MAX_BYTES:
+            _pdf_cache[clave] = pdf
+            _pdf_cache_bytes += len(pdf)
+            while _pdf_cache_bytes > PDF_CACHE_MAX_BYTES:
+                _, viejo = _pdf_cache.popitem(last=False)
+                _pdf_cache_bytes -= len(viejo)
+
+    return pdf
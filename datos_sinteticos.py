@@ -0,0 +1,227 @@
+"""Datos sintéticos para medir la app con volúmenes grandes.
+
+Se generan dentro de Postgres con `generate_series`, así que sembrar un
+millón de líneas tarda segundos y no depende de la red. Los movimientos
+usan los SKUs y bodegas reales de `data.py`; las ventas se concentran en
+pocos clientes grandes, como en la operación real.
+"""
+from datetime import date
+
+from psycopg2 import sql
+
+from data import bodegas, productos
+
+# Proporción de ventas, compras y transferencias
+VENTAS = 0.70
+COMPRAS = 0.20
+
+# Líneas promedio por movimiento (de 1 a 6)
+LINEAS_POR_MOVIMIENTO = 3.5
+
+TABLAS = ["pagos_facturas", "pagos", "detalles", "encabezados", "clientes", "proveedores"]
+
+
+def limpiar(cur):
+    # Deja las tablas de datos vacías; el inventario y los cierres se recalculan al sembrar
+    cur.execute(
+        sql.SQL("TRUNCATE {}, inventario, inventario_bodegas, movimientos_diarios, cierres, saldos_mensuales, "
+                "inventario_archivado, particiones_archivadas RESTART IDENTITY CASCADE").format(
+            sql.SQL(", ").join(map(sql.Identifier, TABLAS))
+        )
+    )
+
+
+def sembrar(conn, lineas, inicio=date(2021, 1, 1), dias=5 * 365, semilla=0.42, salida=print):
+    """Llena la base con ~`lineas` líneas de detalle repartidas en `dias` días.
+
+    Borra los datos que hubiera. Los triggers de inventario se apagan mientras
+    se inserta y al final se reconstruyen el inventario y el resumen diario y
+    se cierra el antepenúltimo mes, del que parten los estados de cuenta.
+    Devuelve un dict con los conteos generados.
+    """
+    movimientos = max(1, round(lineas / LINEAS_POR_MOVIMIENTO))
+    clientes = max(10, movimientos // 50)
+    proveedores = max(5, clientes // 10)
+    params = {
+        "movimientos": movimientos,
+        "clientes": clientes,
+        "proveedores": proveedores,
+        "inicio": inicio,
+        "dias": dias,
+        "skus": list(productos),
+        "bodegas": bodegas,
+        "ventas": VENTAS,
+        "compras": VENTAS + COMPRAS,
+    }
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT setseed(%s)", (semilla,))
+        limpiar(cur)
+        cur.execute("ALTER TABLE encabezados DISABLE TRIGGER USER")
+        cur.execute("ALTER TABLE detalles DISABLE TRIGGER USER")
+
+        salida(f"  clientes: {clientes}, proveedores: {proveedores}")
+        cur.execute(
+            """
+            INSERT INTO clientes (nombre, nit, telefono)
+            SELECT 'Cliente ' || lpad(g::text, 5, '0'), (1000000 + g)::text, '5' || lpad(g::text, 7, '0')
+            FROM generate_series(1, %(clientes)s) g;
+
+            INSERT INTO proveedores (nombre, telefono)
+            SELECT 'Proveedor ' || lpad(g::text, 4, '0'), '2' || lpad(g::text, 7, '0')
+            FROM generate_series(1, %(proveedores)s) g;
+            """,
+            params,
+        )
+
+        salida(f"  encabezados: {movimientos}")
+        cur.execute("SELECT crear_particiones(%(inicio)s, %(inicio)s::date + %(dias)s)", params)
+        cur.execute(
+            """
+            INSERT INTO encabezados (
+                fecha, no_envio, transaccion, tipo_venta, metodo_pago,
+                bodega_origen, bodega_destino, id_cliente, id_proveedor, estado, factura
+            )
+            SELECT
+                %(inicio)s::date + (m.g * %(dias)s / %(movimientos)s)::int,
+                'ENV-' || lpad((m.g / 4)::text, 7, '0'),
+                m.transaccion,
+                CASE WHEN m.transaccion = 1 THEN
+                    CASE WHEN m.contado THEN 'Venta al contado' ELSE 'Venta al crédito' END
+                END,
+                CASE WHEN m.transaccion = 1 THEN
+                    CASE WHEN m.contado
+                        THEN (ARRAY['Efectivo', 'Tarjeta', 'Transferencia'])[1 + floor(m.r3 * 3)::int]
+                        ELSE (ARRAY['Pendiente de pago', 'Vale'])[1 + floor(m.r3 * 2)::int]
+                    END
+                END,
+                CASE WHEN m.transaccion IN (1, 3) THEN (%(bodegas)s::text[])[1 + m.b1] END,
+                CASE m.transaccion
+                    WHEN 2 THEN (%(bodegas)s::text[])[1 + m.b1]
+                    WHEN 3 THEN (%(bodegas)s::text[])[1 + (m.b1 + 1 + m.b2) %% cardinality(%(bodegas)s::text[])]
+                END,
+                -- Pocos clientes concentran la mayoría de las ventas
+                CASE WHEN m.transaccion = 1 THEN 1 + floor(%(clientes)s * m.r4 * m.r4)::int END,
+                CASE WHEN m.transaccion = 2 THEN 1 + floor(%(proveedores)s * m.r4)::int END,
+                CASE m.transaccion
+                    WHEN 1 THEN CASE
+                        WHEN m.r5 < 0.03 THEN 'Anulada'
+                        WHEN m.contado THEN 'Pagada'
+                        WHEN m.r3 < 0.55 THEN 'Pagada'
+                        WHEN m.r3 < 0.85 THEN 'Pendiente de pago'
+                        ELSE 'Pagada parcialmente'
+                    END
+                    WHEN 2 THEN CASE WHEN m.r5 < 0.05 THEN 'En tránsito' ELSE 'En Bodega' END
+                END,
+                m.transaccion = 1 AND m.r5 > 0.7
+            FROM (
+                SELECT
+                    g,
+                    CASE WHEN r1 < %(ventas)s THEN 1 WHEN r1 < %(compras)s THEN 2 ELSE 3 END AS transaccion,
+                    r2 < 0.6 AS contado,
+                    r3, r4, r5,
+                    floor(r6 * cardinality(%(bodegas)s::text[]))::int AS b1,
+                    floor(r7 * (cardinality(%(bodegas)s::text[]) - 1))::int AS b2
+                FROM (
+                    SELECT g, random() AS r1, random() AS r2, random() AS r3, random() AS r4,
+                           random() AS r5, random() AS r6, random() AS r7
+                    FROM generate_series(0, %(movimientos)s - 1) g
+                ) r
+            ) m
+            ORDER BY m.g;
+            """,
+            params,
+        )
+
+        cur.execute(
+            """
+            INSERT INTO detalles (id_transaccion, fecha, sku, cantidad, precio, subtotal)
+            SELECT id_transaccion, fecha, sku, cantidad, precio, cantidad * precio
+            FROM (
+                SELECT
+                    e.id_transaccion,
+                    e.fecha,
+                    (%(skus)s::text[])[1 + floor(random() * cardinality(%(skus)s::text[]))::int] AS sku,
+                    1 + floor(random() * 80)::int AS cantidad,
+                    CASE e.transaccion
+                        WHEN 1 THEN round((60 + random() * 140)::numeric, 2)
+                        WHEN 2 THEN round((40 + random() * 90)::numeric, 2)
+                        ELSE 0
+                    END AS precio
+                FROM encabezados e
+                CROSS JOIN LATERAL generate_series(1, 1 + (e.id_transaccion * 7) %% 6)
+            ) d
+            ORDER BY id_transaccion;
+            """,
+            params,
+        )
+        salida(f"  detalles: {cur.rowcount}")
+
+        # Totales y pagos consistentes con el estado de cada venta
+        cur.execute(
+            """
+            UPDATE encabezados e SET
+                total = d.total,
+                pagado = CASE
+                    WHEN e.transaccion <> 1 THEN 0
+                    WHEN e.estado = 'Pagada' THEN d.total
+                    WHEN e.estado = 'Pagada parcialmente' THEN round(d.total / 2, 2)
+                    ELSE 0
+                END
+            FROM (
+                SELECT id_transaccion, SUM(subtotal) AS total
+                FROM detalles
+                GROUP BY id_transaccion
+            ) d
+            WHERE d.id_transaccion = e.id_transaccion;
+
+            INSERT INTO pagos (id_pago, fecha, monto_pagado, id_cliente)
+            SELECT id_transaccion, fecha + id_transaccion %% 30, pagado, id_cliente
+            FROM encabezados
+            WHERE transaccion = 1 AND pagado > 0;
+
+            INSERT INTO pagos_facturas (id_pago, id_transaccion, monto)
+            SELECT id_transaccion, id_transaccion, pagado
+            FROM encabezados
+            WHERE transaccion = 1 AND pagado > 0;
+
+            SELECT setval(pg_get_serial_sequence('pagos', 'id_pago'), COALESCE(MAX(id_pago), 0) + 1, false)
+            FROM pagos;
+            """,
+            params,
+        )
+
+        cur.execute("ALTER TABLE encabezados ENABLE TRIGGER USER")
+        cur.execute("ALTER TABLE detalles ENABLE TRIGGER USER")
+
+        salida("  reconstruyendo inventario y resumen diario")
+        cur.execute("SELECT COUNT(*) FROM reconstruir_inventario()")
+        cur.execute("SELECT reconstruir_movimientos_diarios()")
+
+        salida("  cerrando meses")
+        cur.execute(
+            """
+            SELECT cerrar_periodo((date_trunc('month', MAX(fecha)) - interval '2 months')::date)
+            FROM encabezados
+            """
+        )
+
+        cur.execute("SELECT COUNT(*) FROM encabezados")
+        total_encabezados = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM detalles")
+        total_detalles = cur.fetchone()[0]
+        cur.execute("SELECT COUNT(*) FROM pagos")
+        total_pagos = cur.fetchone()[0]
+
+        # Estadísticas frescas para que los planes sean los de producción
+        cur.execute("ANALYZE")
+
+    conn.commit()
+
+    return {
+        "clientes": clientes,
+        "proveedores": proveedores,
+        "encabezados": total_encabezados,
+        "detalles": total_detalles,
+        "pagos": total_pagos,
+    }
@@ -1,34 +1,1145 @@
+import os
+import re
+import select
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 import streamlit as st
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
+from psycopg2 import sql
+
+
+class PoolConexiones:
+    """Pool acotado de conexiones con verificación de salud al prestarlas.
+
+    Si todas las conexiones están ocupadas, el hilo espera hasta `timeout`
+    segundos a que alguna se libere en lugar de fallar de inmediato. Solo
+    se hace ping a las conexiones que llevan más de `ping_inactiva`
+    segundos sin usarse; las demás se prestan sin viajes extra al servidor.
+    Cuando se descarta una conexión rota se hace ping a todas las que
+    esperan en el pool antes de volver a prestarlas.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=30, ping_inactiva=30):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_inactiva = ping_inactiva
+        self._devueltas = {}
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._en_uso = 0
+        self._prestamos = 0
+        self._reconexiones = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    def _conexion_viva(self, conn):
+        if conn.closed:
+            return False
+
+        estado = conn.info.transaction_status
+        if estado in (psycopg2.extensions.TRANSACTION_STATUS_INTRANS, psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+            # Quedó una transacción abierta: se descarta antes de prestarla
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        elif estado != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+
+        with self._lock:
+            devuelta = self._devueltas.get(id(conn))
+        if devuelta is not None and time.monotonic() - devuelta < self.ping_inactiva:
+            return True
+
+        # En autocommit el ping no abre una transacción que haya que cerrar
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.autocommit = False
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _reemplazar(self, conn):
+        # Descarta la conexión muerta y pide una nueva al pool
+        with self._lock:
+            self._devueltas.pop(id(conn), None)
+            self._reconexiones += 1
+        self._pool.putconn(conn, close=True)
+        return self._pool.getconn()
+
+    def getconn(self):
+        inicio = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(
+                f"No hay conexiones disponibles después de {self.timeout} s"
+            )
+        espera = time.perf_counter() - inicio
+
+        try:
+            conn = self._pool.getconn()
+            # Tras un corte pueden estar muertas varias de las que esperan en el
+            # pool; se descartan hasta dar con una viva o abrir una nueva
+            while not self._conexion_viva(conn):
+                conn = self._reemplazar(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._en_uso += 1
+            self._prestamos += 1
+            self._espera_total += espera
+            self._espera_max = max(self._espera_max, espera)
+        return conn
+
+    def putconn(self, conn, close=False):
+        close = close or bool(conn.closed)
+        with self._lock:
+            if close:
+                # Si esta se rompió (p. ej. el servidor se reinició), las
+                # demás también pueden estar muertas: se olvida cuándo se
+                # devolvieron para hacerles ping antes de prestarlas
+                self._devueltas.clear()
+            else:
+                self._devueltas[id(conn)] = time.monotonic()
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._en_uso -= 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "en_uso": self._en_uso,
+                "utilizacion": self._en_uso / self.maxconn,
+                "prestamos": self._prestamos,
+                "reconexiones": self._reconexiones,
+                "espera_promedio_ms": (
+                    1000 * self._espera_total / self._prestamos if self._prestamos else 0.0
+                ),
+                "espera_max_ms": 1000 * self._espera_max,
+            }
+
+
+_FALTA = object()
+
+
+# Valores fijados con configurar(); tienen prioridad sobre secrets.toml
+_configuracion = {}
+
+
+def configurar(**valores):
+    """Fija claves de configuración desde código (CLI, benchmark) antes de abrir el pool."""
+    _configuracion.update(valores)
+
+
+def config(nombre, defecto=_FALTA):
+    # Streamlit copia las claves de secrets.toml a os.environ al leerlo, así que el
+    # entorno solo sirve de respaldo cuando no hay secrets.toml
+    if nombre in _configuracion:
+        return _configuracion[nombre]
+    try:
+        return st.secrets[nombre]
+    except (KeyError, FileNotFoundError):
+        pass
+    if nombre in os.environ:
+        return os.environ[nombre]
+    if defecto is _FALTA:
+        raise KeyError(f"Falta {nombre} en secrets.toml o en el entorno") from None
+    return defecto
+
+
+def _activado(valor):
+    return str(valor).strip().lower() not in ("0", "false", "no", "")
+
 
 @st.cache_resource
-def get_conn():
-    # Lee la URL desde secrets
-    db_url = st.secrets["DATABASE_URL"]
-    conn = psycopg2.connect(db_url)
-    return conn
+def get_pool():
+    # Lee la URL y el tamaño del pool desde secrets o el entorno
+    db_url = config("DATABASE_URL")
+    minconn = int(config("DB_POOL_MIN", 4))
+    maxconn = int(config("DB_POOL_MAX", 10))
+    timeout = float(config("DB_POOL_TIMEOUT", 30))
+    ping_inactiva = float(config("DB_POOL_PING_INACTIVA", 30))
+    return PoolConexiones(db_url, minconn, maxconn, timeout, ping_inactiva)
+
+
+@contextmanager
+def conexion():
+    pool = get_pool()
+    conn = pool.getconn()
+    roto = False
+
+    try:
+        yield conn
+    except psycopg2.OperationalError:
+        # La conexión se cayó a media consulta: no se devuelve al pool
+        roto = True
+        raise
+    finally:
+        pool.putconn(conn, close=roto)
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+_TABLAS_LECTURA = re.compile(r"\b(?:FROM|JOIN)\s+([a-z_][a-z0-9_]*)", re.IGNORECASE)
+_TABLAS_ESCRITURA = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)\s+([a-z_][a-z0-9_]*)",
+    re.IGNORECASE,
+)
+
+
+# Tablas que los triggers de migraciones/ mantienen a partir de otras: al escribir en
+# la tabla de origen también cambian, aunque la consulta no las mencione.
+TABLAS_DERIVADAS = {
+    "encabezados": {"inventario", "inventario_bodegas", "movimientos_diarios"},
+    "detalles": {"inventario", "inventario_bodegas", "movimientos_diarios"},
+    "cierres": {"saldos_mensuales"},
+}
+
+
+def tablas_leidas(query: str) -> set:
+    return {t.lower() for t in _TABLAS_LECTURA.findall(query)}
+
+
+def tablas_escritas(query: str) -> set:
+    return {t.lower() for t in _TABLAS_ESCRITURA.findall(query)}
+
+
+def _tamano(result) -> int:
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=True, deep=True).sum())
+    # Estimación barata: tamaño de la primera fila por número de filas
+    if not result:
+        return sys.getsizeof(result)
+    filas = result if isinstance(result, list) else [result]
+    muestra = filas[0]
+    por_fila = sys.getsizeof(muestra) + sum(sys.getsizeof(v) for v in muestra.values())
+    return sys.getsizeof(filas) + por_fila * len(filas)
+
+
+def _filas(result) -> int:
+    if result is None:
+        return 0
+    return len(result) if isinstance(result, list) else 1
+
+
+class CacheConsultas:
+    """Cache LRU de resultados de lectura invalidado por versión de tabla.
+
+    Cada tabla tiene un contador que sube con cada escritura. Una entrada
+    guarda las versiones de las tablas que leyó y deja de ser válida en
+    cuanto alguna de ellas cambia o vence su TTL.
+    """
+
+    def __init__(self, ttl=300, max_bytes=64 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._versiones = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.listener = None  # Event que detiene el hilo de LISTEN, si hay uno
+
+    def _clave(self, query, params, fetch):
+        return (query, repr(params), fetch)
+
+    def obtener(self, query, params, fetch):
+        clave = self._clave(query, params, fetch)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                result, versiones, creado, tamano = entrada
+                vigente = time.monotonic() - creado < self.ttl and all(
+                    self._versiones.get(t, 0) == v for t, v in versiones.items()
+                )
+                if vigente:
+                    self._entradas.move_to_end(clave)
+                    self.aciertos += 1
+                    return True, result
+                self._descartar(clave)
+            self.fallos += 1
+            return False, None
+
+    def versiones(self, tablas):
+        with self._lock:
+            return {t: self._versiones.get(t, 0) for t in tablas}
+
+    def guardar(self, query, params, fetch, result, versiones, tamano=None):
+        clave = self._clave(query, params, fetch)
+        if tamano is None:
+            tamano = _tamano(result)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            # Si hubo una escritura mientras se leía, el resultado ya es viejo
+            if any(self._versiones.get(t, 0) != v for t, v in versiones.items()):
+                return
+            self._descartar(clave)
+            self._entradas[clave] = (result, versiones, time.monotonic(), tamano)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                self._descartar(next(iter(self._entradas)))
+
+    def invalidar(self, tablas):
+        tablas = set(tablas)
+        for t in list(tablas):
+            tablas |= TABLAS_DERIVADAS.get(t, set())
+        with self._lock:
+            for t in tablas:
+                self._versiones[t] = self._versiones.get(t, 0) + 1
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def _descartar(self, clave):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is not None:
+            self._bytes -= entrada[3]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
+
+
+CANAL_CAMBIOS = "coimpex_cambios"
+
+
+def _escuchar_cambios(dsn, cache, detener):
+    """Hilo que recibe los NOTIFY de migraciones/0002_notificar_cambios.sql e invalida el cache.
+
+    Usa una conexión propia (fuera del pool) y se reconecta si se cae; al
+    reconectar se vacía el cache porque pudo perder avisos mientras tanto.
+    """
+    espera = 1
+    while not detener.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CANAL_CAMBIOS};")
+
+            cache.limpiar()
+            espera = 1
+
+            while not detener.is_set():
+                if select.select([conn], [], [], 5) == ([], [], []):
+                    continue
+                conn.poll()
+                tablas = {n.payload for n in conn.notifies}
+                conn.notifies.clear()
+                if tablas:
+                    cache.invalidar(tablas)
+
+        except psycopg2.Error:
+            detener.wait(espera)
+            espera = min(espera * 2, 60)
+
+        finally:
+            if conn is not None and not conn.closed:
+                conn.close()
+
+
+@st.cache_resource
+def get_cache():
+    ttl = float(config("DB_CACHE_TTL", 300))
+    max_mb = float(config("DB_CACHE_MB", 64))
+    cache = CacheConsultas(ttl, int(max_mb * 1024 * 1024))
+
+    if _activado(config("DB_CACHE_LISTEN", True)):
+        cache.listener = iniciar_listener(config("DATABASE_URL"), cache)
+
+    return cache
+
+
+def iniciar_listener(dsn, cache):
+    detener = threading.Event()
+    hilo = threading.Thread(
+        target=_escuchar_cambios,
+        args=(dsn, cache, detener),
+        name="coimpex-listener",
+        daemon=True,
+    )
+    hilo.start()
+    return detener
+
+
+def detener_listener():
+    """Detiene el hilo de LISTEN del cache; termina en a lo sumo 5 segundos."""
+    evento = get_cache().listener
+    if evento is not None:
+        evento.set()
+
+
+def cache_stats():
+    return get_cache().stats()
+
+
+def invalidar_tablas(*tablas):
+    get_cache().invalidar(tablas)
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[round(p * (len(ordenados) - 1))]
+
+
+def _resumen(datos):
+    latencias = datos["latencias"]
+    return {
+        "p50_ms": _percentil(latencias, 0.50),
+        "p95_ms": _percentil(latencias, 0.95),
+        "max_ms": max(latencias, default=0.0),
+        "total_ms": datos["ms_total"],
+    }
+
+
+class MetricasConsultas:
+    """Latencia, filas y bytes de cada consulta por página, y registro de consultas lentas.
+
+    Por consulta y por fase de render se guardan las últimas `muestras`
+    latencias, suficientes para p50/p95 sin que la memoria crezca. Las
+    consultas que tardan más de `lenta_ms` (sin contar aciertos del cache)
+    van al registro de lentas con sus parámetros, para poder analizarlas.
+    """
+
+    def __init__(self, lenta_ms=500, muestras=500, max_lentas=200):
+        self.lenta_ms = lenta_ms
+        self.muestras = muestras
+        self._consultas = {}
+        self._fases = {}
+        self._lentas = deque(maxlen=max_lentas)
+        self._siguiente_id = 1
+        self._lock = threading.Lock()
+
+    def _nuevo(self):
+        return {"llamadas": 0, "ms_total": 0.0, "latencias": deque(maxlen=self.muestras)}
+
+    def registrar(self, pagina, query, params, ms, filas, tamano, cache):
+        texto = " ".join(query.split())
+        with self._lock:
+            datos = self._consultas.get((pagina, texto))
+            if datos is None:
+                datos = self._consultas[(pagina, texto)] = {
+                    **self._nuevo(), "aciertos_cache": 0, "filas": 0, "bytes": 0,
+                }
+            datos["llamadas"] += 1
+            datos["ms_total"] += ms
+            datos["latencias"].append(ms)
+            datos["filas"] += filas
+            datos["bytes"] += tamano
+            datos["aciertos_cache"] += cache
+
+            if not cache and ms >= self.lenta_ms:
+                self._lentas.append({
+                    "id": self._siguiente_id,
+                    "fecha": datetime.now(),
+                    "pagina": pagina,
+                    "query": query,
+                    "params": params,
+                    "ms": ms,
+                    "filas": filas,
+                    "bytes": tamano,
+                    "plan": None,
+                })
+                self._siguiente_id += 1
+
+    def registrar_fase(self, pagina, fase, ms):
+        with self._lock:
+            datos = self._fases.setdefault((pagina, fase), self._nuevo())
+            datos["llamadas"] += 1
+            datos["ms_total"] += ms
+            datos["latencias"].append(ms)
+
+    def adjuntar_plan(self, id_lenta, plan):
+        with self._lock:
+            for entrada in self._lentas:
+                if entrada["id"] == id_lenta:
+                    entrada["plan"] = plan
+
+    def consultas(self):
+        with self._lock:
+            return [
+                {
+                    "pagina": pagina,
+                    "consulta": texto,
+                    "llamadas": d["llamadas"],
+                    "aciertos_cache": d["aciertos_cache"],
+                    **_resumen(d),
+                    "filas_promedio": d["filas"] / d["llamadas"],
+                    "bytes_promedio": d["bytes"] / d["llamadas"],
+                }
+                for (pagina, texto), d in self._consultas.items()
+            ]
+
+    def fases(self):
+        with self._lock:
+            return [
+                {"pagina": pagina, "fase": fase, "llamadas": d["llamadas"], **_resumen(d)}
+                for (pagina, fase), d in self._fases.items()
+            ]
+
+    def lentas(self):
+        # De la más reciente a la más antigua
+        with self._lock:
+            return [dict(e) for e in reversed(self._lentas)]
+
+    def limpiar(self):
+        with self._lock:
+            self._consultas.clear()
+            self._fases.clear()
+            self._lentas.clear()
+
+
+@st.cache_resource
+def get_metricas():
+    return MetricasConsultas(lenta_ms=float(config("DB_LENTA_MS", 500)))
+
+
+# Archivos que no cuentan como "la página" que hizo la consulta
+_INTERNOS = {"db.py", "consultas.py", "contextlib.py"}
+
+
+# Página de la que viene el trabajo de un hilo auxiliar (ver cargar_consultas)
+_hilo = threading.local()
+
+
+def pagina_llamadora():
+    """Nombre del script (página de Streamlit, cli.py...) que originó la llamada."""
+    if getattr(_hilo, "pagina", None):
+        return _hilo.pagina
+    frame = sys._getframe(1)
+    while frame is not None:
+        archivo = os.path.basename(frame.f_code.co_filename)
+        if archivo not in _INTERNOS:
+            return Path(archivo).stem
+        frame = frame.f_back
+    return "desconocida"
+
+
+@contextmanager
+def cronometro(fase: str):
+    """Mide una fase de render (armar un DataFrame, generar un PDF) de la página que lo usa."""
+    pagina = pagina_llamadora()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metricas().registrar_fase(pagina, fase, 1000 * (time.perf_counter() - inicio))
+
+
+def metricas_consultas():
+    return get_metricas().consultas()
+
+
+def metricas_fases():
+    return get_metricas().fases()
+
+
+def consultas_lentas():
+    return get_metricas().lentas()
+
+
+def explicar(query: str, params=None) -> str:
+    """Plan real (EXPLAIN ANALYZE) de una consulta.
+
+    La consulta se ejecuta de verdad, así que siempre se revierte la
+    transacción: un EXPLAIN de un UPDATE no deja cambios.
+    """
+    with conexion() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                return "\n".join(fila[0] for fila in cur.fetchall())
+        finally:
+            if not conn.closed:
+                conn.rollback()
+
+
+@contextmanager
+def transaccion(cursor_factory=None):
+    """Entrega un cursor cuya conexión hace commit al salir o rollback si falla."""
+    with conexion() as conn:
+        try:
+            with conn.cursor(cursor_factory=cursor_factory) as cur:
+                yield cur
+            conn.commit()
+
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
 
-def run_query(query: str, params=None, fetch: str = "all"):
-    conn = get_conn()
 
+def _conexion_perdida(error):
+    # Sin SQLSTATE (se cerró el socket) o de las clases 08 y 57P (el servidor
+    # terminó la conexión); una consulta cancelada (57014) no cuenta
+    codigo = error.pgcode or ""
+    return not codigo or codigo.startswith(("08", "57P"))
+
+
+def _con_reintento(leer):
+    """Ejecuta la lectura `leer()` y la repite una vez si se perdió la conexión.
+
+    Las conexiones usadas hace poco se prestan sin ping, así que tras un
+    reinicio del servidor la primera consulta puede fallar; el pool descarta
+    esa conexión y hace ping a las demás antes de prestar otra. Solo para
+    lecturas: repetir una escritura podría aplicarla dos veces.
+    """
     try:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        return leer()
+    except psycopg2.OperationalError as e:
+        if not _conexion_perdida(e):
+            raise
+        return leer()
+
+
+# RAISE EXCEPTION de las funciones y triggers de migraciones/ (mes cerrado,
+# año archivado...): el mensaje es para mostrarlo tal cual al usuario
+ErrorNegocio = psycopg2.errors.RaiseException
+
+
+def run_query(query: str, params=None, fetch: str = "all"):
+    """Ejecuta una consulta; las lecturas se sirven desde el cache si siguen vigentes.
+
+    Las escrituras (INSERT/UPDATE/DELETE) invalidan las tablas que tocan; las
+    lecturas se repiten una vez con otra conexión si la primera estaba caída.
+    Cada llamada queda en `get_metricas()` con su latencia, filas, bytes
+    estimados y la página que la hizo.
+    """
+    cache = get_cache()
+    metricas = get_metricas()
+    pagina = pagina_llamadora()
+    inicio = time.perf_counter()
+
+    escritas = tablas_escritas(query)
+    leidas = tablas_leidas(query)
+    cacheable = fetch != "none" and not escritas and bool(leidas)
+
+    if cacheable:
+        encontrado, result = cache.obtener(query, params, fetch)
+        if encontrado:
+            ms = 1000 * (time.perf_counter() - inicio)
+            metricas.registrar(pagina, query, params, ms, _filas(result), 0, cache=True)
+            return result
+        versiones = cache.versiones(leidas)
+
+    def ejecutar():
+        with transaccion(psycopg2.extras.RealDictCursor) as cur:
             cur.execute(query, params)
 
             if fetch == "one":
-                result = cur.fetchone()
+                return cur.fetchone()
             elif fetch == "all":
-                result = cur.fetchall()
-            else:
-                result = None
+                return cur.fetchall()
+            return None
+
+    try:
+        result = _con_reintento(ejecutar) if cacheable else ejecutar()
+    finally:
+        if escritas:
+            cache.invalidar(escritas)
 
-        conn.commit()
-        return result
+    ms = 1000 * (time.perf_counter() - inicio)
+    tamano = _tamano(result) if result is not None else 0
+    metricas.registrar(pagina, query, params, ms, _filas(result), tamano, cache=False)
 
-    except Exception:
-        conn.rollback()
-        raise
+    if cacheable:
+        cache.guardar(query, params, fetch, result, versiones, tamano)
 
-    finally:
-        pass
+    return result
+
+
+# Columnas de texto con pocos valores distintos: se devuelven como categóricas
+CATEGORICAS = ("sku", "estado", "bodega", "bodega_origen", "bodega_destino")
+
+# NUMERIC llega como float en vez de Decimal, y DATE como texto ISO que
+# pandas convierte de una vez en lugar de crear un objeto date por fila
+_NUMERIC_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, "NUMERIC_FLOAT",
+    lambda valor, cur: float(valor) if valor is not None else None,
+)
+_DATE_TEXTO = psycopg2.extensions.new_type(
+    psycopg2.extensions.DATE.values, "DATE_TEXTO",
+    lambda valor, cur: valor,
+)
+
+_ENTEROS = set(psycopg2.extensions.INTEGER.values) | set(psycopg2.extensions.LONGINTEGER.values)
+_FLOTANTES = set(psycopg2.extensions.FLOAT.values) | set(psycopg2.extensions.DECIMAL.values)
+_FECHAS = set(psycopg2.extensions.DATE.values)
+_BOOLEANOS = set(psycopg2.extensions.BOOLEAN.values)
+
+
+def _columna(valores, tipo, categorica):
+    nulos = None in valores
+    if tipo in _ENTEROS:
+        return pd.array(valores, dtype="Int64") if nulos else np.array(valores, dtype=np.int64)
+    if tipo in _FLOTANTES:
+        return np.array(valores, dtype=np.float64)
+    if tipo in _FECHAS:
+        return pd.to_datetime(pd.Series(valores, dtype=object), format="%Y-%m-%d")
+    if tipo in _BOOLEANOS:
+        return pd.array(valores, dtype="boolean") if nulos else np.array(valores, dtype=bool)
+    if categorica:
+        return pd.Categorical(valores)
+    return np.array(valores, dtype=object)
+
+
+def _dataframe(filas, descripcion, categoricas):
+    nombres = [c.name for c in descripcion]
+    columnas = list(zip(*filas)) if filas else [()] * len(nombres)
+    return pd.DataFrame(
+        {
+            nombre: _columna(list(valores), c.type_code, nombre in categoricas)
+            for nombre, c, valores in zip(nombres, descripcion, columnas)
+        },
+        columns=nombres,
+    )
+
+
+def run_query_df(query: str, params=None, categoricas=CATEGORICAS) -> pd.DataFrame:
+    """Como `run_query(fetch="all")`, pero devuelve un DataFrame con columnas tipadas.
+
+    Lee con un cursor de tuplas, sin un dict ni un Decimal por fila: los
+    enteros quedan int64 (Int64 si hay nulos), NUMERIC y float float64, las
+    fechas datetime64 y las columnas de `categoricas` como categóricas.
+    Usa el mismo cache y las mismas métricas que `run_query`; cada llamada
+    recibe su propia copia, así que la página puede modificarla.
+    """
+    cache = get_cache()
+    metricas = get_metricas()
+    pagina = pagina_llamadora()
+    inicio = time.perf_counter()
+
+    leidas = tablas_leidas(query)
+    cacheable = bool(leidas) and not tablas_escritas(query)
+    fetch = ("df", tuple(categoricas))
+
+    if cacheable:
+        encontrado, df = cache.obtener(query, params, fetch)
+        if encontrado:
+            ms = 1000 * (time.perf_counter() - inicio)
+            metricas.registrar(pagina, query, params, ms, len(df), 0, cache=True)
+            return df.copy()
+        versiones = cache.versiones(leidas)
+
+    def ejecutar():
+        with transaccion() as cur:
+            psycopg2.extensions.register_type(_NUMERIC_FLOAT, cur)
+            psycopg2.extensions.register_type(_DATE_TEXTO, cur)
+            cur.execute(query, params)
+            return _dataframe(cur.fetchall(), cur.description, set(categoricas))
+
+    df = _con_reintento(ejecutar) if cacheable else ejecutar()
+
+    ms = 1000 * (time.perf_counter() - inicio)
+    tamano = _tamano(df)
+    metricas.registrar(pagina, query, params, ms, len(df), tamano, cache=False)
+
+    if cacheable:
+        cache.guardar(query, params, fetch, df, versiones, tamano)
+        df = df.copy()
+
+    return df
+
+
+def iterar_query_df(query: str, params=None, tamano: int = 50_000, categoricas=()):
+    """Recorre el resultado en DataFrames de `tamano` filas con un cursor del lado del servidor.
+
+    Postgres entrega las filas de a un bloque, así que la memoria depende de
+    `tamano` y no del total de filas; sirve para exportar años completos.
+    Los tipos son los de `run_query_df`. Siempre entrega al menos un
+    DataFrame (vacío si no hay filas) para que se conozcan las columnas.
+    No pasa por el cache.
+    """
+    metricas = get_metricas()
+    pagina = pagina_llamadora()
+    inicio = time.perf_counter()
+    total = 0
+
+    with conexion() as conn:
+        try:
+            with conn.cursor(name=f"iterar_{threading.get_ident()}_{time.monotonic_ns()}") as cur:
+                cur.itersize = tamano
+                psycopg2.extensions.register_type(_NUMERIC_FLOAT, cur)
+                psycopg2.extensions.register_type(_DATE_TEXTO, cur)
+                cur.execute(query, params)
+
+                while True:
+                    filas = cur.fetchmany(tamano)
+                    total += len(filas)
+                    yield _dataframe(filas, cur.description, set(categoricas))
+                    if len(filas) < tamano:
+                        break
+        finally:
+            # Solo lectura: se cierra la transacción del cursor sin confirmar nada
+            if not conn.closed:
+                conn.rollback()
+
+    ms = 1000 * (time.perf_counter() - inicio)
+    metricas.registrar(pagina, query, params, ms, total, 0, cache=False)
+
+
+def _ejecutar_tarea(tarea):
+    if callable(tarea):
+        return tarea()
+    if isinstance(tarea, str):
+        return run_query(tarea)
+    return run_query(*tarea)
+
+
+def cargar_consultas(tareas: dict, max_hilos=None) -> dict:
+    """Ejecuta a la vez las consultas independientes de una página y espera a todas.
+
+    `tareas` va de nombre a consulta: un texto SQL, una tupla con los
+    argumentos de `run_query` (`(query, params, fetch)`) o una función sin
+    argumentos (`lambda: estado_cuenta_facturas(cliente)`). Las que valen
+    None no se ejecutan y quedan como None, así la página declara solo lo
+    que va a usar. Devuelve un dict con los mismos nombres; si alguna falla
+    se relanza el error después de esperar a las demás.
+
+    Cada hilo toma su propia conexión del pool. Los hilos se limitan con
+    DB_CARGA_HILOS (4 por defecto) y con DB_POOL_MIN: el pool de psycopg2
+    solo deja abiertas `minconn` conexiones libres, y por encima de eso cada
+    préstamo abre una conexión nueva, que cuesta más que la consulta.
+    """
+    pendientes = {nombre: tarea for nombre, tarea in tareas.items() if tarea is not None}
+    resultados = dict.fromkeys(tareas)
+    pagina = pagina_llamadora()
+
+    if max_hilos is None:
+        max_hilos = int(config("DB_CARGA_HILOS", 4))
+    hilos = max(1, min(len(pendientes), max_hilos, get_pool().minconn))
+
+    if hilos == 1:
+        for nombre, tarea in pendientes.items():
+            resultados[nombre] = _ejecutar_tarea(tarea)
+        return resultados
+
+    # Los hilos auxiliares reportan las métricas a nombre de la página y,
+    # dentro de Streamlit, comparten el contexto de la sesión
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+    contexto = get_script_run_ctx(suppress_warning=True)
+
+    def preparar():
+        _hilo.pagina = pagina
+        if contexto is not None:
+            add_script_run_ctx(threading.current_thread(), contexto)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(hilos, thread_name_prefix="cargar_consultas", initializer=preparar) as ejecutor:
+        futuros = {nombre: ejecutor.submit(_ejecutar_tarea, tarea) for nombre, tarea in pendientes.items()}
+
+    get_metricas().registrar_fase(pagina, "cargar_consultas", 1000 * (time.perf_counter() - inicio))
+
+    for nombre, futuro in futuros.items():
+        resultados[nombre] = futuro.result()
+    return resultados
+
+
+def _valores(cur, filas, columnas):
+    """Arma la lista `(..), (..)` de un VALUES con las filas ya escapadas."""
+    fila = "(" + ", ".join(["%s"] * len(columnas)) + ")"
+    codificacion = psycopg2.extensions.encodings[cur.connection.encoding]
+    valores = b", ".join(cur.mogrify(fila, [f[c] for c in columnas]) for f in filas)
+    # mogrify ya escapó los valores; solo falta proteger los % del siguiente execute
+    return sql.SQL(valores.decode(codificacion).replace("%", "%%"))
+
+
+def guardar_movimiento(encabezado: dict, detalles: list) -> int:
+    """Inserta el encabezado y todas sus líneas en una sola transacción.
+
+    Encabezado y líneas viajan en una sola sentencia (un CTE con el INSERT
+    del encabezado y un INSERT de varias filas para `detalles`), así que un
+    pedido completo cuesta un viaje a la base de datos y un solo commit.
+    Las líneas toman la fecha del encabezado, que decide su partición; si
+    el mes todavía no tiene partición se crea en el mismo viaje.
+    Devuelve el `id_transaccion` generado.
+    """
+    columnas = list(encabezado)
+    columnas_det = [c for c in detalles[0] if c != "fecha"] if detalles else []
+
+    insert_encabezado = sql.SQL(
+        "INSERT INTO encabezados ({}) VALUES ({}) RETURNING id_transaccion, fecha"
+    ).format(
+        sql.SQL(", ").join(map(sql.Identifier, columnas)),
+        sql.SQL(", ").join(sql.Placeholder() * len(columnas)),
+    )
+    params = [encabezado[c] for c in columnas]
+
+    with transaccion() as cur:
+        if detalles:
+            query = sql.SQL(
+                """
+                WITH e AS ({insert_encabezado}),
+                d AS (
+                    INSERT INTO detalles (id_transaccion, fecha, {cols})
+                    SELECT e.id_transaccion, e.fecha, v.*
+                    FROM e CROSS JOIN (VALUES {valores}) AS v ({cols})
+                )
+                SELECT id_transaccion FROM e
+                """
+            ).format(
+                insert_encabezado=insert_encabezado,
+                cols=sql.SQL(", ").join(map(sql.Identifier, columnas_det)),
+                valores=_valores(cur, detalles, columnas_det),
+            )
+        else:
+            query = insert_encabezado
+
+        fecha = sql.Literal(encabezado["fecha"])
+        query = sql.SQL("SELECT crear_particiones({fecha}, {fecha}); {query}").format(fecha=fecha, query=query)
+        cur.execute(query, params)
+        id_transaccion = cur.fetchone()[0]
+
+    invalidar_tablas("encabezados", "detalles")
+    return id_transaccion
+
+
+def actualizar_detalles(id_transaccion: int, fecha, cambiados: list, nuevos: list, borrados: list):
+    """Aplica solo las líneas modificadas, agregadas y eliminadas de un movimiento.
+
+    Los cambios se envían como un único UPDATE/INSERT/DELETE basado en
+    conjuntos y el total del encabezado se recalcula en la misma transacción.
+    `fecha` es la del encabezado; con ella cada sentencia lee solo la
+    partición de su mes. `cambiados` lleva `id_detalle, sku, cantidad,
+    precio`; `nuevos` lleva `sku, cantidad, precio`; `borrados` es la lista
+    de `id_detalle`.
+    """
+    if not (cambiados or nuevos or borrados):
+        return
+
+    ctes = []
+    columnas = ["sku", "cantidad", "precio"]
+
+    with transaccion() as cur:
+        if cambiados:
+            ctes.append(sql.SQL(
+                """
+                upd AS (
+                    UPDATE detalles d
+                    SET sku = v.sku,
+                        cantidad = v.cantidad,
+                        precio = v.precio,
+                        subtotal = v.cantidad * v.precio
+                    FROM (VALUES {valores}) AS v (id_detalle, sku, cantidad, precio)
+                    WHERE d.id_detalle = v.id_detalle AND d.id_transaccion = %(id)s AND d.fecha = %(fecha)s
+                )
+                """
+            ).format(
+                valores=_valores(cur, cambiados, ["id_detalle", *columnas]),
+            ))
+
+        if nuevos:
+            ctes.append(sql.SQL(
+                """
+                ins AS (
+                    INSERT INTO detalles (id_transaccion, fecha, sku, cantidad, precio, subtotal)
+                    SELECT e.id_transaccion, e.fecha, v.sku, v.cantidad, v.precio, v.cantidad * v.precio
+                    FROM encabezados e CROSS JOIN (VALUES {valores}) AS v (sku, cantidad, precio)
+                    WHERE e.id_transaccion = %(id)s AND e.fecha = %(fecha)s
+                )
+                """
+            ).format(
+                valores=_valores(cur, nuevos, columnas),
+            ))
+
+        if borrados:
+            ctes.append(sql.SQL(
+                """
+                del AS (
+                    DELETE FROM detalles
+                    WHERE id_transaccion = %(id)s AND fecha = %(fecha)s AND id_detalle = ANY(%(borrados)s)
+                )
+                """
+            ))
+
+        # Los CTE no ven sus propios cambios, por eso el total va en una
+        # segunda sentencia; ambas viajan juntas en el mismo execute.
+        cur.execute(sql.SQL(
+            """
+            WITH {ctes} SELECT 1;
+            UPDATE encabezados
+            SET total = (
+                SELECT COALESCE(SUM(subtotal), 0) FROM detalles WHERE id_transaccion = %(id)s AND fecha = %(fecha)s
+            )
+            WHERE id_transaccion = %(id)s AND fecha = %(fecha)s;
+            """
+        ).format(
+            ctes=sql.SQL(", ").join(ctes),
+        ), {"id": id_transaccion, "fecha": fecha, "borrados": list(borrados)})
+
+    invalidar_tablas("encabezados", "detalles")
+
+
+def reconstruir_inventario():
+    """Recalcula `inventario` desde el historial y devuelve los SKUs que no cuadraban."""
+    with transaccion(psycopg2.extras.RealDictCursor) as cur:
+        cur.execute("SELECT * FROM reconstruir_inventario()")
+        result = cur.fetchall()
+
+    invalidar_tablas("inventario", "inventario_bodegas")
+    return result
+
+
+def reconstruir_movimientos_diarios() -> int:
+    """Recalcula `movimientos_diarios` desde el historial; devuelve cuántas filas no cuadraban."""
+    with transaccion() as cur:
+        cur.execute("SELECT reconstruir_movimientos_diarios()")
+        distintas = cur.fetchone()[0]
+
+    invalidar_tablas("movimientos_diarios")
+    return distintas
+
+
+def aplicar_pago(id_cliente: int, fecha, monto: float):
+    """Registra un pago y lo reparte FIFO entre las facturas abiertas del cliente.
+
+    Todo ocurre en una sola sentencia: se inserta el pago, se bloquean las
+    facturas abiertas (FOR UPDATE) para que dos cajeros no apliquen el mismo
+    saldo, se calcula cuánto toca a cada una con una suma acumulada y se
+    guarda cada asignación en `pagos_facturas`. Devuelve las asignaciones;
+    lo que sobre del monto queda como saldo a favor del pago.
+    """
+    with transaccion(psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(
+            """
+            WITH pago AS (
+                INSERT INTO pagos (fecha, monto_pagado, id_cliente)
+                VALUES (%(fecha)s, %(monto)s, %(id_cliente)s)
+                RETURNING id_pago
+            ),
+            abiertas AS (
+                SELECT id_transaccion, fecha, total - COALESCE(pagado, 0) AS pendiente
+                FROM encabezados
+                WHERE id_cliente = %(id_cliente)s
+                  AND COALESCE(estado, '') NOT IN ('Pagada', 'Anulada')
+                  AND total > COALESCE(pagado, 0)
+                FOR UPDATE
+            ),
+            acumulado AS (
+                SELECT
+                    id_transaccion,
+                    fecha,
+                    pendiente,
+                    SUM(pendiente) OVER (ORDER BY fecha, id_transaccion) - pendiente AS antes
+                FROM abiertas
+            ),
+            asignacion AS (
+                SELECT id_transaccion, fecha, LEAST(pendiente, %(monto)s - antes) AS monto
+                FROM acumulado
+                WHERE antes < %(monto)s
+            ),
+            upd AS (
+                UPDATE encabezados e
+                SET pagado = COALESCE(e.pagado, 0) + a.monto,
+                    estado = CASE
+                        WHEN COALESCE(e.pagado, 0) + a.monto >= e.total THEN 'Pagada'
+                        ELSE 'Pagada parcialmente'
+                    END
+                FROM asignacion a
+                -- El rango de fechas de las asignaciones deja leer solo los
+                -- meses de esas facturas (poda en ejecución); el cliente, solo
+                -- sus facturas dentro de cada mes
+                WHERE e.id_transaccion = a.id_transaccion
+                  AND e.fecha = a.fecha
+                  AND e.fecha BETWEEN (SELECT min(fecha) FROM asignacion) AND (SELECT max(fecha) FROM asignacion)
+                  AND e.id_cliente = %(id_cliente)s
+            ),
+            links AS (
+                INSERT INTO pagos_facturas (id_pago, id_transaccion, monto)
+                SELECT pago.id_pago, a.id_transaccion, a.monto
+                FROM pago CROSS JOIN asignacion a
+            )
+            SELECT pago.id_pago, a.id_transaccion, a.monto
+            FROM pago LEFT JOIN asignacion a ON true
+            ORDER BY a.id_transaccion;
+            """,
+            {"id_cliente": id_cliente, "fecha": fecha, "monto": monto},
+        )
+        asignaciones = [fila for fila in cur.fetchall() if fila["id_transaccion"] is not None]
+
+    invalidar_tablas("pagos", "pagos_facturas", "encabezados")
+    return asignaciones
+
+
+def cerrar_periodo(periodo):
+    """Cierra el mes de `periodo` (y los abiertos desde el último cierre) y recalcula los posteriores. Devuelve cuántos calculó."""
+    with transaccion() as cur:
+        cur.execute("SELECT cerrar_periodo(%s)", (periodo,))
+        calculados = cur.fetchone()[0]
+
+    invalidar_tablas("cierres", "saldos_mensuales")
+    return calculados
+
+
+def reabrir_periodo(periodo):
+    """Reabre el mes de `periodo` y todos los posteriores. Devuelve cuántos meses reabrió."""
+    with transaccion() as cur:
+        cur.execute("SELECT reabrir_periodo(%s)", (periodo,))
+        reabiertos = cur.fetchone()[0]
+
+    invalidar_tablas("cierres", "saldos_mensuales")
+    return reabiertos
+
+
+def crear_particiones(meses: int = 3) -> int:
+    """Crea las particiones mensuales de hoy a `meses` meses adelante. Devuelve cuántas tablas creó."""
+    with transaccion() as cur:
+        cur.execute(
+            "SELECT crear_particiones(current_date, (current_date + make_interval(months => %s))::date)",
+            (meses,),
+        )
+        return cur.fetchone()[0]
+
+
+def archivar_anio(anio: int) -> int:
+    """Separa las particiones de un año cerrado y las mueve al esquema `archivo`.
+
+    Sus movimientos dejan de estar en `encabezados` y `detalles` sin
+    borrarse fila por fila; el inventario conserva lo que aportaron.
+    Devuelve cuántos meses se archivaron.
+    """
+    with transaccion() as cur:
+        cur.execute("SELECT archivar_anio(%s)", (anio,))
+        meses = cur.fetchone()[0]
+
+    invalidar_tablas("encabezados", "detalles")
+    return meses
@@ -0,0 +1,75 @@
+"""Generación en lote de los estados de cuenta de todos los clientes.
+
+Los datos se traen con dos consultas para todos los clientes y los PDFs se
+arman en paralelo en un pool de procesos; cada PDF se agrega al ZIP en
+cuanto está listo.
+"""
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+from consultas import estados_cuenta_lote
+from data import preparar_estado_cuenta, renderizar_estado_cuenta
+
+
+def _nombre_archivo(id_cliente, nombre):
+    seguro = re.sub(r"[^\w\-]+", "_", nombre.strip()).strip("_") or "cliente"
+    return f"{id_cliente:04d}_estado_cuenta_{seguro}.pdf"
+
+
+def _trabajos(lineas, totales):
+    if lineas.empty:
+        return []
+
+    por_cliente = dict(tuple(lineas.groupby("id_cliente", sort=False)))
+    trabajos = []
+
+    for t in totales:
+        df = por_cliente.get(t["id_cliente"])
+        if df is None:
+            continue
+        trabajos.append((
+            _nombre_archivo(t["id_cliente"], t["nombre"]),
+            preparar_estado_cuenta(df),
+            t["nombre"],
+            float(t["total_comprado"]),
+            float(t["total_pagado"]),
+            float(t["total_pendiente"]),
+        ))
+
+    return trabajos
+
+
+def generar_estados_lote(destino, estados=None, fecha_inicio=None, fecha_fin=None, progreso=None, procesos=None):
+    """Escribe en `destino` (ruta o buffer) un ZIP con un PDF por cliente.
+
+    `progreso(hechos, total)` se llama cada vez que termina un PDF. Devuelve
+    cuántos estados de cuenta se generaron.
+    """
+    lineas, totales = estados_cuenta_lote(estados, fecha_inicio, fecha_fin)
+    trabajos = _trabajos(lineas, totales)
+    total = len(trabajos)
+
+    if progreso:
+        progreso(0, total)
+    if not trabajos:
+        return 0
+
+    procesos = procesos or min(total, os.cpu_count() or 1)
+
+    # spawn: los procesos hijos no heredan los hilos ni las conexiones de Streamlit
+    contexto = multiprocessing.get_context("spawn")
+
+    with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as zf, \
+            ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+        futuros = [pool.submit(renderizar_estado_cuenta, trabajo) for trabajo in trabajos]
+
+        for hechos, futuro in enumerate(as_completed(futuros), start=1):
+            nombre_archivo, pdf = futuro.result()
+            zf.writestr(nombre_archivo, pdf)
+            if progreso:
+                progreso(hechos, total)
+
+    return total
@@ -0,0 +1,148 @@
+"""Exportación del kardex y de los movimientos a CSV, XLSX o Parquet.
+
+Las filas se leen con un cursor del lado del servidor (`db.iterar_query_df`)
+en bloques de TAMANO_BLOQUE y cada bloque se escribe antes de pedir el
+siguiente, así que la memoria no depende de cuántos años se exporten.
+XLSX necesita `xlsxwriter` y Parquet `pyarrow`; se importan solo al usarlos.
+"""
+import io
+import tempfile
+
+import pandas as pd
+
+from consultas import exportacion_kardex, exportacion_movimientos
+from data import productos
+from db import iterar_query_df
+
+TAMANO_BLOQUE = 50_000
+
+# Excel no admite más filas por hoja; el resto sigue en otra hoja
+MAX_FILAS_XLSX = 1_048_575
+
+FORMATOS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+CONSULTAS = {
+    "kardex": exportacion_kardex,
+    "movimientos": exportacion_movimientos,
+}
+
+
+def _con_producto(bloques):
+    # Nombre del producto junto al SKU
+    for df in bloques:
+        df.insert(df.columns.get_loc("sku") + 1, "producto", df["sku"].map(productos))
+        yield df
+
+
+def _escribir_csv(destino, bloques):
+    texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+    try:
+        for i, df in enumerate(bloques):
+            df.to_csv(texto, index=False, header=i == 0, date_format="%Y-%m-%d")
+    finally:
+        texto.flush()
+        texto.detach()
+
+
+def _escribir_xlsx(destino, bloques):
+    import xlsxwriter
+
+    # constant_memory: cada fila se baja a disco en cuanto se escribe
+    libro = xlsxwriter.Workbook(destino, {
+        "constant_memory": True,
+        "default_date_format": "dd/mm/yyyy",
+        "nan_inf_to_errors": True,
+    })
+    hoja = None
+    fila = 0
+
+    for df in bloques:
+        # Nulos como celdas vacías
+        valores = df.astype(object).where(df.notna(), None)
+        for registro in valores.itertuples(index=False, name=None):
+            if hoja is None or fila > MAX_FILAS_XLSX:
+                hoja = libro.add_worksheet()
+                hoja.write_row(0, 0, list(df.columns))
+                fila = 1
+            hoja.write_row(fila, 0, registro)
+            fila += 1
+
+        if hoja is None:
+            hoja = libro.add_worksheet()
+            hoja.write_row(0, 0, list(df.columns))
+
+    libro.close()
+
+
+def _esquema_parquet(df):
+    import pyarrow as pa
+
+    # El esquema sale de los tipos de la consulta, no de los valores del primer
+    # bloque: una columna vacía en un bloque no debe cambiar su tipo
+    campos = []
+    for nombre, tipo in df.dtypes.items():
+        if pd.api.types.is_bool_dtype(tipo):
+            campos.append(pa.field(nombre, pa.bool_()))
+        elif pd.api.types.is_integer_dtype(tipo):
+            campos.append(pa.field(nombre, pa.int64()))
+        elif pd.api.types.is_float_dtype(tipo):
+            campos.append(pa.field(nombre, pa.float64()))
+        elif pd.api.types.is_datetime64_any_dtype(tipo):
+            campos.append(pa.field(nombre, pa.date32()))
+        else:
+            campos.append(pa.field(nombre, pa.string()))
+    return pa.schema(campos)
+
+
+def _escribir_parquet(destino, bloques):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    escritor = None
+    try:
+        for df in bloques:
+            if escritor is None:
+                esquema = _esquema_parquet(df)
+                escritor = pq.ParquetWriter(destino, esquema, compression="zstd")
+            df = df.copy()
+            for col in df.select_dtypes("datetime").columns:
+                df[col] = df[col].dt.date
+            escritor.write_table(pa.Table.from_pandas(df, schema=esquema, preserve_index=False))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+_ESCRITORES = {
+    "csv": _escribir_csv,
+    "xlsx": _escribir_xlsx,
+    "parquet": _escribir_parquet,
+}
+
+
+def exportar(destino, que: str, formato: str, filtros: dict, tamano_bloque: int = TAMANO_BLOQUE):
+    """Escribe en `destino` (ruta o archivo binario) el kardex o los movimientos.
+
+    `que` es "kardex" o "movimientos"; `filtros` usa las mismas claves que
+    `consultar_kardex`.
+    """
+    query, params = CONSULTAS[que](filtros)
+    bloques = _con_producto(iterar_query_df(query, params, tamano=tamano_bloque))
+
+    if isinstance(destino, str):
+        with open(destino, "wb") as archivo:
+            _ESCRITORES[formato](archivo, bloques)
+    else:
+        _ESCRITORES[formato](destino, bloques)
+
+
+def exportar_temporal(que: str, formato: str, filtros: dict):
+    """Exporta a un archivo temporal en disco y lo devuelve listo para leer."""
+    archivo = tempfile.TemporaryFile()
+    exportar(archivo, que, formato, filtros)
+    archivo.seek(0)
+    return archivo
@@ -0,0 +1,54 @@
+-- Tablas que usan las páginas de la app.
+-- IF NOT EXISTS para poder marcar como migrada una base que ya existía.
+
+CREATE TABLE IF NOT EXISTS clientes (
+    id_cliente serial PRIMARY KEY,
+    nombre     text NOT NULL,
+    nit        text,
+    telefono   text,
+    email      text,
+    direccion  text
+);
+
+CREATE TABLE IF NOT EXISTS proveedores (
+    id_proveedor serial PRIMARY KEY,
+    nombre       text NOT NULL,
+    telefono     text,
+    email        text
+);
+
+-- transaccion: 1 = Venta, 2 = Compra, 3 = Transferencia
+CREATE TABLE IF NOT EXISTS encabezados (
+    id_transaccion serial PRIMARY KEY,
+    fecha          date NOT NULL,
+    no_envio       text,
+    transaccion    integer NOT NULL CHECK (transaccion IN (1, 2, 3)),
+    tipo_venta     text,
+    metodo_pago    text,
+    bodega_origen  text,
+    bodega_destino text,
+    id_cliente     integer REFERENCES clientes (id_cliente),
+    id_proveedor   integer REFERENCES proveedores (id_proveedor),
+    total          numeric(14, 2) NOT NULL DEFAULT 0,
+    pagado         numeric(14, 2) NOT NULL DEFAULT 0,
+    observaciones  text,
+    estado         text,
+    factura        boolean NOT NULL DEFAULT false
+);
+
+CREATE TABLE IF NOT EXISTS detalles (
+    id_detalle     serial PRIMARY KEY,
+    id_transaccion integer NOT NULL REFERENCES encabezados (id_transaccion) ON DELETE CASCADE,
+    fecha          date,
+    sku            text NOT NULL,
+    cantidad       integer NOT NULL,
+    precio         numeric(14, 2),
+    subtotal       numeric(14, 2)
+);
+
+CREATE TABLE IF NOT EXISTS pagos (
+    id_pago      serial PRIMARY KEY,
+    fecha        date NOT NULL,
+    monto_pagado numeric(14, 2) NOT NULL,
+    id_cliente   integer NOT NULL REFERENCES clientes (id_cliente)
+);
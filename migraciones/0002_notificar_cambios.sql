@@ -0,0 +1,25 @@
+-- Avisa a todas las réplicas de la app cuando cambia una tabla cacheada.
+-- Cada proceso escucha el canal `coimpex_cambios` (ver db.iniciar_listener)
+-- y descarta los resultados que dependen de la tabla indicada en el payload.
+
+CREATE OR REPLACE FUNCTION notificar_cambio() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('coimpex_cambios', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tabla text;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['encabezados', 'detalles', 'pagos', 'clientes', 'proveedores'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tabla || '_notificar', tabla);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio()',
+            tabla || '_notificar', tabla
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,200 @@
+-- Saldo de inventario por SKU (`inventario`) y por SKU × bodega
+-- (`inventario_bodegas`) mantenidos de forma incremental.
+-- Los triggers aplican cada movimiento al guardarse, editarse o anularse,
+-- así que el inventario actual se lee en O(número de SKUs).
+-- `SELECT * FROM reconstruir_inventario()` los reconcilia contra el historial.
+
+CREATE TABLE IF NOT EXISTS inventario (
+    sku          text PRIMARY KEY,
+    entradas     numeric NOT NULL DEFAULT 0,
+    salidas      numeric NOT NULL DEFAULT 0,
+    stock_actual numeric NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS inventario_bodegas (
+    sku          text NOT NULL,
+    bodega       text NOT NULL,
+    entradas     numeric NOT NULL DEFAULT 0,
+    salidas      numeric NOT NULL DEFAULT 0,
+    stock_actual numeric NOT NULL DEFAULT 0,
+    PRIMARY KEY (sku, bodega)
+);
+
+-- Compra (2) suma, Venta (1) resta; las transferencias no cambian el total
+CREATE OR REPLACE FUNCTION inventario_aplicar(p_sku text, p_transaccion int, p_cantidad numeric)
+RETURNS void AS $$
+BEGIN
+    IF p_transaccion NOT IN (1, 2) OR p_cantidad IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO inventario AS i (sku, entradas, salidas, stock_actual)
+    VALUES (
+        p_sku,
+        CASE WHEN p_transaccion = 2 THEN p_cantidad ELSE 0 END,
+        CASE WHEN p_transaccion = 1 THEN p_cantidad ELSE 0 END,
+        CASE WHEN p_transaccion = 2 THEN p_cantidad ELSE -p_cantidad END
+    )
+    ON CONFLICT (sku) DO UPDATE SET
+        entradas = i.entradas + EXCLUDED.entradas,
+        salidas = i.salidas + EXCLUDED.salidas,
+        stock_actual = i.stock_actual + EXCLUDED.stock_actual;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventario_bodega_aplicar(p_sku text, p_bodega text, p_entrada numeric, p_salida numeric)
+RETURNS void AS $$
+BEGIN
+    IF NULLIF(p_bodega, '') IS NULL OR p_entrada IS NULL OR p_salida IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO inventario_bodegas AS i (sku, bodega, entradas, salidas, stock_actual)
+    VALUES (p_sku, p_bodega, p_entrada, p_salida, p_entrada - p_salida)
+    ON CONFLICT (sku, bodega) DO UPDATE SET
+        entradas = i.entradas + EXCLUDED.entradas,
+        salidas = i.salidas + EXCLUDED.salidas,
+        stock_actual = i.stock_actual + EXCLUDED.stock_actual;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Aplica una línea (cantidad negativa para revertirla) a ambos saldos.
+-- Venta: sale de bodega_origen. Compra: entra a bodega_destino.
+-- Transferencia: sale de bodega_origen y entra a bodega_destino.
+CREATE OR REPLACE FUNCTION movimiento_aplicar(e encabezados, p_sku text, p_cantidad numeric)
+RETURNS void AS $$
+BEGIN
+    IF e.estado IS NOT DISTINCT FROM 'Anulada' THEN
+        RETURN;
+    END IF;
+
+    PERFORM inventario_aplicar(p_sku, e.transaccion, p_cantidad);
+
+    IF e.transaccion IN (2, 3) THEN
+        PERFORM inventario_bodega_aplicar(p_sku, e.bodega_destino, p_cantidad, 0);
+    END IF;
+    IF e.transaccion IN (1, 3) THEN
+        PERFORM inventario_bodega_aplicar(p_sku, e.bodega_origen, 0, p_cantidad);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventario_detalles() RETURNS trigger AS $$
+DECLARE
+    e encabezados%ROWTYPE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = OLD.id_transaccion;
+        IF FOUND THEN
+            PERFORM movimiento_aplicar(e, OLD.sku, -OLD.cantidad);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = NEW.id_transaccion;
+        IF FOUND THEN
+            PERFORM movimiento_aplicar(e, NEW.sku, NEW.cantidad);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Anular, reactivar, cambiar tipo o bodegas, o borrar un encabezado mueve todas sus líneas
+CREATE OR REPLACE FUNCTION inventario_encabezados() RETURNS trigger AS $$
+BEGIN
+    PERFORM movimiento_aplicar(OLD, d.sku, -d.cantidad)
+    FROM detalles d WHERE d.id_transaccion = OLD.id_transaccion;
+
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM movimiento_aplicar(NEW, d.sku, d.cantidad)
+        FROM detalles d WHERE d.id_transaccion = NEW.id_transaccion;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS detalles_inventario ON detalles;
+CREATE TRIGGER detalles_inventario
+    AFTER INSERT OR UPDATE OF sku, cantidad, id_transaccion OR DELETE ON detalles
+    FOR EACH ROW EXECUTE FUNCTION inventario_detalles();
+
+DROP TRIGGER IF EXISTS encabezados_inventario ON encabezados;
+CREATE TRIGGER encabezados_inventario
+    AFTER UPDATE OF estado, transaccion, bodega_origen, bodega_destino ON encabezados
+    FOR EACH ROW
+    WHEN ((OLD.estado = 'Anulada') IS DISTINCT FROM (NEW.estado = 'Anulada')
+          OR OLD.transaccion IS DISTINCT FROM NEW.transaccion
+          OR OLD.bodega_origen IS DISTINCT FROM NEW.bodega_origen
+          OR OLD.bodega_destino IS DISTINCT FROM NEW.bodega_destino)
+    EXECUTE FUNCTION inventario_encabezados();
+
+-- BEFORE para que las líneas todavía existan al descontarlas; si luego se
+-- borran en cascada, su trigger ya no encuentra el encabezado y no resta dos veces
+DROP TRIGGER IF EXISTS encabezados_inventario_borrar ON encabezados;
+CREATE TRIGGER encabezados_inventario_borrar
+    BEFORE DELETE ON encabezados
+    FOR EACH ROW EXECUTE FUNCTION inventario_encabezados();
+
+-- Recalcula ambos saldos desde todo el historial y devuelve los SKUs que no cuadraban
+CREATE OR REPLACE FUNCTION reconstruir_inventario()
+RETURNS TABLE (sku text, stock_anterior numeric, stock_historial numeric) AS $$
+#variable_conflict use_column
+BEGIN
+    LOCK TABLE inventario, inventario_bodegas IN EXCLUSIVE MODE;
+
+    DROP TABLE IF EXISTS inventario_historial;
+    CREATE TEMP TABLE inventario_historial ON COMMIT DROP AS
+    SELECT
+        d.sku::text AS sku,
+        SUM(CASE WHEN e.transaccion = 2 THEN d.cantidad ELSE 0 END)::numeric AS entradas,
+        SUM(CASE WHEN e.transaccion = 1 THEN d.cantidad ELSE 0 END)::numeric AS salidas,
+        SUM(
+            CASE
+                WHEN e.transaccion = 2 THEN d.cantidad
+                WHEN e.transaccion = 1 THEN -d.cantidad
+                ELSE 0
+            END
+        )::numeric AS stock_actual
+    FROM detalles d
+    JOIN encabezados e ON d.id_transaccion = e.id_transaccion
+    WHERE e.estado IS DISTINCT FROM 'Anulada'
+    GROUP BY d.sku;
+
+    RETURN QUERY
+    SELECT COALESCE(h.sku, i.sku), i.stock_actual, h.stock_actual
+    FROM inventario_historial h
+    FULL JOIN inventario i ON i.sku = h.sku
+    WHERE COALESCE(h.entradas, 0) <> COALESCE(i.entradas, 0)
+       OR COALESCE(h.salidas, 0) <> COALESCE(i.salidas, 0)
+       OR COALESCE(h.stock_actual, 0) <> COALESCE(i.stock_actual, 0);
+
+    DELETE FROM inventario;
+    INSERT INTO inventario SELECT * FROM inventario_historial;
+
+    DELETE FROM inventario_bodegas;
+    INSERT INTO inventario_bodegas (sku, bodega, entradas, salidas, stock_actual)
+    SELECT m.sku, m.bodega, SUM(m.entrada), SUM(m.salida), SUM(m.entrada - m.salida)
+    FROM detalles d
+    JOIN encabezados e ON d.id_transaccion = e.id_transaccion
+    CROSS JOIN LATERAL (
+        VALUES
+            (d.sku::text, e.bodega_destino, CASE WHEN e.transaccion IN (2, 3) THEN d.cantidad ELSE 0 END, 0::numeric),
+            (d.sku::text, e.bodega_origen, 0::numeric, CASE WHEN e.transaccion IN (1, 3) THEN d.cantidad ELSE 0 END)
+    ) AS m (sku, bodega, entrada, salida)
+    WHERE e.estado IS DISTINCT FROM 'Anulada'
+      AND NULLIF(m.bodega, '') IS NOT NULL
+      AND (m.entrada <> 0 OR m.salida <> 0)
+    GROUP BY m.sku, m.bodega;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Carga inicial desde el historial existente
+SELECT * FROM reconstruir_inventario();
+ANALYZE inventario;
+ANALYZE inventario_bodegas;
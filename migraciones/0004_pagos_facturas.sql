@@ -0,0 +1,16 @@
+-- Registro de qué parte de cada pago se aplicó a qué factura.
+-- Lo llena db.aplicar_pago en la misma transacción que el pago.
+
+CREATE TABLE IF NOT EXISTS pagos_facturas (
+    id_pago        integer NOT NULL REFERENCES pagos (id_pago) ON DELETE CASCADE,
+    id_transaccion integer NOT NULL REFERENCES encabezados (id_transaccion) ON DELETE CASCADE,
+    monto          numeric NOT NULL CHECK (monto > 0),
+    PRIMARY KEY (id_pago, id_transaccion)
+);
+
+CREATE INDEX IF NOT EXISTS pagos_facturas_transaccion_idx ON pagos_facturas (id_transaccion);
+
+-- Avisos al cache de las réplicas (0002_notificar_cambios.sql)
+DROP TRIGGER IF EXISTS pagos_facturas_notificar ON pagos_facturas;
+CREATE TRIGGER pagos_facturas_notificar AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pagos_facturas
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio();
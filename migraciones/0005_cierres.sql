@@ -0,0 +1,118 @@
+-- Cierres mensuales de saldos de clientes.
+-- Cada período cerrado guarda por cliente el saldo inicial, los cargos
+-- (ventas no anuladas), los abonos (pagos) y el saldo final. Un estado de
+-- cuenta parte del último cierre y solo suma los movimientos posteriores.
+
+CREATE TABLE IF NOT EXISTS cierres (
+    periodo    date PRIMARY KEY CHECK (periodo = date_trunc('month', periodo)),
+    cerrado_en timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS saldos_mensuales (
+    periodo       date NOT NULL REFERENCES cierres (periodo) ON DELETE CASCADE,
+    id_cliente    integer NOT NULL,
+    saldo_inicial numeric NOT NULL,
+    cargos        numeric NOT NULL,
+    abonos        numeric NOT NULL,
+    saldo_final   numeric NOT NULL,
+    PRIMARY KEY (periodo, id_cliente)
+);
+
+CREATE INDEX IF NOT EXISTS saldos_mensuales_cliente_idx ON saldos_mensuales (id_cliente, periodo DESC);
+
+-- Calcula un período a partir del último cierre anterior (si existe) más
+-- los movimientos entre ese cierre y el inicio del período.
+CREATE OR REPLACE FUNCTION calcular_periodo(p_periodo date) RETURNS void AS $$
+DECLARE
+    v_anterior date;
+    v_desde    date;
+    v_fin      date := p_periodo + interval '1 month';
+BEGIN
+    SELECT max(periodo) INTO v_anterior FROM cierres WHERE periodo < p_periodo;
+    v_desde := COALESCE(v_anterior + interval '1 month', '-infinity'::date);
+
+    DELETE FROM saldos_mensuales WHERE periodo = p_periodo;
+
+    INSERT INTO saldos_mensuales (periodo, id_cliente, saldo_inicial, cargos, abonos, saldo_final)
+    WITH movimientos AS (
+        SELECT id_cliente, fecha, total AS cargo, 0 AS abono
+        FROM encabezados
+        WHERE id_cliente IS NOT NULL
+          AND estado IS DISTINCT FROM 'Anulada'
+          AND fecha >= v_desde AND fecha < v_fin
+        UNION ALL
+        SELECT id_cliente, fecha, 0, monto_pagado
+        FROM pagos
+        WHERE fecha >= v_desde AND fecha < v_fin
+    ),
+    por_cliente AS (
+        SELECT
+            id_cliente,
+            SUM(cargo - abono) FILTER (WHERE fecha < p_periodo) AS neto_previo,
+            COALESCE(SUM(cargo) FILTER (WHERE fecha >= p_periodo), 0) AS cargos,
+            COALESCE(SUM(abono) FILTER (WHERE fecha >= p_periodo), 0) AS abonos
+        FROM movimientos
+        GROUP BY id_cliente
+    ),
+    base AS (
+        SELECT
+            COALESCE(a.id_cliente, m.id_cliente) AS id_cliente,
+            COALESCE(a.saldo_final, 0) + COALESCE(m.neto_previo, 0) AS saldo_inicial,
+            COALESCE(m.cargos, 0) AS cargos,
+            COALESCE(m.abonos, 0) AS abonos
+        FROM (SELECT * FROM saldos_mensuales WHERE periodo = v_anterior) a
+        FULL JOIN por_cliente m ON m.id_cliente = a.id_cliente
+    )
+    SELECT p_periodo, id_cliente, saldo_inicial, cargos, abonos, saldo_inicial + cargos - abonos
+    FROM base;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Vuelve a calcular, en orden, los períodos cerrados desde p_periodo
+CREATE OR REPLACE FUNCTION recalcular_cierres(p_periodo date) RETURNS integer AS $$
+DECLARE
+    v_periodo date;
+    v_total   integer := 0;
+BEGIN
+    FOR v_periodo IN SELECT periodo FROM cierres WHERE periodo >= p_periodo ORDER BY periodo LOOP
+        PERFORM calcular_periodo(v_periodo);
+        v_total := v_total + 1;
+    END LOOP;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cerrar_periodo(p_periodo date) RETURNS integer AS $$
+BEGIN
+    p_periodo := date_trunc('month', p_periodo);
+    INSERT INTO cierres (periodo) VALUES (p_periodo)
+    ON CONFLICT (periodo) DO UPDATE SET cerrado_en = now();
+    RETURN recalcular_cierres(p_periodo);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reabre un período: se borra su cierre y los posteriores se recalculan
+-- encadenados al cierre anterior que quede
+CREATE OR REPLACE FUNCTION reabrir_periodo(p_periodo date) RETURNS integer AS $$
+BEGIN
+    p_periodo := date_trunc('month', p_periodo);
+    DELETE FROM cierres WHERE periodo = p_periodo;
+    RETURN recalcular_cierres(p_periodo);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Avisos al cache de las réplicas (0002_notificar_cambios.sql)
+DO $$
+DECLARE
+    tabla text;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['cierres', 'saldos_mensuales'] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', tabla || '_notificar', tabla);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+             FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio()',
+            tabla || '_notificar', tabla
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,8 @@
+-- Índices para buscar envíos por prefijo y listar los más recientes.
+
+-- text_pattern_ops permite usar el índice en `no_envio LIKE 'ABC%'` con cualquier collation
+CREATE INDEX IF NOT EXISTS encabezados_no_envio_idx
+    ON encabezados (no_envio text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS encabezados_fecha_idx
+    ON encabezados (fecha DESC, id_transaccion DESC);
@@ -0,0 +1,36 @@
+-- Índices para las consultas de las páginas.
+
+-- Join encabezados ⋈ detalles y líneas de una transacción en orden
+CREATE INDEX IF NOT EXISTS detalles_transaccion_idx
+    ON detalles (id_transaccion, id_detalle);
+
+-- Kardex filtrado por SKU
+CREATE INDEX IF NOT EXISTS detalles_sku_idx
+    ON detalles (sku, id_transaccion);
+
+-- Orden y paginación por llave del kardex: (fecha, no_envio, id_transaccion)
+CREATE INDEX IF NOT EXISTS encabezados_kardex_idx
+    ON encabezados (fecha, (COALESCE(no_envio, '')), id_transaccion);
+
+-- Estado de cuenta de un cliente ordenado por fecha
+CREATE INDEX IF NOT EXISTS encabezados_cliente_idx
+    ON encabezados (id_cliente, fecha, id_transaccion)
+    WHERE id_cliente IS NOT NULL;
+
+-- Facturas abiertas: aplicación de pagos y antigüedad de saldos
+CREATE INDEX IF NOT EXISTS encabezados_abiertas_idx
+    ON encabezados (id_cliente, fecha, id_transaccion)
+    WHERE COALESCE(estado, '') NOT IN ('Pagada', 'Anulada');
+
+-- Movimientos vigentes por fecha: cierres mensuales y reconstrucción del inventario
+CREATE INDEX IF NOT EXISTS encabezados_vigentes_idx
+    ON encabezados (fecha, id_transaccion)
+    WHERE estado IS DISTINCT FROM 'Anulada';
+
+-- Lista de ventas en "Modificar Movimiento"
+CREATE INDEX IF NOT EXISTS encabezados_transaccion_idx
+    ON encabezados (transaccion, id_transaccion);
+
+-- Historial de pagos de un cliente y abonos del mes
+CREATE INDEX IF NOT EXISTS pagos_cliente_idx
+    ON pagos (id_cliente, fecha);
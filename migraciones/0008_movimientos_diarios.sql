@@ -0,0 +1,156 @@
+-- Resumen diario de movimientos por tipo de transacción, SKU, bodega y cliente.
+-- Los triggers lo mantienen al guardar, editar o anular movimientos, igual
+-- que el inventario, así que los reportes de ventas leen este resumen por
+-- rango de fechas en lugar de unir `detalles` con `encabezados`.
+-- Bodega: la de origen en ventas y transferencias, la de destino en compras.
+-- Sin bodega o sin cliente se guarda '' y 0 para que sean parte de la llave.
+-- `SELECT reconstruir_movimientos_diarios()` lo recalcula desde el historial.
+
+CREATE TABLE IF NOT EXISTS movimientos_diarios (
+    fecha       date NOT NULL,
+    transaccion integer NOT NULL,
+    sku         text NOT NULL,
+    bodega      text NOT NULL DEFAULT '',
+    id_cliente  integer NOT NULL DEFAULT 0,
+    cantidad    numeric NOT NULL DEFAULT 0,
+    monto       numeric NOT NULL DEFAULT 0,
+    lineas      integer NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, transaccion, sku, bodega, id_cliente)
+);
+
+-- Reportes de un tipo de transacción en un rango de fechas
+CREATE INDEX IF NOT EXISTS movimientos_diarios_transaccion_idx
+    ON movimientos_diarios (transaccion, fecha);
+
+-- Suma una línea al día de su encabezado (cantidad, monto y líneas negativas para revertirla)
+CREATE OR REPLACE FUNCTION movimientos_diarios_aplicar(
+    e encabezados, p_sku text, p_cantidad numeric, p_monto numeric, p_lineas integer
+)
+RETURNS void AS $$
+DECLARE
+    v_bodega  text := COALESCE(CASE WHEN e.transaccion = 2 THEN e.bodega_destino ELSE e.bodega_origen END, '');
+    v_cliente integer := COALESCE(e.id_cliente, 0);
+BEGIN
+    IF e.estado IS NOT DISTINCT FROM 'Anulada' OR p_cantidad IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO movimientos_diarios AS m (fecha, transaccion, sku, bodega, id_cliente, cantidad, monto, lineas)
+    VALUES (e.fecha, e.transaccion, p_sku, v_bodega, v_cliente, p_cantidad, COALESCE(p_monto, 0), p_lineas)
+    ON CONFLICT (fecha, transaccion, sku, bodega, id_cliente) DO UPDATE SET
+        cantidad = m.cantidad + EXCLUDED.cantidad,
+        monto = m.monto + EXCLUDED.monto,
+        lineas = m.lineas + EXCLUDED.lineas;
+
+    -- Un día sin líneas vigentes no aporta nada al resumen
+    IF p_lineas < 0 THEN
+        DELETE FROM movimientos_diarios
+        WHERE fecha = e.fecha AND transaccion = e.transaccion AND sku = p_sku
+          AND bodega = v_bodega AND id_cliente = v_cliente AND lineas <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION movimientos_diarios_detalles() RETURNS trigger AS $$
+DECLARE
+    e encabezados%ROWTYPE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = OLD.id_transaccion;
+        IF FOUND THEN
+            PERFORM movimientos_diarios_aplicar(e, OLD.sku, -OLD.cantidad, -OLD.subtotal, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = NEW.id_transaccion;
+        IF FOUND THEN
+            PERFORM movimientos_diarios_aplicar(e, NEW.sku, NEW.cantidad, NEW.subtotal, 1);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Anular, reactivar, cambiar fecha, tipo, bodegas o cliente, o borrar un encabezado mueve todas sus líneas
+CREATE OR REPLACE FUNCTION movimientos_diarios_encabezados() RETURNS trigger AS $$
+BEGIN
+    PERFORM movimientos_diarios_aplicar(OLD, d.sku, -d.cantidad, -d.subtotal, -1)
+    FROM detalles d WHERE d.id_transaccion = OLD.id_transaccion;
+
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM movimientos_diarios_aplicar(NEW, d.sku, d.cantidad, d.subtotal, 1)
+        FROM detalles d WHERE d.id_transaccion = NEW.id_transaccion;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS detalles_movimientos_diarios ON detalles;
+CREATE TRIGGER detalles_movimientos_diarios
+    AFTER INSERT OR UPDATE OF sku, cantidad, subtotal, id_transaccion OR DELETE ON detalles
+    FOR EACH ROW EXECUTE FUNCTION movimientos_diarios_detalles();
+
+DROP TRIGGER IF EXISTS encabezados_movimientos_diarios ON encabezados;
+CREATE TRIGGER encabezados_movimientos_diarios
+    AFTER UPDATE OF estado, fecha, transaccion, bodega_origen, bodega_destino, id_cliente ON encabezados
+    FOR EACH ROW
+    WHEN ((OLD.estado = 'Anulada') IS DISTINCT FROM (NEW.estado = 'Anulada')
+          OR OLD.fecha IS DISTINCT FROM NEW.fecha
+          OR OLD.transaccion IS DISTINCT FROM NEW.transaccion
+          OR OLD.bodega_origen IS DISTINCT FROM NEW.bodega_origen
+          OR OLD.bodega_destino IS DISTINCT FROM NEW.bodega_destino
+          OR OLD.id_cliente IS DISTINCT FROM NEW.id_cliente)
+    EXECUTE FUNCTION movimientos_diarios_encabezados();
+
+-- BEFORE por la misma razón que encabezados_inventario_borrar (0003_inventario.sql)
+DROP TRIGGER IF EXISTS encabezados_movimientos_diarios_borrar ON encabezados;
+CREATE TRIGGER encabezados_movimientos_diarios_borrar
+    BEFORE DELETE ON encabezados
+    FOR EACH ROW EXECUTE FUNCTION movimientos_diarios_encabezados();
+
+-- Recalcula el resumen desde todo el historial y devuelve cuántas filas tenían otro valor.
+-- TRUNCATE en lugar de DELETE para no dejar la tabla llena de filas muertas, y
+-- filas en orden de fecha para que un rango de fechas lea pocas páginas.
+-- Bloquea las lecturas del resumen mientras corre.
+CREATE OR REPLACE FUNCTION reconstruir_movimientos_diarios() RETURNS integer AS $$
+DECLARE
+    v_distintas integer;
+BEGIN
+    LOCK TABLE movimientos_diarios IN ACCESS EXCLUSIVE MODE;
+
+    DROP TABLE IF EXISTS movimientos_diarios_historial;
+    CREATE TEMP TABLE movimientos_diarios_historial ON COMMIT DROP AS
+    SELECT
+        e.fecha,
+        e.transaccion,
+        d.sku::text AS sku,
+        COALESCE(CASE WHEN e.transaccion = 2 THEN e.bodega_destino ELSE e.bodega_origen END, '') AS bodega,
+        COALESCE(e.id_cliente, 0) AS id_cliente,
+        SUM(d.cantidad)::numeric AS cantidad,
+        COALESCE(SUM(d.subtotal), 0)::numeric AS monto,
+        COUNT(*)::integer AS lineas
+    FROM detalles d
+    JOIN encabezados e ON d.id_transaccion = e.id_transaccion
+    WHERE e.estado IS DISTINCT FROM 'Anulada'
+    GROUP BY 1, 2, 3, 4, 5;
+
+    SELECT COUNT(*) INTO v_distintas
+    FROM movimientos_diarios_historial h
+    FULL JOIN movimientos_diarios m USING (fecha, transaccion, sku, bodega, id_cliente)
+    WHERE (h.cantidad, h.monto, h.lineas) IS DISTINCT FROM (m.cantidad, m.monto, m.lineas);
+
+    TRUNCATE movimientos_diarios;
+    INSERT INTO movimientos_diarios SELECT * FROM movimientos_diarios_historial ORDER BY fecha;
+
+    RETURN v_distintas;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT reconstruir_movimientos_diarios();
+ANALYZE movimientos_diarios;
@@ -0,0 +1,560 @@
+-- Particiona `encabezados` y `detalles` por mes de `fecha`.
+-- Cada mes vive en encabezados_AAAA_MM y detalles_AAAA_MM; una consulta que
+-- filtra por fecha en ambas tablas solo lee los meses del rango.
+-- Los meses se crean con crear_particiones(desde, hasta): esta migración crea
+-- desde el primer movimiento hasta 3 meses adelante, db.guardar_movimiento
+-- crea el mes de cada movimiento si falta y `python cli.py particiones` los
+-- crea por adelantado. No conviene crear muchos meses vacíos: cada partición
+-- suma tiempo de planificación a las consultas sin rango de fechas.
+-- Un año cerrado se archiva con archivar_anio(año): sus particiones se
+-- separan (DETACH) y pasan al esquema `archivo`, sin DELETE.
+-- Requiere PostgreSQL 15 o posterior: antes de la 15 el ON UPDATE CASCADE de
+-- detalles pierde las líneas cuando el encabezado cambia de mes (de partición).
+--
+-- La llave primaria incluye la fecha: (id_transaccion, fecha) y (id_detalle,
+-- fecha). detalles.fecha es obligatoria y siempre es la del encabezado (FK
+-- compuesta con ON UPDATE CASCADE). pagos_facturas pierde su FK a encabezados,
+-- que necesitaría la fecha; un trigger borra sus filas al borrar la venta.
+
+DO $$
+BEGIN
+    IF current_setting('server_version_num')::integer < 150000 THEN
+        RAISE EXCEPTION 'Esta migración requiere PostgreSQL 15 o posterior (el servidor es %)',
+            current_setting('server_version');
+    END IF;
+END;
+$$;
+
+CREATE SCHEMA IF NOT EXISTS archivo;
+
+-- Meses archivados; los movimientos anteriores a fecha_archivo() ya no están en las tablas
+CREATE TABLE IF NOT EXISTS particiones_archivadas (
+    mes          date PRIMARY KEY CHECK (mes = date_trunc('month', mes)),
+    archivada_en timestamptz NOT NULL DEFAULT now()
+);
+
+-- Suma de los movimientos archivados por SKU y bodega ('' = total del SKU), para
+-- que reconstruir_inventario siga cuadrando sin esas filas
+CREATE TABLE IF NOT EXISTS inventario_archivado (
+    sku      text NOT NULL,
+    bodega   text NOT NULL,
+    entradas numeric NOT NULL DEFAULT 0,
+    salidas  numeric NOT NULL DEFAULT 0,
+    PRIMARY KEY (sku, bodega)
+);
+
+CREATE OR REPLACE FUNCTION fecha_archivo() RETURNS date AS $$
+    SELECT COALESCE((max(mes) + interval '1 month')::date, '-infinity'::date)
+    FROM particiones_archivadas;
+$$ LANGUAGE sql STABLE;
+
+-- Crea las particiones mensuales que falten entre p_desde y p_hasta; devuelve cuántas tablas creó
+CREATE OR REPLACE FUNCTION crear_particiones(p_desde date, p_hasta date) RETURNS integer AS $$
+DECLARE
+    v_mes     date := date_trunc('month', p_desde);
+    v_tabla   text;
+    v_creadas integer := 0;
+BEGIN
+    IF v_mes < fecha_archivo() THEN
+        RAISE EXCEPTION 'El mes % está archivado', to_char(v_mes, 'YYYY-MM');
+    END IF;
+
+    WHILE v_mes <= p_hasta LOOP
+        FOREACH v_tabla IN ARRAY ARRAY['encabezados', 'detalles'] LOOP
+            IF to_regclass(v_tabla || to_char(v_mes, '_YYYY_MM')) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                    v_tabla || to_char(v_mes, '_YYYY_MM'), v_tabla, v_mes, (v_mes + interval '1 month')::date
+                );
+                v_creadas := v_creadas + 1;
+            END IF;
+        END LOOP;
+        v_mes := v_mes + interval '1 month';
+    END LOOP;
+
+    RETURN v_creadas;
+END;
+$$ LANGUAGE plpgsql;
+
+
+------------------------------------------------------------------------------
+-- Conversión de las tablas existentes
+------------------------------------------------------------------------------
+
+LOCK TABLE encabezados, detalles IN ACCESS EXCLUSIVE MODE;
+
+-- Toda línea lleva la fecha de su encabezado, que pasa a ser la llave de partición
+UPDATE detalles d SET fecha = e.fecha
+FROM encabezados e
+WHERE e.id_transaccion = d.id_transaccion AND d.fecha IS DISTINCT FROM e.fecha;
+
+ALTER TABLE encabezados RENAME TO encabezados_sin_particionar;
+ALTER TABLE detalles RENAME TO detalles_sin_particionar;
+
+-- Mismas columnas, valores por defecto y CHECKs; llaves e índices van al final
+CREATE TABLE encabezados (LIKE encabezados_sin_particionar INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (fecha);
+CREATE TABLE detalles (LIKE detalles_sin_particionar INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+    PARTITION BY RANGE (fecha);
+ALTER TABLE detalles ALTER COLUMN fecha SET NOT NULL;
+
+-- Las secuencias de los ids pasan a las tablas nuevas para no borrarse con las viejas
+DO $$
+DECLARE
+    v_tabla   text;
+    v_columna text;
+BEGIN
+    FOR v_tabla, v_columna IN VALUES ('encabezados', 'id_transaccion'), ('detalles', 'id_detalle') LOOP
+        EXECUTE format(
+            'ALTER SEQUENCE %s OWNED BY %I.%I',
+            pg_get_serial_sequence(v_tabla || '_sin_particionar', v_columna), v_tabla, v_columna
+        );
+    END LOOP;
+END;
+$$;
+
+SELECT crear_particiones(
+    COALESCE((SELECT min(fecha) FROM encabezados_sin_particionar), current_date),
+    GREATEST((SELECT max(fecha) FROM encabezados_sin_particionar), (current_date + interval '3 months')::date)
+);
+
+INSERT INTO encabezados SELECT * FROM encabezados_sin_particionar;
+INSERT INTO detalles SELECT * FROM detalles_sin_particionar;
+
+-- También se van la FK de pagos_facturas y las funciones que reciben una fila
+-- de encabezados (movimiento_aplicar, movimientos_diarios_aplicar); se crean de nuevo abajo
+DROP TABLE detalles_sin_particionar, encabezados_sin_particionar CASCADE;
+
+ALTER TABLE encabezados ADD PRIMARY KEY (id_transaccion, fecha);
+ALTER TABLE encabezados ADD FOREIGN KEY (id_cliente) REFERENCES clientes (id_cliente);
+ALTER TABLE encabezados ADD FOREIGN KEY (id_proveedor) REFERENCES proveedores (id_proveedor);
+
+ALTER TABLE detalles ADD PRIMARY KEY (id_detalle, fecha);
+ALTER TABLE detalles ADD FOREIGN KEY (id_transaccion, fecha)
+    REFERENCES encabezados (id_transaccion, fecha) ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- Índices de 0006_indices_envios.sql y 0007_indices_consultas.sql, ahora uno por partición
+CREATE INDEX encabezados_no_envio_idx ON encabezados (no_envio text_pattern_ops);
+CREATE INDEX encabezados_fecha_idx ON encabezados (fecha DESC, id_transaccion DESC);
+CREATE INDEX detalles_transaccion_idx ON detalles (id_transaccion, id_detalle);
+CREATE INDEX detalles_sku_idx ON detalles (sku, id_transaccion);
+CREATE INDEX encabezados_kardex_idx ON encabezados (fecha, (COALESCE(no_envio, '')), id_transaccion);
+CREATE INDEX encabezados_cliente_idx ON encabezados (id_cliente, fecha, id_transaccion)
+    WHERE id_cliente IS NOT NULL;
+CREATE INDEX encabezados_abiertas_idx ON encabezados (id_cliente, fecha, id_transaccion)
+    WHERE COALESCE(estado, '') NOT IN ('Pagada', 'Anulada');
+CREATE INDEX encabezados_vigentes_idx ON encabezados (fecha, id_transaccion)
+    WHERE estado IS DISTINCT FROM 'Anulada';
+CREATE INDEX encabezados_transaccion_idx ON encabezados (transaccion, id_transaccion);
+
+
+------------------------------------------------------------------------------
+-- Triggers
+------------------------------------------------------------------------------
+
+-- Avisos al cache de las réplicas (0002_notificar_cambios.sql)
+CREATE TRIGGER encabezados_notificar AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON encabezados
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio();
+CREATE TRIGGER detalles_notificar AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON detalles
+    FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio();
+
+-- Un UPDATE que cambia la fecha de mes llega como DELETE + INSERT: solo se
+-- borran los pagos aplicados si la venta ya no existe
+CREATE OR REPLACE FUNCTION pagos_facturas_borrar() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM pagos_facturas pf
+    WHERE pf.id_transaccion = OLD.id_transaccion
+      AND NOT EXISTS (SELECT 1 FROM encabezados e WHERE e.id_transaccion = OLD.id_transaccion);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER encabezados_pagos_facturas
+    AFTER DELETE ON encabezados
+    FOR EACH ROW EXECUTE FUNCTION pagos_facturas_borrar();
+
+-- Inventario (0003_inventario.sql). Las búsquedas llevan la fecha para leer
+-- una sola partición. Cuando un encabezado cambia de fecha sus líneas se
+-- actualizan en cascada; ese UPDATE solo cambia la fecha y no toca el
+-- inventario (por eso el WHEN del trigger de UPDATE en detalles). Si cambia
+-- de mes, Postgres lo hace como DELETE + INSERT: el BEFORE DELETE del
+-- encabezado descuenta las líneas viejas y el INSERT de cada línea en su
+-- nueva partición las vuelve a sumar.
+CREATE OR REPLACE FUNCTION movimiento_aplicar(e encabezados, p_sku text, p_cantidad numeric)
+RETURNS void AS $$
+BEGIN
+    IF e.estado IS NOT DISTINCT FROM 'Anulada' THEN
+        RETURN;
+    END IF;
+
+    PERFORM inventario_aplicar(p_sku, e.transaccion, p_cantidad);
+
+    IF e.transaccion IN (2, 3) THEN
+        PERFORM inventario_bodega_aplicar(p_sku, e.bodega_destino, p_cantidad, 0);
+    END IF;
+    IF e.transaccion IN (1, 3) THEN
+        PERFORM inventario_bodega_aplicar(p_sku, e.bodega_origen, 0, p_cantidad);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventario_detalles() RETURNS trigger AS $$
+DECLARE
+    e encabezados%ROWTYPE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = OLD.id_transaccion AND fecha = OLD.fecha;
+        IF FOUND THEN
+            PERFORM movimiento_aplicar(e, OLD.sku, -OLD.cantidad);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = NEW.id_transaccion AND fecha = NEW.fecha;
+        IF FOUND THEN
+            PERFORM movimiento_aplicar(e, NEW.sku, NEW.cantidad);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION inventario_encabezados() RETURNS trigger AS $$
+BEGIN
+    -- En un DELETE, NEW es NULL y solo se lee la partición de OLD
+    PERFORM movimiento_aplicar(OLD, d.sku, -d.cantidad)
+    FROM detalles d
+    WHERE d.id_transaccion = OLD.id_transaccion AND d.fecha IN (OLD.fecha, NEW.fecha);
+
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM movimiento_aplicar(NEW, d.sku, d.cantidad)
+        FROM detalles d
+        WHERE d.id_transaccion = NEW.id_transaccion AND d.fecha IN (OLD.fecha, NEW.fecha);
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER detalles_inventario
+    AFTER INSERT OR DELETE ON detalles
+    FOR EACH ROW EXECUTE FUNCTION inventario_detalles();
+
+CREATE TRIGGER detalles_inventario_actualizar
+    AFTER UPDATE OF sku, cantidad, id_transaccion ON detalles
+    FOR EACH ROW
+    WHEN ((OLD.sku, OLD.cantidad, OLD.id_transaccion) IS DISTINCT FROM (NEW.sku, NEW.cantidad, NEW.id_transaccion))
+    EXECUTE FUNCTION inventario_detalles();
+
+CREATE TRIGGER encabezados_inventario
+    AFTER UPDATE OF estado, transaccion, bodega_origen, bodega_destino ON encabezados
+    FOR EACH ROW
+    WHEN ((OLD.estado = 'Anulada') IS DISTINCT FROM (NEW.estado = 'Anulada')
+          OR OLD.transaccion IS DISTINCT FROM NEW.transaccion
+          OR OLD.bodega_origen IS DISTINCT FROM NEW.bodega_origen
+          OR OLD.bodega_destino IS DISTINCT FROM NEW.bodega_destino)
+    EXECUTE FUNCTION inventario_encabezados();
+
+CREATE TRIGGER encabezados_inventario_borrar
+    BEFORE DELETE ON encabezados
+    FOR EACH ROW EXECUTE FUNCTION inventario_encabezados();
+
+-- Resumen diario (0008_movimientos_diarios.sql), con las mismas reglas
+CREATE OR REPLACE FUNCTION movimientos_diarios_aplicar(
+    e encabezados, p_sku text, p_cantidad numeric, p_monto numeric, p_lineas integer
+)
+RETURNS void AS $$
+DECLARE
+    v_bodega  text := COALESCE(CASE WHEN e.transaccion = 2 THEN e.bodega_destino ELSE e.bodega_origen END, '');
+    v_cliente integer := COALESCE(e.id_cliente, 0);
+BEGIN
+    IF e.estado IS NOT DISTINCT FROM 'Anulada' OR p_cantidad IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO movimientos_diarios AS m (fecha, transaccion, sku, bodega, id_cliente, cantidad, monto, lineas)
+    VALUES (e.fecha, e.transaccion, p_sku, v_bodega, v_cliente, p_cantidad, COALESCE(p_monto, 0), p_lineas)
+    ON CONFLICT (fecha, transaccion, sku, bodega, id_cliente) DO UPDATE SET
+        cantidad = m.cantidad + EXCLUDED.cantidad,
+        monto = m.monto + EXCLUDED.monto,
+        lineas = m.lineas + EXCLUDED.lineas;
+
+    IF p_lineas < 0 THEN
+        DELETE FROM movimientos_diarios
+        WHERE fecha = e.fecha AND transaccion = e.transaccion AND sku = p_sku
+          AND bodega = v_bodega AND id_cliente = v_cliente AND lineas <= 0;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION movimientos_diarios_detalles() RETURNS trigger AS $$
+DECLARE
+    e encabezados%ROWTYPE;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = OLD.id_transaccion AND fecha = OLD.fecha;
+        IF FOUND THEN
+            PERFORM movimientos_diarios_aplicar(e, OLD.sku, -OLD.cantidad, -OLD.subtotal, -1);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT * INTO e FROM encabezados WHERE id_transaccion = NEW.id_transaccion AND fecha = NEW.fecha;
+        IF FOUND THEN
+            PERFORM movimientos_diarios_aplicar(e, NEW.sku, NEW.cantidad, NEW.subtotal, 1);
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION movimientos_diarios_encabezados() RETURNS trigger AS $$
+BEGIN
+    PERFORM movimientos_diarios_aplicar(OLD, d.sku, -d.cantidad, -d.subtotal, -1)
+    FROM detalles d
+    WHERE d.id_transaccion = OLD.id_transaccion AND d.fecha IN (OLD.fecha, NEW.fecha);
+
+    IF TG_OP = 'UPDATE' THEN
+        PERFORM movimientos_diarios_aplicar(NEW, d.sku, d.cantidad, d.subtotal, 1)
+        FROM detalles d
+        WHERE d.id_transaccion = NEW.id_transaccion AND d.fecha IN (OLD.fecha, NEW.fecha);
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER detalles_movimientos_diarios
+    AFTER INSERT OR DELETE ON detalles
+    FOR EACH ROW EXECUTE FUNCTION movimientos_diarios_detalles();
+
+CREATE TRIGGER detalles_movimientos_diarios_actualizar
+    AFTER UPDATE OF sku, cantidad, subtotal, id_transaccion ON detalles
+    FOR EACH ROW
+    WHEN ((OLD.sku, OLD.cantidad, OLD.subtotal, OLD.id_transaccion)
+          IS DISTINCT FROM (NEW.sku, NEW.cantidad, NEW.subtotal, NEW.id_transaccion))
+    EXECUTE FUNCTION movimientos_diarios_detalles();
+
+CREATE TRIGGER encabezados_movimientos_diarios
+    AFTER UPDATE OF estado, fecha, transaccion, bodega_origen, bodega_destino, id_cliente ON encabezados
+    FOR EACH ROW
+    WHEN ((OLD.estado = 'Anulada') IS DISTINCT FROM (NEW.estado = 'Anulada')
+          OR OLD.fecha IS DISTINCT FROM NEW.fecha
+          OR OLD.transaccion IS DISTINCT FROM NEW.transaccion
+          OR OLD.bodega_origen IS DISTINCT FROM NEW.bodega_origen
+          OR OLD.bodega_destino IS DISTINCT FROM NEW.bodega_destino
+          OR OLD.id_cliente IS DISTINCT FROM NEW.id_cliente)
+    EXECUTE FUNCTION movimientos_diarios_encabezados();
+
+CREATE TRIGGER encabezados_movimientos_diarios_borrar
+    BEFORE DELETE ON encabezados
+    FOR EACH ROW EXECUTE FUNCTION movimientos_diarios_encabezados();
+
+
+------------------------------------------------------------------------------
+-- Archivo de años cerrados
+------------------------------------------------------------------------------
+
+-- Las reconstrucciones parten de los movimientos que siguen en las tablas más
+-- lo archivado, y los cierres anteriores al archivo ya no se pueden recalcular.
+
+CREATE OR REPLACE FUNCTION reconstruir_inventario()
+RETURNS TABLE (sku text, stock_anterior numeric, stock_historial numeric) AS $$
+#variable_conflict use_column
+BEGIN
+    LOCK TABLE inventario, inventario_bodegas IN EXCLUSIVE MODE;
+
+    DROP TABLE IF EXISTS inventario_historial;
+    CREATE TEMP TABLE inventario_historial ON COMMIT DROP AS
+    SELECT h.sku, SUM(h.entradas)::numeric AS entradas, SUM(h.salidas)::numeric AS salidas,
+           SUM(h.entradas - h.salidas)::numeric AS stock_actual
+    FROM (
+        SELECT
+            d.sku::text AS sku,
+            CASE WHEN e.transaccion = 2 THEN d.cantidad ELSE 0 END AS entradas,
+            CASE WHEN e.transaccion = 1 THEN d.cantidad ELSE 0 END AS salidas
+        FROM detalles d
+        JOIN encabezados e ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+        WHERE e.estado IS DISTINCT FROM 'Anulada'
+        UNION ALL
+        SELECT a.sku, a.entradas, a.salidas FROM inventario_archivado a WHERE a.bodega = ''
+    ) h
+    GROUP BY h.sku;
+
+    RETURN QUERY
+    SELECT COALESCE(h.sku, i.sku), i.stock_actual, h.stock_actual
+    FROM inventario_historial h
+    FULL JOIN inventario i ON i.sku = h.sku
+    WHERE COALESCE(h.entradas, 0) <> COALESCE(i.entradas, 0)
+       OR COALESCE(h.salidas, 0) <> COALESCE(i.salidas, 0)
+       OR COALESCE(h.stock_actual, 0) <> COALESCE(i.stock_actual, 0);
+
+    DELETE FROM inventario;
+    INSERT INTO inventario SELECT * FROM inventario_historial;
+
+    DELETE FROM inventario_bodegas;
+    INSERT INTO inventario_bodegas (sku, bodega, entradas, salidas, stock_actual)
+    SELECT m.sku, m.bodega, SUM(m.entrada), SUM(m.salida), SUM(m.entrada - m.salida)
+    FROM (
+        SELECT v.*
+        FROM detalles d
+        JOIN encabezados e ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+        CROSS JOIN LATERAL (
+            VALUES
+                (d.sku::text, e.bodega_destino, CASE WHEN e.transaccion IN (2, 3) THEN d.cantidad ELSE 0 END, 0::numeric),
+                (d.sku::text, e.bodega_origen, 0::numeric, CASE WHEN e.transaccion IN (1, 3) THEN d.cantidad ELSE 0 END)
+        ) AS v (sku, bodega, entrada, salida)
+        WHERE e.estado IS DISTINCT FROM 'Anulada'
+        UNION ALL
+        SELECT a.sku, a.bodega, a.entradas, a.salidas FROM inventario_archivado a WHERE a.bodega <> ''
+    ) AS m (sku, bodega, entrada, salida)
+    WHERE NULLIF(m.bodega, '') IS NOT NULL
+      AND (m.entrada <> 0 OR m.salida <> 0)
+    GROUP BY m.sku, m.bodega;
+END;
+$$ LANGUAGE plpgsql;
+
+-- El resumen diario de los meses archivados se conserva tal cual
+CREATE OR REPLACE FUNCTION reconstruir_movimientos_diarios() RETURNS integer AS $$
+DECLARE
+    v_desde     date := fecha_archivo();
+    v_distintas integer;
+BEGIN
+    LOCK TABLE movimientos_diarios IN ACCESS EXCLUSIVE MODE;
+
+    DROP TABLE IF EXISTS movimientos_diarios_historial;
+    CREATE TEMP TABLE movimientos_diarios_historial ON COMMIT DROP AS
+    SELECT
+        e.fecha,
+        e.transaccion,
+        d.sku::text AS sku,
+        COALESCE(CASE WHEN e.transaccion = 2 THEN e.bodega_destino ELSE e.bodega_origen END, '') AS bodega,
+        COALESCE(e.id_cliente, 0) AS id_cliente,
+        SUM(d.cantidad)::numeric AS cantidad,
+        COALESCE(SUM(d.subtotal), 0)::numeric AS monto,
+        COUNT(*)::integer AS lineas
+    FROM detalles d
+    JOIN encabezados e ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+    WHERE e.estado IS DISTINCT FROM 'Anulada'
+    GROUP BY 1, 2, 3, 4, 5;
+
+    SELECT COUNT(*) INTO v_distintas
+    FROM movimientos_diarios_historial h
+    FULL JOIN (SELECT * FROM movimientos_diarios WHERE fecha >= v_desde) m
+        USING (fecha, transaccion, sku, bodega, id_cliente)
+    WHERE (h.cantidad, h.monto, h.lineas) IS DISTINCT FROM (m.cantidad, m.monto, m.lineas);
+
+    IF v_desde = '-infinity' THEN
+        TRUNCATE movimientos_diarios;
+    ELSE
+        DELETE FROM movimientos_diarios WHERE fecha >= v_desde;
+    END IF;
+    INSERT INTO movimientos_diarios SELECT * FROM movimientos_diarios_historial ORDER BY fecha;
+
+    RETURN v_distintas;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION recalcular_cierres(p_periodo date) RETURNS integer AS $$
+DECLARE
+    v_periodo date;
+    v_total   integer := 0;
+BEGIN
+    IF p_periodo < fecha_archivo() THEN
+        RAISE EXCEPTION 'El período % está archivado', to_char(p_periodo, 'YYYY-MM');
+    END IF;
+
+    FOR v_periodo IN SELECT periodo FROM cierres WHERE periodo >= p_periodo ORDER BY periodo LOOP
+        PERFORM calcular_periodo(v_periodo);
+        v_total := v_total + 1;
+    END LOOP;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Separa las particiones de un año cerrado y las mueve al esquema `archivo`.
+-- Exige el cierre de diciembre (los saldos de clientes parten de él) y que no
+-- queden ventas sin pagar; los años se archivan en orden. Devuelve cuántos
+-- meses se separaron.
+CREATE OR REPLACE FUNCTION archivar_anio(p_anio integer) RETURNS integer AS $$
+DECLARE
+    v_desde  date := make_date(p_anio, 1, 1);
+    v_hasta  date := make_date(p_anio + 1, 1, 1);
+    v_mes    date;
+    v_tabla  text;
+    v_fk     text;
+    v_meses  integer := 0;
+BEGIN
+    IF v_desde < fecha_archivo() THEN
+        RAISE EXCEPTION 'El año % ya está archivado', p_anio;
+    END IF;
+    IF EXISTS (SELECT 1 FROM encabezados WHERE fecha < v_desde) THEN
+        RAISE EXCEPTION 'Hay movimientos anteriores a %: archive primero los años anteriores', p_anio;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM cierres WHERE periodo = make_date(p_anio, 12, 1)) THEN
+        RAISE EXCEPTION 'Cierre diciembre de % antes de archivar el año', p_anio;
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM encabezados
+        WHERE fecha >= v_desde AND fecha < v_hasta
+          AND transaccion = 1 AND COALESCE(estado, '') NOT IN ('Pagada', 'Anulada')
+    ) THEN
+        RAISE EXCEPTION 'El año % tiene ventas sin pagar', p_anio;
+    END IF;
+
+    -- Lo que el año aportó al inventario, por SKU y por bodega
+    INSERT INTO inventario_archivado AS a (sku, bodega, entradas, salidas)
+    SELECT m.sku, m.bodega, SUM(m.entrada), SUM(m.salida)
+    FROM detalles d
+    JOIN encabezados e ON d.id_transaccion = e.id_transaccion AND d.fecha = e.fecha
+    CROSS JOIN LATERAL (
+        VALUES
+            (d.sku::text, '', CASE WHEN e.transaccion = 2 THEN d.cantidad ELSE 0 END::numeric,
+                              CASE WHEN e.transaccion = 1 THEN d.cantidad ELSE 0 END::numeric),
+            (d.sku::text, NULLIF(e.bodega_destino, ''), CASE WHEN e.transaccion IN (2, 3) THEN d.cantidad ELSE 0 END::numeric, 0::numeric),
+            (d.sku::text, NULLIF(e.bodega_origen, ''), 0::numeric, CASE WHEN e.transaccion IN (1, 3) THEN d.cantidad ELSE 0 END::numeric)
+    ) AS m (sku, bodega, entrada, salida)
+    WHERE e.fecha >= v_desde AND e.fecha < v_hasta
+      AND d.fecha >= v_desde AND d.fecha < v_hasta
+      AND e.estado IS DISTINCT FROM 'Anulada'
+      AND m.bodega IS NOT NULL
+      AND (m.entrada <> 0 OR m.salida <> 0)
+    GROUP BY m.sku, m.bodega
+    ON CONFLICT (sku, bodega) DO UPDATE SET
+        entradas = a.entradas + EXCLUDED.entradas,
+        salidas = a.salidas + EXCLUDED.salidas;
+
+    FOR v_mes IN SELECT generate_series(v_desde, v_hasta - 1, interval '1 month')::date LOOP
+        -- Primero las líneas: su FK impide separar el encabezado mientras estén adentro
+        v_tabla := 'detalles' || to_char(v_mes, '_YYYY_MM');
+        IF to_regclass(v_tabla) IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE detalles DETACH PARTITION %I', v_tabla);
+            FOR v_fk IN
+                SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(v_tabla) AND contype = 'f'
+            LOOP
+                EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', v_tabla, v_fk);
+            END LOOP;
+            EXECUTE format('ALTER TABLE %I SET SCHEMA archivo', v_tabla);
+        END IF;
+
+        v_tabla := 'encabezados' || to_char(v_mes, '_YYYY_MM');
+        IF to_regclass(v_tabla) IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE encabezados DETACH PARTITION %I', v_tabla);
+            EXECUTE format('ALTER TABLE %I SET SCHEMA archivo', v_tabla);
+            v_meses := v_meses + 1;
+        END IF;
+
+        INSERT INTO particiones_archivadas (mes) VALUES (v_mes);
+    END LOOP;
+
+    RETURN v_meses;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,114 @@
+-- Protege los meses cerrados (0005_cierres.sql).
+-- Un cargo o un pago cuenta en el saldo de todos los cierres desde su mes,
+-- así que no se puede agregar, cambiar ni borrar uno del último mes cerrado
+-- o de antes: hay que reabrir los cierres desde ese mes y volver a cerrarlos.
+-- Cuentan los encabezados con cliente que no están anulados y los pagos; las
+-- líneas llegan al cierre por encabezados.total. Solo se cierran meses ya
+-- terminados.
+-- Reabrir un mes reabre también los posteriores, y cerrar un mes cierra los
+-- meses abiertos entre el último cierre y él, cada uno calculado sobre el
+-- anterior.
+
+CREATE OR REPLACE FUNCTION verificar_periodo_abierto(p_fecha date) RETURNS void AS $$
+DECLARE
+    v_ultimo date;
+BEGIN
+    SELECT max(periodo) INTO v_ultimo FROM cierres;
+    IF p_fecha < v_ultimo + interval '1 month' THEN
+        RAISE EXCEPTION 'El mes % está cerrado (último cierre: %); reabra los cierres desde ese mes para modificarlo',
+            to_char(p_fecha, 'MM/YYYY'), to_char(v_ultimo, 'MM/YYYY');
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION proteger_cierres_encabezados() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.id_cliente IS NOT NULL AND OLD.estado IS DISTINCT FROM 'Anulada' THEN
+        PERFORM verificar_periodo_abierto(OLD.fecha);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.id_cliente IS NOT NULL AND NEW.estado IS DISTINCT FROM 'Anulada' THEN
+        PERFORM verificar_periodo_abierto(NEW.fecha);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION proteger_cierres_pagos() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM verificar_periodo_abierto(OLD.fecha);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM verificar_periodo_abierto(NEW.fecha);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Marcar pagada una factura vieja o cambiarle observaciones no toca el cierre
+DROP TRIGGER IF EXISTS encabezados_cierres ON encabezados;
+CREATE TRIGGER encabezados_cierres
+    AFTER INSERT OR DELETE ON encabezados
+    FOR EACH ROW EXECUTE FUNCTION proteger_cierres_encabezados();
+
+DROP TRIGGER IF EXISTS encabezados_cierres_actualizar ON encabezados;
+CREATE TRIGGER encabezados_cierres_actualizar
+    AFTER UPDATE OF fecha, id_cliente, total, estado ON encabezados
+    FOR EACH ROW
+    WHEN ((OLD.fecha, OLD.id_cliente, OLD.total, OLD.estado = 'Anulada')
+          IS DISTINCT FROM (NEW.fecha, NEW.id_cliente, NEW.total, NEW.estado = 'Anulada'))
+    EXECUTE FUNCTION proteger_cierres_encabezados();
+
+DROP TRIGGER IF EXISTS pagos_cierres ON pagos;
+CREATE TRIGGER pagos_cierres
+    AFTER INSERT OR DELETE ON pagos
+    FOR EACH ROW EXECUTE FUNCTION proteger_cierres_pagos();
+
+DROP TRIGGER IF EXISTS pagos_cierres_actualizar ON pagos;
+CREATE TRIGGER pagos_cierres_actualizar
+    AFTER UPDATE OF fecha, id_cliente, monto_pagado ON pagos
+    FOR EACH ROW
+    WHEN ((OLD.fecha, OLD.id_cliente, OLD.monto_pagado) IS DISTINCT FROM (NEW.fecha, NEW.id_cliente, NEW.monto_pagado))
+    EXECUTE FUNCTION proteger_cierres_pagos();
+
+CREATE OR REPLACE FUNCTION cerrar_periodo(p_periodo date) RETURNS integer AS $$
+DECLARE
+    v_desde date;
+BEGIN
+    p_periodo := date_trunc('month', p_periodo);
+    IF p_periodo >= date_trunc('month', current_date) THEN
+        RAISE EXCEPTION 'El mes % todavía no termina; solo se cierran meses anteriores', to_char(p_periodo, 'MM/YYYY');
+    END IF;
+
+    -- Espera a que terminen las escrituras en curso y frena las nuevas hasta
+    -- que el cierre esté guardado; las que vengan después ya lo ven
+    LOCK TABLE encabezados, pagos IN SHARE MODE;
+
+    -- Los meses abiertos desde el último cierre anterior se cierran con él
+    SELECT COALESCE((max(periodo) + interval '1 month')::date, p_periodo) INTO v_desde
+    FROM cierres WHERE periodo < p_periodo;
+
+    INSERT INTO cierres (periodo)
+    SELECT generate_series(v_desde, p_periodo, interval '1 month')::date
+    ON CONFLICT (periodo) DO UPDATE SET cerrado_en = now();
+    RETURN recalcular_cierres(v_desde);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reabre un mes y todos los posteriores: la protección alcanza hasta el
+-- último cierre, así que un mes solo queda abierto si no hay cierres después.
+-- Devuelve cuántos meses reabrió.
+CREATE OR REPLACE FUNCTION reabrir_periodo(p_periodo date) RETURNS integer AS $$
+DECLARE
+    v_reabiertos integer;
+BEGIN
+    p_periodo := date_trunc('month', p_periodo);
+    IF p_periodo < fecha_archivo() THEN
+        RAISE EXCEPTION 'El período % está archivado', to_char(p_periodo, 'YYYY-MM');
+    END IF;
+
+    DELETE FROM cierres WHERE periodo >= p_periodo;
+    GET DIAGNOSTICS v_reabiertos = ROW_COUNT;
+    RETURN v_reabiertos;
+END;
+$$ LANGUAGE plpgsql;
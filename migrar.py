@@ -0,0 +1,101 @@
+"""Migraciones versionadas del esquema.
+
+Cada archivo `migraciones/NNNN_nombre.sql` se aplica una sola vez, en orden
+y en su propia transacción; la versión aplicada queda registrada en
+`schema_migraciones`. Uso: `python cli.py migrar`.
+"""
+import re
+from pathlib import Path
+
+import psycopg2
+
+CARPETA = Path(__file__).parent / "migraciones"
+_ARCHIVO = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Evita que dos procesos migren la misma base al mismo tiempo
+_LOCK = 7_202_601
+
+
+def migraciones_disponibles():
+    migraciones = []
+    for archivo in sorted(CARPETA.glob("*.sql")):
+        m = _ARCHIVO.match(archivo.name)
+        if m:
+            migraciones.append((int(m.group(1)), m.group(2), archivo))
+    return migraciones
+
+
+def _preparar(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            version    integer PRIMARY KEY,
+            nombre     text NOT NULL,
+            aplicada_en timestamptz NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+
+def versiones_aplicadas(conn):
+    with conn.cursor() as cur:
+        _preparar(cur)
+        cur.execute("SELECT version FROM schema_migraciones")
+        versiones = {v for (v,) in cur.fetchall()}
+    conn.commit()
+    return versiones
+
+
+def migraciones_pendientes(conn):
+    aplicadas = versiones_aplicadas(conn)
+    return [m for m in migraciones_disponibles() if m[0] not in aplicadas]
+
+
+def aplicar_migraciones(dsn, hasta=None, salida=print):
+    """Aplica las migraciones pendientes (hasta la versión `hasta`, si se indica).
+
+    Devuelve la lista de versiones aplicadas.
+    """
+    conn = psycopg2.connect(dsn)
+    aplicadas = []
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK,))
+
+        for version, nombre, archivo in migraciones_pendientes(conn):
+            if hasta is not None and version > hasta:
+                break
+
+            salida(f"Aplicando {archivo.name}...")
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(archivo.read_text(encoding="utf-8"))
+                    cur.execute(
+                        "INSERT INTO schema_migraciones (version, nombre) VALUES (%s, %s)",
+                        (version, nombre),
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            aplicadas.append(version)
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK,))
+        conn.commit()
+
+    finally:
+        conn.close()
+
+    return aplicadas
+
+
+def estado(dsn):
+    """Lista (version, nombre, aplicada) de todas las migraciones conocidas."""
+    conn = psycopg2.connect(dsn)
+    try:
+        aplicadas = versiones_aplicadas(conn)
+    finally:
+        conn.close()
+    return [(v, n, v in aplicadas) for v, n, _ in migraciones_disponibles()]
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from db import run_query
+from db import run_query, cargar_consultas, guardar_movimiento, actualizar_detalles, ErrorNegocio
 from data import productos, bodegas
 
 
@@ -14,9 +14,14 @@ st.set_page_config(
 if "carrito" not in st.session_state:
     st.session_state.carrito = []
 
-# Obtener las bases de datos
-clientes = run_query("SELECT * FROM clientes")
-proveedores = run_query("SELECT * FROM proveedores")
+# Obtener las bases de datos (a la vez, no dependen entre sí)
+datos = cargar_consultas({
+    "clientes": "SELECT * FROM clientes",
+    "proveedores": "SELECT * FROM proveedores",
+    "ventas": "SELECT id_transaccion, fecha FROM encabezados WHERE transaccion = 1",
+})
+clientes = datos["clientes"]
+proveedores = datos["proveedores"]
 
 st.title("Formulario de Registro de Movimientos")
 
@@ -226,30 +231,28 @@ with tabs[0]:
     c1, c2, c3 = st.columns(3)
 
     if c1.button("💾 Guardar"):
-        if transaccion == 1 or transaccion == 2: # Venta o Compra
-            
-            if transaccion == 1:
-                row = run_query("INSERT INTO encabezados (fecha, no_envio, transaccion, tipo_venta, metodo_pago, bodega_origen, id_cliente, total, observaciones, estado, factura) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id_transaccion", (fecha, envio, int(transaccion), tipo, pago, bodega, int(cliente), float(total), observaciones, estado, bool(factura)), fetch="one")
-            
-            if transaccion == 2:
-                row = run_query("INSERT INTO encabezados (fecha, no_envio, transaccion, bodega_destino, id_proveedor, total, observaciones, estado) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id_transaccion", (fecha, envio, int(transaccion), bodega, int(proveedor), float(total), observaciones, estado), fetch="one")
+        if transaccion == 1: # Venta
+            encabezado = {"fecha": fecha, "no_envio": envio, "transaccion": int(transaccion), "tipo_venta": tipo, "metodo_pago": pago, "bodega_origen": bodega, "id_cliente": int(cliente), "total": float(total), "observaciones": observaciones, "estado": estado, "factura": bool(factura)}
 
-            id_transaccion = row["id_transaccion"]
+        if transaccion == 2: # Compra
+            encabezado = {"fecha": fecha, "no_envio": envio, "transaccion": int(transaccion), "bodega_destino": bodega, "id_proveedor": int(proveedor), "total": float(total), "observaciones": observaciones, "estado": estado}
 
-            for item in st.session_state.carrito:
-                run_query("INSERT INTO detalles (id_transaccion, fecha, sku, cantidad, precio, subtotal) VALUES (%s, %s, %s, %s, %s, %s)", (id_transaccion, fecha, str(item["sku"]), int(item["cantidad"]), float(item["precio"]), float(item["subtotal"])), fetch="none")
+        if transaccion == 1 or transaccion == 2: # Venta o Compra
+            lineas = [{"fecha": fecha, "sku": str(item["sku"]), "cantidad": int(item["cantidad"]), "precio": float(item["precio"]), "subtotal": float(item["subtotal"])} for item in st.session_state.carrito]
 
         if transaccion == 3: # Transferencia
-            row = run_query("INSERT INTO encabezados (fecha, no_envio, transaccion, bodega_origen, bodega_destino, total, observaciones) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id_transaccion", (fecha, envio, int(transaccion), bodega_entrada, bodega_salida, float(total), observaciones), fetch="one")
-            id_transaccion = row["id_transaccion"]
-
-            for item in st.session_state.carrito:
-                run_query("INSERT INTO detalles (id_transaccion, fecha, sku, cantidad) VALUES (%s, %s, %s, %s)", (id_transaccion, fecha, str(item["sku"]), int(item["cantidad"])), fetch="none")    
+            encabezado = {"fecha": fecha, "no_envio": envio, "transaccion": int(transaccion), "bodega_origen": bodega_salida, "bodega_destino": bodega_entrada, "total": float(total), "observaciones": observaciones}
+            lineas = [{"fecha": fecha, "sku": str(item["sku"]), "cantidad": int(item["cantidad"])} for item in st.session_state.carrito]
 
-        st.success("Transacción guardada exitosamente")
+        try:
+            id_transaccion = guardar_movimiento(encabezado, lineas)
+        except ErrorNegocio as e:
+            st.error(e.diag.message_primary)
+        else:
+            st.success("Transacción guardada exitosamente")
 
-        st.session_state.carrito = []
-        st.rerun()
+            st.session_state.carrito = []
+            st.rerun()
         
     if c2.button("🧹 Vaciar detalle"):
         st.session_state.carrito = []
@@ -264,14 +267,15 @@ with tabs[0]:
 with tabs[1]:
     st.subheader("Modificar Movimiento")
 
-    ids = [t["id_transaccion"] for t in run_query("SELECT id_transaccion FROM encabezados WHERE transaccion = 1")]
-    id_transaccion = st.selectbox("ID de Transacción", ids, key="id_transaccion_sel")
+    # La fecha acompaña al id para que las consultas lean solo la partición del mes
+    fechas = {t["id_transaccion"]: t["fecha"] for t in datos["ventas"]}
+    id_transaccion = st.selectbox("ID de Transacción", list(fechas), key="id_transaccion_sel")
 
     if id_transaccion:
         # Trae encabezado SIN crashear
         mod_encabezado = run_query(
-            "SELECT * FROM encabezados WHERE id_transaccion = %s AND estado != 'Anulada'",  # <- quité transaccion=1 (ajústalo si aplica)
-            (id_transaccion,),
+            "SELECT * FROM encabezados WHERE id_transaccion = %s AND fecha = %s AND estado != 'Anulada'",  # <- quité transaccion=1 (ajústalo si aplica)
+            (id_transaccion, fechas[id_transaccion]),
             fetch="one"
         )
 
@@ -280,8 +284,8 @@ with tabs[1]:
             st.stop()
 
         mod_detalles_raw = run_query(
-            "SELECT id_detalle,sku, cantidad, precio FROM detalles WHERE id_transaccion = %s",
-            (id_transaccion,)
+            "SELECT id_detalle,sku, cantidad, precio FROM detalles WHERE id_transaccion = %s AND fecha = %s",
+            (id_transaccion, fechas[id_transaccion])
         ) or []
 
         import pandas as pd
@@ -294,6 +298,8 @@ with tabs[1]:
         # Columna auxiliar para editar producto por SKU
         mod_detalles["producto_sku"] = mod_detalles["sku"]
         mod_detalles = mod_detalles[["producto_sku", "cantidad", "precio", "id_detalle"]]
+        mod_detalles["cantidad"] = mod_detalles["cantidad"].astype(int)
+        mod_detalles["precio"] = mod_detalles["precio"].astype(float)
 
         # Encabezado (solo display)
         c1, c2 = st.columns(2)
@@ -313,6 +319,7 @@ with tabs[1]:
                 mod_detalles,
                 use_container_width=True,
                 key=f"editor_{id_transaccion}",
+                num_rows="dynamic",
                 column_config={
                     "producto_sku": st.column_config.SelectboxColumn(
                         "Producto",
@@ -329,12 +336,33 @@ with tabs[1]:
 
 
         if guardar:
-            edited["subtotal"] = edited["cantidad"] * edited["precio"]
-            total = edited["subtotal"].sum()
-
-            run_query("UPDATE encabezados SET total = %s WHERE id_transaccion = %s", (float(total), int(id_transaccion)), fetch="none")
-
-            for item in edited.itertuples():
-                run_query("UPDATE detalles SET cantidad = %s, precio = %s, subtotal = %s, sku = %s WHERE id_transaccion = %s AND id_detalle = %s", (int(item.cantidad), float(item.precio), float(item.subtotal), str(item.producto_sku), int(id_transaccion), int(item.id_detalle)), fetch="none")
-
-            st.success("Cambios guardados exitosamente")
+            # Solo se envían las líneas que cambiaron respecto a lo cargado
+            columnas = ["producto_sku", "cantidad", "precio"]
+            originales = mod_detalles.set_index("id_detalle")[columnas]
+
+            # Las filas nuevas a medio llenar se ignoran; una línea existente solo se
+            # borra si se elimina de la tabla, no por dejar una celda vacía
+            nuevos = edited[edited["id_detalle"].isna()].dropna(subset=columnas)
+            existentes = edited.dropna(subset=["id_detalle"])
+
+            if existentes[columnas].isna().any(axis=1).any():
+                st.error("Completa producto, cantidad y precio en todas las líneas existentes. Para quitar una línea, elimínala de la tabla.")
+            else:
+                actuales = existentes.astype({"id_detalle": int}).set_index("id_detalle")[columnas]
+
+                borrados = originales.index.difference(actuales.index)
+                comunes = actuales.index.intersection(originales.index)
+                cambiados = actuales.loc[comunes][(actuales.loc[comunes] != originales.loc[comunes]).any(axis=1)]
+
+                try:
+                    actualizar_detalles(
+                        int(id_transaccion),
+                        fechas[id_transaccion],
+                        cambiados=[{"id_detalle": int(i), "sku": str(r.producto_sku), "cantidad": int(r.cantidad), "precio": float(r.precio)} for i, r in cambiados.iterrows()],
+                        nuevos=[{"sku": str(r.producto_sku), "cantidad": int(r.cantidad), "precio": float(r.precio)} for r in nuevos.itertuples()],
+                        borrados=[int(i) for i in borrados],
+                    )
+                except ErrorNegocio as e:
+                    st.error(e.diag.message_primary)
+                else:
+                    st.success("Cambios guardados exitosamente")
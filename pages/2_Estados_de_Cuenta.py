@@ -1,18 +1,17 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-from db import run_query
-from data import productos, bodegas, generar_estado_cuenta_pdf
+from io import BytesIO
+from db import run_query, cargar_consultas, aplicar_pago, cronometro, ErrorNegocio
+from consultas import estado_cuenta_facturas, estado_cuenta_detalles, resumen_cuenta
+from data import generar_estado_cuenta_pdf, pdf_cacheado, preparar_estado_cuenta
+from estados_lote import generar_estados_lote
 
 st.set_page_config(page_title="Consultas",
                    page_icon="📊", 
                    layout="wide")
 
-clientes = run_query("SELECT * FROM clientes")
-proveedores = run_query("SELECT * FROM proveedores")
-encabezados = run_query("SELECT * FROM encabezados")
-detalle = run_query("SELECT * FROM detalles")
-pagos = run_query("SELECT * FROM pagos")
+clientes = run_query("SELECT id_cliente, nombre FROM clientes ORDER BY nombre")
 
 st.title("Estado de Cuenta")
 
@@ -23,54 +22,62 @@ c1, c2 = st.columns(2)
 cliente = c1.selectbox("Cliente", opciones_clientes, format_func=lambda x: opciones_clientes[x])
 estado = c2.multiselect("Estado", ["Pagada", "Pendiente de pago", "Pagada parcialmente", "Anulada"], default=["Pendiente de pago", "Pagada parcialmente"])
 
-result = run_query(
-    """
-    SELECT
-        c.nombre AS cliente,
-        e.id_transaccion,
-        e.fecha,
-        e.factura,
-        e.no_envio,
-        d.sku,
-        d.cantidad,
-        d.precio,
-        d.subtotal,
-        e.total,
-        e.estado,
-        e.pagado
-    FROM clientes c
-    JOIN encabezados e ON e.id_cliente = c.id_cliente
-    JOIN detalles d ON d.id_transaccion = e.id_transaccion
-    WHERE c.id_cliente = %s
-    ORDER BY e.fecha, e.id_transaccion;
-    """,
-    params=(cliente,),
-    fetch="all"
-)
-
-df = pd.DataFrame(result)
-
-if df.empty:
+c3, c4 = st.columns(2)
+
+fecha_inicio = c3.date_input("Desde", value=None)
+fecha_fin = c4.date_input("Hasta", value=None)
+
+filtros = {"estados": estado, "fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
+
+with st.expander("📦 Estados de cuenta de todos los clientes"):
+    st.write("Genera un PDF por cliente con los filtros de estado y fechas de arriba y los entrega en un ZIP.")
+
+    if st.button("Generar ZIP", icon="🗂️"):
+        barra = st.progress(0.0, text="Consultando estados de cuenta...")
+
+        def progreso(hechos, total):
+            barra.progress(hechos / total if total else 1.0, text=f"{hechos} de {total} estados de cuenta")
+
+        zip_buffer = BytesIO()
+        with cronometro("zip_estados_de_cuenta"):
+            generados = generar_estados_lote(zip_buffer, progreso=progreso, **filtros)
+
+        if generados:
+            st.download_button(
+                label=f"📥 Descargar {generados} estados de cuenta (ZIP)",
+                data=zip_buffer.getvalue(),
+                file_name=f"estados_cuenta_{datetime.now():%Y%m%d}.zip",
+                mime="application/zip"
+            )
+        else:
+            st.warning("No hay datos")
+
+# Todo lo que muestra la página del cliente se pide a la vez; sin cliente
+# no se consulta nada
+con_cliente = cliente is not None
+datos = cargar_consultas({
+    "facturas": (lambda: estado_cuenta_facturas(cliente, **filtros)) if con_cliente else None,
+    "detalles": (lambda: estado_cuenta_detalles(cliente, **filtros)) if con_cliente else None,
+    "resumen": (lambda: resumen_cuenta(cliente)) if con_cliente else None,
+    "pagos": ("SELECT * FROM pagos WHERE id_cliente = %s", (cliente,)) if con_cliente else None,
+})
+facturas = datos["facturas"]
+
+if not con_cliente or facturas.empty:
     st.warning("No hay datos")
 else:
-    if estado:
-        df = df[df["estado"].isin(estado)]
-
-    # Ingresar nombre del producto
-    df["producto"] = df["sku"].map(productos).fillna(df["sku"])
+    df = datos["detalles"]
 
-    # Convertir los tipos de datos
-    df["fecha"] = pd.to_datetime(df["fecha"]).dt.strftime("%d/%m/%Y")
-    df["cantidad"] = df["cantidad"].astype(int)
-    for col in ["precio", "subtotal", "total"]:
-        df[col] = df[col].astype(float)
+    # Nombre del producto y fechas con formato; los tipos ya vienen de la consulta
+    with cronometro("dataframe_estado_cuenta"):
+        df = preparar_estado_cuenta(df)
 
     tab1, tab2 = st.tabs(["Facturas", "Detalles"])
 
     with tab1:
-        df_print = df[["fecha", "id_transaccion", "no_envio", "total", "estado"]]
+        df_print = facturas[["fecha", "id_transaccion", "no_envio", "total", "estado"]].copy()
+        df_print["fecha"] = pd.to_datetime(df_print["fecha"]).dt.strftime("%d/%m/%Y")
         df_print["total"] = df_print["total"].map(lambda x: f"Q {x:,.2f}")
-        df_print = df_print.drop_duplicates()
 
         st.dataframe(df_print, width="stretch", column_config={
             "fecha": "Fecha",
@@ -96,14 +103,10 @@ else:
             "estado": "Estado"
         })
     
-    total_comprado = df.loc[df["estado"] != "Anulada", "subtotal"].sum()
-    total_pagado = float((
-        df[["id_transaccion", "pagado"]]
-        .drop_duplicates()
-        ["pagado"]
-        .astype(float)
-        .sum()
-    ))
+    # Totales de las facturas ya cargadas (mismos filtros), sin otra consulta
+    vigentes = facturas["estado"] != "Anulada"
+    total_comprado = float(facturas.loc[vigentes, "total"].sum())
+    total_pagado = float(facturas["pagado"].sum())
     total_pendiente = total_comprado - total_pagado
 
     c5, c6, c7 = st.columns(3)
@@ -112,20 +115,36 @@ else:
     c6.write(f"**Total Pagado:** Q {total_pagado:,.2f}")
     c7.write(f"**Total Pendiente:** Q {total_pendiente:,.2f}")
 
+    resumen = datos["resumen"]
+    saldo_inicial = float(resumen["saldo_inicial"])
+    saldo_actual = saldo_inicial + float(resumen["cargos"]) - float(resumen["abonos"])
+    cierre = f"{resumen['ultimo_cierre']:%m/%Y}" if resumen["ultimo_cierre"] else "sin cierres"
 
-    cliente_nombre = opciones_clientes.get(cliente, "")
+    c5, c6, c7, c8 = st.columns(4)
+
+    c5.metric(f"Saldo al cierre ({cierre})", f"Q {saldo_inicial:,.2f}")
+    c6.metric("Cargos desde el cierre", f"Q {float(resumen['cargos']):,.2f}")
+    c7.metric("Abonos desde el cierre", f"Q {float(resumen['abonos']):,.2f}")
+    c8.metric("Saldo actual", f"Q {saldo_actual:,.2f}")
 
-    pdf_buffer = generar_estado_cuenta_pdf(
-        df,
-        cliente_nombre,
-        total_comprado,
-        total_pagado,
-        total_pendiente
-    )
 
+    cliente_nombre = opciones_clientes.get(cliente, "")
+
+    def pdf_estado_cuenta():
+        with cronometro("pdf_estado_cuenta"):
+            return pdf_cacheado(
+                generar_estado_cuenta_pdf,
+                df,
+                cliente_nombre,
+                total_comprado,
+                total_pagado,
+                total_pendiente
+            )
+
+    # El PDF solo se arma al hacer clic en descargar, y se reutiliza si los datos no cambiaron
     st.download_button(
         label="📄 Descargar Estado de Cuenta (PDF)",
-        data=pdf_buffer,
+        data=pdf_estado_cuenta,
         file_name=f"estado_cuenta_{cliente_nombre}.pdf",
         mime="application/pdf"
     )
@@ -141,14 +160,8 @@ else:
         monto_pagado = c1.number_input("Monto pagado", min_value=0, value=0, step=10)
         fecha_pago = c2.date_input("Fecha del pago", value=datetime.now())
 
-        facturas = (
-            df[["fecha", "id_transaccion", "total", "pagado", "estado"]]
-            .drop_duplicates()
-            .sort_values("fecha")
-        )
-
-        st.dataframe(facturas, width="stretch", column_config={
-                "fecha": "Fecha",
+        st.dataframe(facturas[["fecha", "id_transaccion", "total", "pagado", "estado"]], width="stretch", column_config={
+                "fecha": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY"),
                 "id_transaccion": "ID Factura",
                 "total": "Total",
                 "pagado": "Pagado",
@@ -161,63 +174,25 @@ else:
                 st.error("El monto pagado debe ser mayor a 0")
 
             else:
-                run_query(
-                    """
-                    INSERT INTO pagos (fecha, monto_pagado, id_cliente)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (fecha_pago, monto_pagado, cliente),
-                    fetch="none"
-                )
-
-            for _, row in facturas.iterrows():
-                if monto_pagado <= 0:
-                    break
-
-                if row["estado"] == "Pagada" or row["estado"] == "Anulada":
-                    continue
-
-                pendiente = float(row["total"]) - float(row["pagado"])
-
-                if monto_pagado >= pendiente:
-                    # Se paga completa
-                    run_query(
-                        """
-                        UPDATE encabezados
-                        SET pagado = %s,
-                            estado = 'Pagada'
-                        WHERE id_transaccion = %s
-                        """,
-                        (row["total"], row["id_transaccion"]),
-                        fetch="none"
-                    )
-                    monto_pagado -= pendiente
-
+                try:
+                    asignaciones = aplicar_pago(int(cliente), fecha_pago, float(monto_pagado))
+                except ErrorNegocio as e:
+                    st.error(e.diag.message_primary)
                 else:
-                    # Se paga parcialmente
-                    run_query(
-                        """
-                        UPDATE encabezados
-                        SET pagado = pagado + %s,
-                            estado = 'Pagada parcialmente'
-                        WHERE id_transaccion = %s
-                        """,
-                        (monto_pagado, row["id_transaccion"]),
-                        fetch="none"
-                    )
-                    monto_pagado = 0
-
-            st.rerun()
+                    aplicado = sum(float(a["monto"]) for a in asignaciones)
+                    st.toast(f"Pago aplicado a {len(asignaciones)} facturas por Q {aplicado:,.2f}")
+                    st.rerun()
                     
     with tabs[1]:
         st.subheader("Actualizar Transacción")
 
-        transacciones = df["id_transaccion"].unique()
+        transacciones = facturas["id_transaccion"].tolist()
 
         c1, c2 = st.columns(2)
         id_transaccion = c1.selectbox("ID de Transacción", ["", *transacciones])
 
         if id_transaccion != "":
+            factura = facturas[facturas["id_transaccion"] == id_transaccion].iloc[0]
             df_actualizar = df[df["id_transaccion"] == id_transaccion]
             df_actualizar = df_actualizar[["fecha", "producto", "cantidad", "precio", "subtotal", "estado"]]
 
@@ -235,19 +210,28 @@ else:
 
             c3, c4, c5 = st.columns(3)
 
-            c3.info(f"Estado actual: {df_actualizar['estado'].iloc[0]}")
+            c3.info(f"Estado actual: {factura['estado']}")
             c4.success(f"Nuevo estado: {nuevo_estado}")
 
             if c5.button("Actualizar", width="stretch", icon="🔄"):
-                run_query("UPDATE encabezados SET estado = %s, observaciones = %s WHERE id_transaccion = %s", (nuevo_estado, observaciones, int(id_transaccion)), fetch="none")
-                st.success("Transacción actualizada exitosamente")
-                st.rerun()
+                try:
+                    # Con la fecha el UPDATE solo busca en la partición del mes
+                    run_query(
+                        "UPDATE encabezados SET estado = %s, observaciones = %s WHERE id_transaccion = %s AND fecha = %s",
+                        (nuevo_estado, observaciones, int(id_transaccion), pd.Timestamp(factura["fecha"]).date()),
+                        fetch="none",
+                    )
+                except ErrorNegocio as e:
+                    st.error(e.diag.message_primary)
+                else:
+                    st.success("Transacción actualizada exitosamente")
+                    st.rerun()
 
     st.divider()
     
     st.subheader("Historial de Pagos")
 
-    pagos = run_query("SELECT * FROM pagos WHERE id_cliente = %s", (cliente,))
+    pagos = datos["pagos"]
     
     if not pagos:
         st.warning("No hay pagos")
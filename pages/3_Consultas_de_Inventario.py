@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-from db import run_query
-from data import productos, bodegas, generar_estado_cuenta_pdf
+from datetime import datetime
+from db import cargar_consultas, cronometro
+from consultas import consultar_kardex, clave_kardex
+from data import productos, bodegas
+from exportar import FORMATOS, exportar_temporal
 
 st.set_page_config(page_title="Inventarios",
                    page_icon="📦", 
@@ -9,76 +12,112 @@ st.set_page_config(page_title="Inventarios",
 
 tabs = st.tabs(["Inventarios", "Kardex"])
 
-clientes = run_query("SELECT * FROM clientes")
-proveedores = run_query("SELECT * FROM proveedores")
-encabezados = run_query("SELECT * FROM encabezados")
-detalle = run_query("SELECT * FROM detalles")
+# Consultas independientes entre sí: se piden a la vez
+datos = cargar_consultas({
+    "clientes": "SELECT id_cliente, nombre FROM clientes ORDER BY nombre",
+    "proveedores": "SELECT id_proveedor, nombre FROM proveedores ORDER BY nombre",
+    "stock": "SELECT sku, bodega, stock_actual FROM inventario_bodegas",
+})
+clientes = datos["clientes"]
+proveedores = datos["proveedores"]
 
 with tabs[0]:
     st.subheader("Inventarios")
 
-    
+    stock = pd.DataFrame(datos["stock"])
+
+    if stock.empty:
+        st.info("No hay inventario registrado")
+    else:
+        stock["stock_actual"] = stock["stock_actual"].astype(float)
+
+        # SKU × bodega, con todas las bodegas aunque no tengan movimientos
+        with cronometro("pivot_bodegas"):
+            pivot = (
+                stock.pivot_table(index="sku", columns="bodega", values="stock_actual", aggfunc="sum", fill_value=0)
+                .reindex(columns=bodegas, fill_value=0)
+            )
+            pivot["Total"] = pivot.sum(axis=1)
+            pivot.insert(0, "Producto", pivot.index.map(productos))
+
+        st.dataframe(pivot, width="stretch")
+
 
 with tabs[1]:
 
     st.subheader("Kardex")
 
     st.sidebar.subheader("Filtros")
-    sku = st.sidebar.selectbox("SKU", [None] + list(productos.values()))
-    cliente = st.sidebar.selectbox("Cliente", [None] + [c["nombre"] for c in clientes])
-    proveedor = st.sidebar.selectbox("Proveedor", [None] + [p["nombre"] for p in proveedores])
-    transaccion = st.sidebar.selectbox("Transaccion", [None] + ["Venta", "Compra", "Transferencia"])
+
+    opciones_clientes = {None: ""} | {c["id_cliente"]: c["nombre"] for c in clientes}
+    opciones_proveedores = {None: ""} | {p["id_proveedor"]: p["nombre"] for p in proveedores}
+    opciones_transaccion = {None: "", 1: "Venta", 2: "Compra", 3: "Transferencia"}
+
+    sku = st.sidebar.selectbox("SKU", [None] + list(productos), format_func=lambda x: productos.get(x, ""))
+    cliente = st.sidebar.selectbox("Cliente", opciones_clientes, format_func=lambda x: opciones_clientes[x])
+    proveedor = st.sidebar.selectbox("Proveedor", opciones_proveedores, format_func=lambda x: opciones_proveedores[x])
+    transaccion = st.sidebar.selectbox("Transaccion", opciones_transaccion, format_func=lambda x: opciones_transaccion[x])
     bodega_origen = st.sidebar.selectbox("Bodega Origen", [None] + bodegas)
     bodega_destino = st.sidebar.selectbox("Bodega Destino", [None] + bodegas)
+    bodega = st.sidebar.selectbox("Saldo en bodega", [None] + bodegas, help="Sin bodega, el saldo es el stock total del SKU")
+    fechas = st.sidebar.date_input("Rango de fechas", value=())
+    por_pagina = st.sidebar.selectbox("Filas por página", [50, 100, 250, 500], index=1)
 
-    result = run_query(
-        """
-        SELECT
-            c.nombre AS cliente,
-            p.nombre AS proveedor,
-            e.id_transaccion,
-            e.fecha,
-            d.sku,
-            d.cantidad,
-            e.no_envio,
-            e.bodega_origen,
-            e.bodega_destino,
-            e.transaccion
-        FROM encabezados e
-        LEFT JOIN clientes c ON e.id_cliente = c.id_cliente
-        LEFT JOIN proveedores p ON e.id_proveedor = p.id_proveedor
-        JOIN detalles d ON d.id_transaccion = e.id_transaccion
-        ORDER BY e.fecha, e.no_envio;
-        """,
-        fetch="all"
-    )
-
-    df = pd.DataFrame(result)
-
-    df["tercero"] = df["cliente"].combine_first(df["proveedor"])
-    df["tercero"] = df["tercero"].fillna("N/A")
-    df["no_envio"] = df["no_envio"].fillna("N/A")
-    df["bodega_origen"] = df["bodega_origen"].fillna("N/A")
-    df["bodega_destino"] = df["bodega_destino"].fillna("N/A")
-    df["sku"] = df["sku"].map(productos)
-    df["transaccion"] = df["transaccion"].map({
-        1: "Venta",
-        2: "Compra",
-        3: "Transferencia"
-    })
+    filtros = {
+        "sku": sku,
+        "id_cliente": cliente,
+        "id_proveedor": proveedor,
+        "transaccion": transaccion,
+        "bodega_origen": bodega_origen,
+        "bodega_destino": bodega_destino,
+        "bodega": bodega,
+        "fecha_inicio": fechas[0] if len(fechas) > 0 else None,
+        "fecha_fin": fechas[1] if len(fechas) > 1 else None,
+    }
+
+    with st.expander("📥 Exportar kardex o movimientos"):
+        st.write("Exporta todas las filas con los filtros de la barra lateral, no solo la página visible.")
+
+        e1, e2 = st.columns(2)
+        que = e1.radio("Datos", ["kardex", "movimientos"], format_func=str.capitalize, horizontal=True)
+        formato = e2.radio("Formato", list(FORMATOS), format_func=str.upper, horizontal=True)
+
+        # El archivo se arma al hacer clic, leyendo por bloques
+        st.download_button(
+            label=f"📥 Descargar {que} ({formato.upper()})",
+            data=lambda: exportar_temporal(que, formato, filtros),
+            file_name=f"{que}_{datetime.now():%Y%m%d}.{formato}",
+            mime=FORMATOS[formato]
+        )
 
-    if sku:
-        df = df[df["sku"] == sku]
-    if cliente:
-        df = df[df["cliente"] == cliente]
-    if proveedor:
-        df = df[df["proveedor"] == proveedor]
-    if transaccion:
-        df = df[df["transaccion"] == transaccion]
-    if bodega_origen:
-        df = df[df["bodega_origen"] == bodega_origen]
-    if bodega_destino:
-        df = df[df["bodega_destino"] == bodega_destino]
+    # Pila con la clave de inicio de cada página visitada; se reinicia al cambiar filtros
+    firma = (tuple(filtros.items()), por_pagina)
+    if st.session_state.get("kardex_firma") != firma:
+        st.session_state.kardex_firma = firma
+        st.session_state.kardex_paginas = [None]
+
+    paginas = st.session_state.kardex_paginas
+    df, hay_mas = consultar_kardex(filtros, despues=paginas[-1], limite=por_pagina)
+
+    if df.empty:
+        st.info("No hay movimientos para estos filtros")
+        st.stop()
+
+    # Clave de la página siguiente, antes de cambiar los SKUs por sus nombres
+    siguiente = clave_kardex(df.iloc[-1])
+
+    with cronometro("dataframe_kardex"):
+        df["tercero"] = df["cliente"].combine_first(df["proveedor"])
+        df["tercero"] = df["tercero"].fillna("N/A")
+        df["no_envio"] = df["no_envio"].fillna("N/A")
+        for col in ["bodega_origen", "bodega_destino"]:
+            df[col] = df[col].cat.add_categories("N/A").fillna("N/A")
+        df["sku"] = df["sku"].map(productos)
+        df["transaccion"] = df["transaccion"].map({
+            1: "Venta",
+            2: "Compra",
+            3: "Transferencia"
+        })
 
     df_print = df[["fecha",
                     "id_transaccion",
@@ -88,10 +127,12 @@ with tabs[1]:
                     "bodega_origen",
                     "bodega_destino",
                     "sku",
-                    "cantidad"]]
+                    "entrada",
+                    "salida",
+                    "saldo"]]
 
     st.dataframe(df_print, width="stretch", column_config={
-        "fecha": "Fecha",
+        "fecha": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY"),
         "id_transaccion": "ID",
         "transaccion": "Tipo de Transaccion",
         "no_envio": "No. Envio",
@@ -99,5 +140,19 @@ with tabs[1]:
         "bodega_origen": "Bodega Origen",
         "bodega_destino": "Bodega Destino",
         "sku": "SKU",
-        "cantidad": "Cantidad"
-    })
\ No newline at end of file
+        "entrada": "Entradas",
+        "salida": "Salidas",
+        "saldo": "Saldo"
+    })
+
+    c1, c2, c3 = st.columns([1, 2, 1])
+
+    if c1.button("⬅️ Anterior", disabled=len(paginas) == 1):
+        paginas.pop()
+        st.rerun()
+
+    c2.caption(f"Página {len(paginas)}")
+
+    if c3.button("Siguiente ➡️", disabled=not hay_mas):
+        paginas.append(siguiente)
+        st.rerun()
@@ -1,52 +1,28 @@
 import streamlit as st
 import pandas as pd
-from db import run_query
-from data import productos, bodegas
+from consultas import buscar_envios, detalle_envio
+from data import productos
 
 st.set_page_config(page_title="Envios",
                    page_icon=":paperclip:", 
                    layout="wide")
 
-clientes = run_query("SELECT * FROM clientes")
-proveedores = run_query("SELECT * FROM proveedores")
-encabezados = pd.DataFrame(run_query("SELECT * FROM encabezados"))
-detalle = pd.DataFrame(run_query("SELECT * FROM detalles"))
-
-envios = encabezados["no_envio"].unique()
-
 st.subheader("Envios")
 
-col1, placeholder = st.columns([1, 2])
+col1, col2, placeholder = st.columns([1, 1, 1])
 
+prefijo = col1.text_input("Buscar No. Envio", placeholder="Escribe el inicio del número")
+envios = [e["no_envio"] for e in buscar_envios(prefijo, limite=50)]
 
-no_envio = col1.selectbox("No. Envio", envios)
+no_envio = col2.selectbox("No. Envio", envios, help="Se muestran los 50 envíos más recientes que coinciden")
 
 if no_envio != None:
 
-    result = pd.DataFrame(run_query(
-        """
-        SELECT
-            c.nombre AS cliente,
-            e.id_transaccion,
-            e.fecha,
-            e.factura,
-            e.no_envio,
-            d.sku,
-            d.cantidad,
-            d.precio,
-            d.subtotal,
-            e.total,
-            e.estado,
-            e.pagado
-        FROM clientes c
-        JOIN encabezados e ON e.id_cliente = c.id_cliente
-        JOIN detalles d ON d.id_transaccion = e.id_transaccion
-        WHERE e.no_envio = %s
-        ORDER BY e.fecha, e.id_transaccion;
-        """,
-        params=(no_envio,),
-        fetch="all"
-    ))
+    result = pd.DataFrame(detalle_envio(no_envio))
+
+    if result.empty:
+        st.info("Este envío no tiene ventas registradas")
+        st.stop()
 
     encabezado = result.iloc[0]
 
@@ -0,0 +1,73 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from db import cronometro
+from consultas import antiguedad_saldos
+from data import dataframe_to_pdf, pdf_cacheado
+
+st.set_page_config(page_title="Antigüedad de Saldos",
+                   page_icon="⏳",
+                   layout="wide")
+
+st.title("Antigüedad de Saldos")
+
+c1, placeholder = st.columns([1, 2])
+fecha_corte = c1.date_input("Fecha de corte", value=datetime.now())
+
+columnas = ["cliente", "d0_30", "d31_60", "d61_90", "d90_mas", "total"]
+df = pd.DataFrame(antiguedad_saldos(fecha_corte), columns=["id_cliente", *columnas])
+
+if df.empty:
+    st.info("Ningún cliente tiene saldo pendiente")
+    st.stop()
+
+df = df[columnas]
+for col in columnas[1:]:
+    df[col] = df[col].astype(float)
+
+c1, c2, c3, c4, c5 = st.columns(5)
+c1.metric("0–30 días", f"Q {df['d0_30'].sum():,.2f}")
+c2.metric("31–60 días", f"Q {df['d31_60'].sum():,.2f}")
+c3.metric("61–90 días", f"Q {df['d61_90'].sum():,.2f}")
+c4.metric("Más de 90 días", f"Q {df['d90_mas'].sum():,.2f}")
+c5.metric("Total por cobrar", f"Q {df['total'].sum():,.2f}")
+
+nombres = {
+    "cliente": "Cliente",
+    "d0_30": "0-30 días",
+    "d31_60": "31-60 días",
+    "d61_90": "61-90 días",
+    "d90_mas": "Más de 90 días",
+    "total": "Total"
+}
+
+st.dataframe(df, width="stretch", column_config={
+    col: st.column_config.NumberColumn(nombre, format="Q %.2f") if col != "cliente" else nombre
+    for col, nombre in nombres.items()
+})
+
+df_export = df.rename(columns=nombres)
+
+c1, c2 = st.columns(2)
+
+c1.download_button(
+    label="📄 Descargar en CSV",
+    data=df_export.to_csv(index=False).encode("utf-8"),
+    file_name=f"antiguedad_saldos_{fecha_corte}.csv",
+    mime="text/csv"
+)
+
+def pdf_antiguedad():
+    with cronometro("pdf_antiguedad"):
+        df_pdf = df_export.copy()
+        for col in df_pdf.columns[1:]:
+            df_pdf[col] = df_pdf[col].map(lambda x: f"Q {x:,.2f}")
+        return pdf_cacheado(dataframe_to_pdf, df_pdf)
+
+# El PDF solo se arma al hacer clic en descargar
+c2.download_button(
+    label="📄 Descargar en PDF",
+    data=pdf_antiguedad,
+    file_name=f"antiguedad_saldos_{fecha_corte}.pdf",
+    mime="application/pdf"
+)
@@ -0,0 +1,78 @@
+import streamlit as st
+import pandas as pd
+from datetime import date, timedelta
+from db import cerrar_periodo, reabrir_periodo, ErrorNegocio
+from consultas import cierres_mensuales
+
+st.set_page_config(page_title="Cierres Mensuales",
+                   page_icon="🗓️",
+                   layout="wide")
+
+st.title("Cierres Mensuales")
+
+st.markdown("""
+Al cerrar un mes se guarda el saldo de cada cliente. Los estados de cuenta
+parten del último cierre y solo suman los movimientos posteriores.
+Solo se cierran meses terminados, y al cerrar uno se cierran también los meses
+abiertos desde el último cierre. Para modificar movimientos o pagos de un mes
+cerrado, reábrelo (se reabren también los meses siguientes) y vuelve a cerrar
+el último mes.
+""")
+
+cierres = pd.DataFrame(
+    cierres_mensuales(),
+    columns=["periodo", "cerrado_en", "clientes", "cargos", "abonos", "saldo_final"]
+)
+
+c1, c2 = st.columns(2)
+
+with c1:
+    st.subheader("Cerrar un mes")
+    # Por defecto el mes pasado: el mes en curso todavía recibe movimientos
+    fin_mes_pasado = date.today().replace(day=1) - timedelta(days=1)
+    fecha = st.date_input("Mes a cerrar", value=fin_mes_pasado.replace(day=1), max_value=fin_mes_pasado)
+    periodo = fecha.replace(day=1)
+
+    if st.button("Cerrar mes", icon="🔒"):
+        try:
+            calculados = cerrar_periodo(periodo)
+        except ErrorNegocio as e:
+            st.error(e.diag.message_primary)
+        else:
+            st.toast(f"Mes {periodo:%m/%Y} cerrado ({calculados} períodos calculados)")
+            st.rerun()
+
+with c2:
+    st.subheader("Reabrir un mes")
+    periodo_abrir = st.selectbox("Mes cerrado", ["", *cierres["periodo"]], format_func=lambda x: f"{x:%m/%Y}" if x else "")
+
+    if st.button("Reabrir mes", icon="🔓", disabled=periodo_abrir == ""):
+        try:
+            reabiertos = reabrir_periodo(periodo_abrir)
+        except ErrorNegocio as e:
+            st.error(e.diag.message_primary)
+        else:
+            st.toast(f"Se reabrieron {reabiertos} meses desde {periodo_abrir:%m/%Y}")
+            st.rerun()
+
+st.divider()
+
+st.subheader("Meses cerrados")
+
+if cierres.empty:
+    st.info("Todavía no hay meses cerrados")
+else:
+    df_print = cierres.copy()
+    df_print["periodo"] = pd.to_datetime(df_print["periodo"]).dt.strftime("%m/%Y")
+    df_print["cerrado_en"] = pd.to_datetime(df_print["cerrado_en"]).dt.strftime("%d/%m/%Y %H:%M")
+    for col in ["cargos", "abonos", "saldo_final"]:
+        df_print[col] = df_print[col].map(lambda x: f"Q {x:,.2f}")
+
+    st.dataframe(df_print, width="stretch", column_config={
+        "periodo": "Mes",
+        "cerrado_en": "Cerrado el",
+        "clientes": "Clientes",
+        "cargos": "Cargos",
+        "abonos": "Abonos",
+        "saldo_final": "Saldo Final"
+    })
@@ -0,0 +1,129 @@
+import streamlit as st
+import pandas as pd
+from db import (
+    cache_stats,
+    consultas_lentas,
+    explicar,
+    get_metricas,
+    metricas_consultas,
+    metricas_fases,
+    pool_stats,
+)
+
+st.set_page_config(page_title="Rendimiento",
+                   page_icon="⏱️",
+                   layout="wide")
+
+st.title("Rendimiento")
+
+st.markdown("""
+Tiempos de las consultas y de las fases de render (DataFrames, PDFs) de cada
+página desde que arrancó este proceso. Las consultas que pasan de
+`DB_LENTA_MS` quedan en el registro de lentas con sus parámetros.
+""")
+
+metricas = get_metricas()
+pool = pool_stats()
+cache = cache_stats()
+consultas_cache = cache["aciertos"] + cache["fallos"]
+
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Conexiones en uso", f"{pool['en_uso']} / {pool['max']}")
+c2.metric("Espera máxima del pool", f"{pool['espera_max_ms']:.1f} ms")
+c3.metric("Aciertos del cache", f"{(cache['aciertos'] / consultas_cache if consultas_cache else 0):.0%}")
+c4.metric("Umbral de consulta lenta", f"{metricas.lenta_ms:,.0f} ms")
+
+if st.button("Reiniciar métricas", icon="🧹"):
+    metricas.limpiar()
+    st.rerun()
+
+tabs = st.tabs(["Consultas", "Fases de render", "Consultas lentas"])
+
+with tabs[0]:
+    consultas = pd.DataFrame(metricas_consultas())
+
+    if consultas.empty:
+        st.info("Todavía no se han ejecutado consultas")
+    else:
+        paginas = st.multiselect("Páginas", sorted(consultas["pagina"].unique()))
+        if paginas:
+            consultas = consultas[consultas["pagina"].isin(paginas)]
+
+        consultas["kb_promedio"] = consultas["bytes_promedio"] / 1024
+        consultas = consultas.sort_values("total_ms", ascending=False)
+
+        st.dataframe(
+            consultas[["pagina", "consulta", "llamadas", "aciertos_cache", "p50_ms", "p95_ms",
+                       "max_ms", "total_ms", "filas_promedio", "kb_promedio"]],
+            width="stretch",
+            hide_index=True,
+            column_config={
+                "pagina": "Página",
+                "consulta": st.column_config.TextColumn("Consulta", width="large"),
+                "llamadas": "Llamadas",
+                "aciertos_cache": "Desde cache",
+                "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+                "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+                "max_ms": st.column_config.NumberColumn("Máx (ms)", format="%.1f"),
+                "total_ms": st.column_config.NumberColumn("Total (ms)", format="%.0f"),
+                "filas_promedio": st.column_config.NumberColumn("Filas prom.", format="%.0f"),
+                "kb_promedio": st.column_config.NumberColumn("KB prom.", format="%.1f"),
+            }
+        )
+
+with tabs[1]:
+    fases = pd.DataFrame(metricas_fases())
+
+    if fases.empty:
+        st.info("Todavía no se han medido fases de render")
+    else:
+        fases = fases.sort_values("total_ms", ascending=False)
+
+        st.dataframe(fases, width="stretch", hide_index=True, column_config={
+            "pagina": "Página",
+            "fase": "Fase",
+            "llamadas": "Llamadas",
+            "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+            "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+            "max_ms": st.column_config.NumberColumn("Máx (ms)", format="%.1f"),
+            "total_ms": st.column_config.NumberColumn("Total (ms)", format="%.0f"),
+        })
+
+with tabs[2]:
+    lentas = consultas_lentas()
+
+    if not lentas:
+        st.info("No hay consultas lentas registradas")
+        st.stop()
+
+    df = pd.DataFrame(lentas)
+    df["fecha"] = pd.to_datetime(df["fecha"]).dt.strftime("%d/%m/%Y %H:%M:%S")
+    df["consulta"] = df["query"].map(lambda q: " ".join(q.split()))
+    df["con_plan"] = df["plan"].notna()
+
+    st.dataframe(df[["id", "fecha", "pagina", "ms", "filas", "consulta", "con_plan"]], width="stretch", hide_index=True, column_config={
+        "id": "ID",
+        "fecha": "Fecha",
+        "pagina": "Página",
+        "ms": st.column_config.NumberColumn("Tiempo (ms)", format="%.1f"),
+        "filas": "Filas",
+        "consulta": st.column_config.TextColumn("Consulta", width="large"),
+        "con_plan": "Plan",
+    })
+
+    por_id = {e["id"]: e for e in lentas}
+    id_lenta = st.selectbox("Consulta", list(por_id), format_func=lambda i: f"#{i} · {por_id[i]['pagina']} · {por_id[i]['ms']:,.0f} ms")
+    entrada = por_id[id_lenta]
+
+    st.code(entrada["query"], language="sql")
+    st.write(f"**Parámetros:** `{entrada['params']!r}`")
+
+    # EXPLAIN ANALYZE vuelve a ejecutar la consulta (en una transacción que se revierte)
+    if st.button("Capturar EXPLAIN ANALYZE", icon="🔍"):
+        with st.spinner("Ejecutando la consulta..."):
+            plan = explicar(entrada["query"], entrada["params"])
+        metricas.adjuntar_plan(id_lenta, plan)
+        entrada["plan"] = plan
+
+    if entrada["plan"]:
+        st.code(entrada["plan"], language="text")
@@ -0,0 +1,91 @@
+import streamlit as st
+from datetime import date, timedelta
+from db import cargar_consultas, cronometro
+from consultas import PERIODOS, ventas_por_periodo, ventas_por_cliente
+from data import productos, bodegas, familias
+
+st.set_page_config(page_title="Análisis de Ventas",
+                   page_icon="📈",
+                   layout="wide")
+
+st.title("Análisis de Ventas")
+st.caption("Ventas no anuladas. Se leen del resumen diario, no de cada línea de detalle.")
+
+hoy = date.today()
+
+c1, c2, c3, c4 = st.columns(4)
+fechas = c1.date_input("Rango de fechas", value=(hoy - timedelta(days=90), hoy))
+familia = c2.selectbox("Familia", [None, *familias], format_func=lambda x: x or "Todas")
+puntos_venta = c3.multiselect("Bodega", bodegas, placeholder="Todas")
+periodo = c4.selectbox("Agrupar por", list(PERIODOS), index=1)
+
+opciones_skus = familias[familia] if familia else list(productos)
+skus = st.multiselect("Productos", opciones_skus, format_func=lambda x: productos.get(x, x), placeholder="Todos los de la familia")
+
+if len(fechas) < 2:
+    st.info("Selecciona la fecha final del rango")
+    st.stop()
+
+filtros = {
+    "fecha_inicio": fechas[0],
+    "fecha_fin": fechas[1],
+    "skus": skus or (familias[familia] if familia else None),
+    "bodegas": puntos_venta,
+}
+
+datos = cargar_consultas({
+    "ventas": lambda: ventas_por_periodo(periodo=PERIODOS[periodo], **filtros),
+    "clientes": lambda: ventas_por_cliente(**filtros),
+})
+ventas = datos["ventas"]
+
+if ventas.empty:
+    st.info("No hay ventas para estos filtros")
+    st.stop()
+
+cantidad = ventas["cantidad"].sum()
+monto = ventas["monto"].sum()
+
+c1, c2, c3 = st.columns(3)
+c1.metric("Cantidad vendida", f"{cantidad:,.0f}")
+c2.metric("Monto vendido", f"Q {monto:,.2f}")
+c3.metric("Precio promedio", f"Q {monto / cantidad:,.2f}" if cantidad else "—")
+
+with cronometro("graficas_ventas"):
+    ventas["bodega"] = ventas["bodega"].astype(str).replace("", "Sin bodega")
+    ventas["producto"] = ventas["sku"].astype(str).map(lambda sku: productos.get(sku, sku))
+
+    por_bodega = ventas.pivot_table(index="periodo", columns="bodega", values="cantidad", aggfunc="sum", fill_value=0)
+    por_producto = ventas.groupby("producto")[["cantidad", "monto"]].sum().sort_values("cantidad", ascending=False)
+    tabla = (
+        ventas.pivot_table(index="producto", columns="bodega", values="cantidad", aggfunc="sum", fill_value=0)
+        .reindex(por_producto.index)
+    )
+    tabla["Total"] = tabla.sum(axis=1)
+
+st.subheader(f"Cantidad vendida por {periodo.lower()} y bodega")
+st.bar_chart(por_bodega, x_label=periodo, y_label="Cantidad")
+
+c1, c2 = st.columns(2)
+
+with c1:
+    st.subheader("Cantidad por producto")
+    st.bar_chart(por_producto["cantidad"], horizontal=True, x_label="Cantidad", y_label="")
+
+with c2:
+    st.subheader("Clientes con más ventas")
+    clientes = datos["clientes"]
+    if clientes.empty:
+        st.info("No hay ventas a clientes registrados")
+    else:
+        st.bar_chart(clientes.set_index("cliente")["monto"], horizontal=True, x_label="Monto (Q)", y_label="")
+
+st.subheader("Cantidad por producto y bodega")
+st.dataframe(tabla, width="stretch")
+
+st.download_button(
+    label="📄 Descargar en CSV",
+    data=ventas[["periodo", "sku", "producto", "bodega", "cantidad", "monto"]].to_csv(index=False).encode("utf-8"),
+    file_name=f"ventas_{fechas[0]}_{fechas[1]}.csv",
+    mime="text/csv"
+)